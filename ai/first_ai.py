@@ -1,13 +1,128 @@
+import json
+
 from game.base import *
 from game.deck import *
 from game.wonders import *
 from random import choice
+from functools import lru_cache, partial, wraps
+
+import ai.instrumentation as instrumentation
 
 # My first (and current) AI.
 # Scores all possible moves with a variety of weighted factors and picks the best one.
 
+### DECISION CONTEXT ###
+
+# Everything the scorers need to know about the current decision, built once per get_selection and shared by every scorer.
+# Values that don't depend on the selection being scored are computed up front; per-selection values are cached on first use.
+# - ai_game: the AiGame the decision is made in
+# - age, wonders: same as ai_game.age and ai_game.wonders
+# - wonder, hand: the AI's wonder and hand
+# - neg_neighbor, pos_neighbor: the AI's neighbors
+# - shields, neg_shields, pos_shields: current shields of the AI and its neighbors
+# - points: current points of the AI's wonder
+# - resources_produced: count vector of all resources produced by the AI's wonder (multi-resources counted for each resource)
+# - future_cards: (score_mult, card, cost count vector) for each card in the age decks of this age and later ages
+# - future_cost_tables: the tables of get_future_cost_tables for future_cards
+# - future_stage_costs: cost count vectors of the AI's stages not built yet, in order
+# - trading_mults: for each resource, how much buying it from a neighbor is worth to the AI (0.5 with a trading effect
+#   for it, 1 otherwise)
+class DecisionContext:
+    def __init__(self, ai_game):
+        self.ai_game = ai_game
+        self.age = ai_game.age
+        self.wonders = ai_game.wonders
+        self.wonder = ai_game.get_ai_wonder()
+        self.hand = ai_game.get_ai_hand()
+        self.neg_neighbor, self.pos_neighbor = self.wonder.get_neighbors(self.wonders)
+        self.shields = self.wonder.get_shields()
+        self.neg_shields = self.neg_neighbor.get_shields()
+        self.pos_shields = self.pos_neighbor.get_shields()
+        self.points = self.wonder.compute_points_total(self.wonders)
+        self.resources_produced = resource_vector(self.wonder.get_all_resources_produced())
+        self.future_cards = get_future_cards(len(self.wonders), self.age)
+        self.future_cost_tables = get_future_cost_tables(len(self.wonders), self.age)
+        self.future_stage_costs = [resource_vector(stage.cost.resources) for stage in self.wonder.stages[self.wonder.stages_built:]]
+        grey_mod = 0.5 if self.wonder.has_effect('marketplace', '') else 1
+        brown_mod = 0.5 if self.wonder.has_effect('tradingpost', 'neg') or self.wonder.has_effect('tradingpost', 'pos') else 1
+        self.trading_mults = tuple(grey_mod if resource in GREY_RESOURCES else brown_mod for resource in RESOURCE_ORDER)
+
+        self._simulated_wonders = {}
+        self._resources_produced_with = {}
+        self._base_payments = {}
+
+    # Same as AiGame.get_ai_wonder
+    def get_ai_wonder(self):
+        return self.wonder
+
+    # Same as AiGame.get_ai_hand
+    def get_ai_hand(self):
+        return self.hand
+
+    # Returns the AI's wonder with the selection played (see Wonder.with_simulated_selection).
+    def get_simulated_wonder(self, selection):
+        key = selection_key(selection)
+        if key not in self._simulated_wonders:
+            self._simulated_wonders[key] = self.wonder.with_simulated_selection(self.wonders, selection)
+        return self._simulated_wonders[key]
+
+    # Returns the count vector of all resources produced by the AI's wonder with the selection played.
+    def get_resources_produced_with(self, selection):
+        key = selection_key(selection)
+        if key not in self._resources_produced_with:
+            self._resources_produced_with[key] = resource_vector(self.get_simulated_wonder(selection).get_all_resources_produced())
+        return self._resources_produced_with[key]
+
+    # Returns the min gold payment of the AI's current wonder for the given selection.
+    def get_base_payment(self, selection):
+        key = selection_key(selection)
+        if key not in self._base_payments:
+            self._base_payments[key] = self.wonder.get_min_gold_payment(self.wonders, self.hand, selection)
+        return self._base_payments[key]
+
+# Returns the future_cards of a DecisionContext (see above) for the player count and current age, built once for each.
+@lru_cache(maxsize=None)
+def get_future_cards(player_count, current_age):
+    future_cards = []
+    for age in [1, 2, 3]:
+        if age < current_age: continue
+        score_mult = {0: 1, 1: 1, 2: 0.5}[age - current_age]
+        for future_card in get_age_deck(player_count, age):
+            future_cards.append((score_mult, future_card, resource_vector(future_card.cost.resources)))
+    return tuple(future_cards)
+
+# Returns, for each resource, the table of sum(score_mult * min(k, cost of the resource)) over the future_cards of the
+# player count and current age, for k from 0 to the largest cost (higher k give the same sum as the largest cost).
+# Built once for each player count and age.
+@lru_cache(maxsize=None)
+def get_future_cost_tables(player_count, current_age):
+    future_cards = get_future_cards(player_count, current_age)
+    tables = []
+    for i in range(NUM_RESOURCES):
+        max_needed = max((resources_needed[i] for _, _, resources_needed in future_cards), default=0)
+        tables.append(tuple(sum(score_mult * min(k, resources_needed[i]) for score_mult, _, resources_needed in future_cards) for k in range(max_needed + 1)))
+    return tuple(tables)
+
+# Returns the DecisionContext for an AiGame, or the context itself if it already is one.
+def get_decision_context(ai_game):
+    return ai_game if isinstance(ai_game, DecisionContext) else DecisionContext(ai_game)
+
+# Decorator for the scorers, which take the DecisionContext of the decision. They can still be called with an AiGame (a
+# context is built for the call). get_score_matrix calls the undecorated scorers (__wrapped__) with its context.
+def takes_decision_context(scorer):
+    @wraps(scorer)
+    def wrapper(ai_game, *args):
+        return scorer(get_decision_context(ai_game), *args)
+    return wrapper
+
+# Returns a hashable key for a selection (Cards contain lists, so Selections can't be hashed directly).
+def selection_key(selection):
+    return (selection.card.name if selection.card else None, selection.action, selection.payment)
+
 ### SCORING METHODS ###
 
+# Every scorer takes (ai_game, selection), with the AiGame or the DecisionContext of the decision (see takes_decision_context).
+
 def get_effects_from_selection(ai_game, selection):
     if selection.action == 'play':
         return selection.card.effects
@@ -15,6 +130,7 @@ def get_effects_from_selection(ai_game, selection):
         return ai_game.get_ai_wonder().get_next_free_stage().effects
     return []
 
+@takes_decision_context
 def score_multi(ai_game, selection):
     score = 0
     for effect in get_effects_from_selection(ai_game, selection):
@@ -22,6 +138,7 @@ def score_multi(ai_game, selection):
             score += 1
     return score
 
+@takes_decision_context
 def score_grey(ai_game, selection):
     wonder = ai_game.get_ai_wonder()
     if wonder.name + wonder.side in ['BabylonDay', 'BabylonNight', 'HalikarnassosNight']:
@@ -32,92 +149,92 @@ def score_grey(ai_game, selection):
         score += 1
     return score
 
+@takes_decision_context
 def score_chain(ai_game, selection):
     if selection.action != 'play':
         return 0
     score = len(selection.card.chains)
     return score
 
+@takes_decision_context
 def score_unlock_wonder_stage(ai_game, selection):
     wonder = ai_game.get_ai_wonder()
     hand = ai_game.get_ai_hand()
     future_wonder_stages = wonder.stages[wonder.stages_built:]
-    score = 0
-    for stage in future_wonder_stages:
-        old_payment = wonder.get_min_gold_payment(ai_game.wonders, hand, Selection(None, 'wonder', None))
-        new_payment = wonder.with_simulated_selection(ai_game.wonders, selection).get_min_gold_payment(ai_game.wonders, hand, Selection(None, 'wonder', None))
-        if not old_payment and new_payment:
-            score += 1
-    return score
+    if not future_wonder_stages or ai_game.get_base_payment(Selection(None, 'wonder', None)):
+        return 0
+    # Note: this looks at the next stage only, once for each future stage.
+    new_payment = ai_game.get_simulated_wonder(selection).get_min_gold_payment(ai_game.wonders, hand, Selection(None, 'wonder', None))
+    if new_payment:
+        return len(future_wonder_stages)
+    return 0
 
+@takes_decision_context
 def score_cheapen_wonder_stage(ai_game, selection):
-    wonder = ai_game.get_ai_wonder()
-    future_wonder_stages = wonder.stages[wonder.stages_built:]
-
-    resources_produced_without_card = wonder.get_all_resources_produced()
-    resources_produced_with_card = wonder.with_simulated_selection(ai_game.wonders, selection).get_all_resources_produced()
-
-    grey_mod = 0.5 if wonder.has_effect('marketplace', '') else 1
-    brown_mod = 0.5 if wonder.has_effect('tradingpost', 'neg') or wonder.has_effect('tradingpost', 'pos') else 1
-
-    score = 0
-    score_mult = 1
-    for stage in future_wonder_stages:
-        resources_needed = stage.cost.resources
-        for r in ALL_RESOURCES:
-            rneeded = sum(1 for rn in resources_needed if rn == r)
-            rprod_without_card = sum(1 for rn in resources_produced_without_card if rn == r)
-            rprod_with_card = sum(1 for rn in resources_produced_with_card if rn == r)
-            benefit = max(min(rprod_with_card, rneeded) - rprod_without_card, 0)
-            tpost_mult = grey_mod if r in GREY_RESOURCES else brown_mod
-            score += score_mult * tpost_mult * benefit
-        score_mult = score_mult/(1 + score_mult)  # 1 -> 1/2 -> 1/3 -> ...
-    return score
-
+    return batch_score_cheapen_wonder_stage(ai_game, [selection])[0]
+
+@takes_decision_context
+def batch_score_cheapen_wonder_stage(ai_game, selections):
+    resources_produced_without_card = ai_game.resources_produced
+    scores = []
+    for selection in selections:
+        resources_produced_with_card = ai_game.get_resources_produced_with(selection)
+        # Resources whose production doesn't change can't cheapen anything
+        changed = [i for i in range(NUM_RESOURCES) if resources_produced_with_card[i] != resources_produced_without_card[i]]
+        score = 0
+        score_mult = 1
+        for resources_needed in ai_game.future_stage_costs:
+            for i in changed:
+                benefit = max(min(resources_produced_with_card[i], resources_needed[i]) - resources_produced_without_card[i], 0)
+                score += score_mult * ai_game.trading_mults[i] * benefit
+            score_mult = score_mult/(1 + score_mult)  # 1 -> 1/2 -> 1/3 -> ...
+        scores.append(score)
+    return scores
+
+@takes_decision_context
 def score_unlock_future_cards(ai_game, selection):
-    wonder = ai_game.get_ai_wonder()
     hand = ai_game.get_ai_hand()
+    new_wonder = ai_game.get_simulated_wonder(selection)
     score = 0
-    for age in [1, 2, 3]:
-        if age < ai_game.age: continue
-        score_mult = {0: 1, 1: 1, 2: 0.5}[age - ai_game.age]
-        for future_card in get_cards_for_players_age(len(ai_game.wonders), age):
-            old_payment = wonder.get_min_gold_payment(ai_game.wonders, hand, Selection(future_card, 'play', None))
-            new_payment = wonder.with_simulated_selection(ai_game.wonders, selection).get_min_gold_payment(ai_game.wonders, hand, Selection(future_card, 'play', None))
-            if not old_payment and new_payment:
-                score += score_mult
+    for score_mult, future_card, _ in ai_game.future_cards:
+        future_selection = Selection(future_card, 'play', None)
+        if ai_game.get_base_payment(future_selection):
+            continue
+        new_payment = new_wonder.get_min_gold_payment(ai_game.wonders, hand, future_selection)
+        if new_payment:
+            score += score_mult
     return score
 
+@takes_decision_context
 def score_cheapen_future_cards(ai_game, selection):
-    wonder = ai_game.get_ai_wonder()
-
-    resources_produced_without_card = wonder.get_all_resources_produced()
-    resources_produced_with_card = wonder.with_simulated_selection(ai_game.wonders, selection).get_all_resources_produced()
-
-    grey_mod = 0.5 if wonder.has_effect('marketplace', '') else 1
-    brown_mod = 0.5 if wonder.has_effect('tradingpost', 'neg') or wonder.has_effect('tradingpost', 'pos') else 1
-
-    score = 0
-    for age in [1, 2, 3]:
-        if age < ai_game.age: continue
-        score_mult = {0: 1, 1: 1, 2: 0.5}[age - ai_game.age]
-        for future_card in get_cards_for_players_age(len(ai_game.wonders), age):
-            resources_needed = future_card.cost.resources
-            for r in ALL_RESOURCES:
-                rneeded = sum(1 for rn in resources_needed if rn == r)
-                rprod_without_card = sum(1 for rn in resources_produced_without_card if rn == r)
-                rprod_with_card = sum(1 for rn in resources_produced_with_card if rn == r)
-                benefit = max(min(rprod_with_card, rneeded) - rprod_without_card, 0)
-                tpost_mult = grey_mod if r in GREY_RESOURCES else brown_mod
-                score += score_mult * tpost_mult * benefit
-    return score
-
+    return batch_score_cheapen_future_cards(ai_game, [selection])[0]
+
+# The benefit of a selection for a future card is sum(max(min(with[i], needed[i]) - without[i], 0)) over resources, where
+# with >= without. That is min(with[i], needed[i]) - min(without[i], needed[i]), so the sum over all future cards is a
+# difference of two lookups in the future cost tables for each resource.
+@takes_decision_context
+def batch_score_cheapen_future_cards(ai_game, selections):
+    resources_produced_without_card = ai_game.resources_produced
+    tables = ai_game.future_cost_tables
+    base = [table[min(k, len(table) - 1)] for table, k in zip(tables, resources_produced_without_card)]
+    scores = []
+    for selection in selections:
+        resources_produced_with_card = ai_game.get_resources_produced_with(selection)
+        score = 0
+        for i in range(NUM_RESOURCES):
+            k = resources_produced_with_card[i]
+            if k != resources_produced_without_card[i]:
+                score += ai_game.trading_mults[i] * (tables[i][min(k, len(tables[i]) - 1)] - base[i])
+        scores.append(score)
+    return scores
+
+@takes_decision_context
 def score_points(ai_game, selection):
     wonder = ai_game.get_ai_wonder()
     payment = selection.payment or Payment(0, 0, 0)
     cards_left = len(ai_game.get_ai_hand())
-    old_points = wonder.compute_points_total(ai_game.wonders)
-    new_points = wonder.with_simulated_selection(ai_game.wonders, selection).compute_points_total(ai_game.wonders)
+    old_points = ai_game.points
+    new_points = ai_game.get_simulated_wonder(selection).compute_points_total(ai_game.wonders)
     points = new_points - old_points
     # Points removed from cost
     points -= payment.total()/3
@@ -139,35 +256,36 @@ def score_points(ai_game, selection):
             points += 3
     return points
 
+@takes_decision_context
 def score_shields(ai_game, selection):
     if all(effect.type != 'shields' for effect in get_effects_from_selection(ai_game, selection)):
         return 0
-    wonder = ai_game.get_ai_wonder()
-    neg_neighbor, pos_neighbor = wonder.get_neighbors(ai_game.wonders)
-    old_shields = wonder.get_shields()
-    new_shields = wonder.with_simulated_selection(ai_game.wonders, selection).get_shields()
+    old_shields = ai_game.shields
+    new_shields = ai_game.get_simulated_wonder(selection).get_shields()
+    neg_shields, pos_shields = ai_game.neg_shields, ai_game.pos_shields
 
     shields_per_age = ai_game.age
 
     score = 0
-    if old_shields > neg_neighbor.get_shields() + shields_per_age:
+    if old_shields > neg_shields + shields_per_age:
         score += 0  # >2 military cards away
-    elif new_shields > neg_neighbor.get_shields() + shields_per_age:
+    elif new_shields > neg_shields + shields_per_age:
         score += 0.7  # 1 military card away
-    elif new_shields > neg_neighbor.get_shields():
+    elif new_shields > neg_shields:
         score += 1  # 0 cards away (already winning)
-    elif new_shields > neg_neighbor.get_shields() - shields_per_age:
+    elif new_shields > neg_shields - shields_per_age:
         score += 0.2  # Losing, but 1 card away
-    if old_shields > pos_neighbor.get_shields() + shields_per_age:
+    if old_shields > pos_shields + shields_per_age:
         score += 0
-    elif new_shields > pos_neighbor.get_shields() + shields_per_age:
+    elif new_shields > pos_shields + shields_per_age:
         score += 0.7
-    elif new_shields > pos_neighbor.get_shields():
+    elif new_shields > pos_shields:
         score += 1
-    elif new_shields > pos_neighbor.get_shields() - shields_per_age:
+    elif new_shields > pos_shields - shields_per_age:
         score += 0.2
     return score
 
+@takes_decision_context
 def score_nonstandard_effects_as_points(ai_game, selection):
     points = 0
     for effect in get_effects_from_selection(ai_game, selection):
@@ -181,6 +299,7 @@ def score_nonstandard_effects_as_points(ai_game, selection):
             points += {1: 4, 2: 5, 3: 6}[ai_game.age]
     return points
 
+@takes_decision_context
 def score_play_from_discard_as_points(ai_game, selection):
     points = 0
     for effect in get_effects_from_selection(ai_game, selection):
@@ -194,6 +313,7 @@ def score_play_from_discard_as_points(ai_game, selection):
         points += points_for_age
     return points
 
+@takes_decision_context
 def score_science(ai_game, selection):
     wonder = ai_game.get_ai_wonder()
     if (wonder.name + wonder.side) not in ['BabylonDay', 'BabylonNight', 'HalikarnassosNight']:
@@ -204,6 +324,7 @@ def score_science(ai_game, selection):
             points += 1
     return points
 
+@takes_decision_context
 def score_wonder_off_age(ai_game, selection):
     if selection.action != 'wonder':
         return 0
@@ -222,6 +343,7 @@ def score_wonder_off_age(ai_game, selection):
         score += 2
     return score
 
+@takes_decision_context
 def score_wonder_during_age(ai_game, selection):
     if selection.action != 'wonder':
         return 0
@@ -237,13 +359,14 @@ def score_wonder_during_age(ai_game, selection):
         return 1
     return 0
 
+@takes_decision_context
 def score_gold_gain(ai_game, selection):
     wonder = ai_game.get_ai_wonder()
     if wonder.gold >= 9:
         return 0
 
     old_gold = wonder.gold
-    new_gold = wonder.with_simulated_selection(ai_game.wonders, selection).gold
+    new_gold = ai_game.get_simulated_wonder(selection).gold
     gold_gain = new_gold - old_gold
     num_cards_in_hand = len(ai_game.get_ai_hand())
 
@@ -258,10 +381,11 @@ def score_gold_gain(ai_game, selection):
         
     return score
 
+@takes_decision_context
 def score_gold_after_play(ai_game, selection):
     wonder = ai_game.get_ai_wonder()
     num_cards_in_hand = len(ai_game.get_ai_hand())
-    gold_after_play = wonder.with_simulated_selection(ai_game.wonders, selection).gold
+    gold_after_play = ai_game.get_simulated_wonder(selection).gold
 
     bad_gold_threshold = {1: 0, 2: 0, 3: 4}[ai_game.age]
     bad_gold_threshold_last_hand = {1: 2, 2: 4, 3: 0}[ai_game.age]
@@ -279,13 +403,12 @@ def score_gold_after_play(ai_game, selection):
         
     return score
 
+@takes_decision_context
 def score_marketplace_greys(ai_game, selection):
     if all(e.type != 'marketplace' for e in get_effects_from_selection(ai_game, selection)):
         return 0
-    wonder = ai_game.get_ai_wonder()
-    neg_neighbor, pos_neighbor = wonder.get_neighbors(ai_game.wonders)
-    neg_pr, _ = neg_neighbor.get_purchasable_resources()
-    pos_pr, _ = pos_neighbor.get_purchasable_resources()
+    neg_pr, _ = ai_game.neg_neighbor.get_purchasable_resources()
+    pos_pr, _ = ai_game.pos_neighbor.get_purchasable_resources()
     score = 0
     for grey in ['press', 'glass', 'loom']:
         if grey in neg_pr or grey in pos_pr:
@@ -293,15 +416,14 @@ def score_marketplace_greys(ai_game, selection):
             continue
     return score
 
+@takes_decision_context
 def score_tradingpost_browns(ai_game, selection):
-    wonder = ai_game.get_ai_wonder()
-    neg_neighbor, pos_neighbor = wonder.get_neighbors(ai_game.wonders)
     effects = get_effects_from_selection(ai_game, selection)
     pr, pmr = None, None
     if any(e.type == 'tradingpost' and e.subtype == 'neg' for e in effects):
-        pr, pmr = neg_neighbor.get_purchasable_resources()
+        pr, pmr = ai_game.neg_neighbor.get_purchasable_resources()
     if any(e.type == 'tradingpost' and e.subtype == 'pos' for e in effects):
-        pr, pmr = pos_neighbor.get_purchasable_resources()
+        pr, pmr = ai_game.pos_neighbor.get_purchasable_resources()
     if not pr or not pmr:
         return 0
     score = len([r for r in pr if r not in GREY_RESOURCES]) + 2*len(pmr)
@@ -309,99 +431,161 @@ def score_tradingpost_browns(ai_game, selection):
 
 ### AI ###
 
-# Returns a distribution of scores, weighted accordingly.
-def get_score_distribution(ai_game, selection):
-    # Manually defined weights for now :(
-    # I'd love to run some kind of machine learning algorithm in the future to train these.
-    weights = {
-        1: {
-            'multi': 50,
-            'grey': -25,
-            'chain': 0.25,
-            'unlock_wonder_stage': 6,
-            'cheapen_wonder_stage': 4,
-            'unlock_future_cards': 4,
-            'cheapen_future_cards': 0.25,
-            'points': 1,
-            'shields': 2,
-            'science': 2.25,
-            'wonder_off_age': 1,
-            'wonder_during_age': -0.33,
-            'gold_gain': 0.33,
-            'gold_after_play': -3,
-            'marketplace_greys': 2.5,
-            'tradingpost_browns': 1,
-        },
-        2: {
-            'grey': -3.33,
-            'chain': 0.17,
-            'unlock_wonder_stage': 7,
-            'cheapen_wonder_stage': 3.33,
-            'unlock_future_cards': 1.33,
-            'cheapen_future_cards': 0.15,
-            'points': 1,
-            'shields': 5,
-            'science': 3.17,
-            'wonder_off_age': 1,
-            'wonder_during_age': -0.33,
-            'gold_gain': 0.17,
-            'gold_after_play': -2.4,
-        },
-        3: {
-            'points': 1,
-            'shields': 3.9,
-            'wonder_during_age': -1.1,
-            'gold_gain': 0.1,
-            'gold_after_play': -2,
-        }
+# The scorers of get_score_matrix, as (score name, weight name, scorer).
+SCORERS = [
+    ('multi', 'multi', score_multi),
+    ('grey', 'grey', score_grey),
+    ('chain', 'chain', score_chain),
+    ('unlock_wonder_stage', 'unlock_wonder_stage', score_unlock_wonder_stage),
+    ('cheapen_wonder_stage', 'cheapen_wonder_stage', score_cheapen_wonder_stage),
+    ('unlock_future_cards', 'unlock_future_cards', score_unlock_future_cards),
+    ('cheapen_future_cards', 'cheapen_future_cards', score_cheapen_future_cards),
+    ('points', 'points', score_points),
+    ('shields', 'shields', score_shields),
+    ('nonstandard_effect', 'points', score_nonstandard_effects_as_points),  # Use points weight
+    ('play_from_discard', 'points', score_play_from_discard_as_points),  # Use points weight
+    ('science', 'science', score_science),
+    ('wonder_off_age', 'wonder_off_age', score_wonder_off_age),
+    ('wonder_during_age', 'wonder_during_age', score_wonder_during_age),
+    ('gold_gain', 'gold_gain', score_gold_gain),
+    ('gold_after_play', 'gold_after_play', score_gold_after_play),
+    ('marketplace_greys', 'marketplace_greys', score_marketplace_greys),
+    ('tradingpost_browns', 'tradingpost_browns', score_tradingpost_browns),
+]
+
+# Scorers that score a list of selections at once, by score name (see get_score_matrix).
+BATCH_SCORERS = {
+    'cheapen_wonder_stage': batch_score_cheapen_wonder_stage,
+    'cheapen_future_cards': batch_score_cheapen_future_cards,
+}
+
+SCORE_NAMES = [name for name, _, _ in SCORERS]
+
+# The weights of each scorer's score, for each age (scorers without a weight in an age don't count in that age).
+# Manually defined, they can be tuned with tune_weights.py (see ai/weight_tuning.py) and loaded with load_weights.
+DEFAULT_WEIGHTS = {
+    1: {
+        'multi': 50,
+        'grey': -25,
+        'chain': 0.25,
+        'unlock_wonder_stage': 6,
+        'cheapen_wonder_stage': 4,
+        'unlock_future_cards': 4,
+        'cheapen_future_cards': 0.25,
+        'points': 1,
+        'shields': 2,
+        'science': 2.25,
+        'wonder_off_age': 1,
+        'wonder_during_age': -0.33,
+        'gold_gain': 0.33,
+        'gold_after_play': -3,
+        'marketplace_greys': 2.5,
+        'tradingpost_browns': 1,
+    },
+    2: {
+        'grey': -3.33,
+        'chain': 0.17,
+        'unlock_wonder_stage': 7,
+        'cheapen_wonder_stage': 3.33,
+        'unlock_future_cards': 1.33,
+        'cheapen_future_cards': 0.15,
+        'points': 1,
+        'shields': 5,
+        'science': 3.17,
+        'wonder_off_age': 1,
+        'wonder_during_age': -0.33,
+        'gold_gain': 0.17,
+        'gold_after_play': -2.4,
+    },
+    3: {
+        'points': 1,
+        'shields': 3.9,
+        'wonder_during_age': -1.1,
+        'gold_gain': 0.1,
+        'gold_after_play': -2,
     }
+}
 
-    age = ai_game.age
-    score = {
-        'multi': weights[age].get('multi', 0) * score_multi(ai_game, selection),
-        'grey': weights[age].get('grey', 0) * score_grey(ai_game, selection),
-        'chain': weights[age].get('chain', 0) * score_chain(ai_game, selection),
-        'unlock_wonder_stage': weights[age].get('unlock_wonder_stage', 0) * score_unlock_wonder_stage(ai_game, selection),
-        'unlock_wonder_stage': weights[age].get('unlock_wonder_stage', 0) * score_unlock_wonder_stage(ai_game, selection),
-        'cheapen_wonder_stage': weights[age].get('cheapen_wonder_stage', 0) * score_cheapen_wonder_stage(ai_game, selection),
-        'unlock_future_cards': weights[age].get('unlock_future_cards', 0) * score_unlock_future_cards(ai_game, selection),
-        'cheapen_future_cards': weights[age].get('cheapen_future_cards', 0) * score_cheapen_future_cards(ai_game, selection),
-        'points': weights[age].get('points', 0) * score_points(ai_game, selection),
-        'shields': weights[age].get('shields', 0) * score_shields(ai_game, selection),
-        'nonstandard_effect': weights[age].get('points', 0) * score_nonstandard_effects_as_points(ai_game, selection),  # Use points weight
-        'play_from_discard': weights[age].get('points', 0) * score_play_from_discard_as_points(ai_game, selection),  # Use points weight
-        'science': weights[age].get('science', 0) * score_science(ai_game, selection),
-        'wonder_off_age': weights[age].get('wonder_off_age', 0) * score_wonder_off_age(ai_game, selection),
-        'wonder_during_age': weights[age].get('wonder_during_age', 0) * score_wonder_during_age(ai_game, selection),
-        'gold_gain': weights[age].get('gold_gain', 0) * score_gold_gain(ai_game, selection),
-        'gold_after_play': weights[age].get('gold_after_play', 0) * score_gold_after_play(ai_game, selection),
-        'marketplace_greys': weights[age].get('marketplace_greys', 0) * score_marketplace_greys(ai_game, selection),
-        'tradingpost_browns': weights[age].get('tradingpost_browns', 0) * score_tradingpost_browns(ai_game, selection),
-    }
-    return score
+# Returns weights (same format as DEFAULT_WEIGHTS) loaded from a JSON file written by save_weights.
+def load_weights(path):
+    with open(path) as f:
+        return {int(age): age_weights for age, age_weights in json.load(f).items()}
 
+# Writes weights (same format as DEFAULT_WEIGHTS) to a JSON file.
+def save_weights(weights, path):
+    with open(path, 'w') as f:
+        json.dump(weights, f, indent=4)
+
+# Returns a distribution of scores, weighted accordingly.
+# ai_game is the AiGame or the DecisionContext of the current decision.
+def get_score_distribution(ai_game, selection, weights=DEFAULT_WEIGHTS):
+    return dict(zip(SCORE_NAMES, get_score_matrix(ai_game, [selection], weights)[0]))
+
+# Returns the weighted scores of every selection as a matrix: one row per selection, one column per scorer (in the order
+# of SCORE_NAMES). Scores are computed one scorer at a time over all selections, so that batch scorers (see
+# BATCH_SCORERS) compute what the selections share once. Scorers without weight in the age score 0 and are not run.
+# ai_game is the AiGame or the DecisionContext of the current decision.
+def get_score_matrix(ai_game, selections, weights=DEFAULT_WEIGHTS):
+    ai_game = get_decision_context(ai_game)
+    age_weights = weights[ai_game.age]
+    matrix = [[0] * len(SCORERS) for _ in selections]
+    for j, (name, weight, scorer) in enumerate(SCORERS):
+        weight = age_weights.get(weight, 0)
+        if weight == 0:
+            continue
+        batch_scorer = BATCH_SCORERS[name].__wrapped__ if name in BATCH_SCORERS else partial(score_each, scorer.__wrapped__)
+        if instrumentation.recorder is None:
+            scores = batch_scorer(ai_game, selections)
+        else:
+            scores = instrumentation.recorder.time_batch_scorer(name, batch_scorer, ai_game, selections)
+        for row, score in zip(matrix, scores):
+            row[j] = weight * score
+    return matrix
+
+# Helper for get_score_matrix. Scores the selections one by one with a single-selection scorer.
+def score_each(scorer, ai_game, selections):
+    return [scorer(ai_game, selection) for selection in selections]
+
+# Returns the total weighted score of each selection (see get_score_matrix).
+# ai_game is the AiGame or the DecisionContext of the current decision.
+def get_total_scores(ai_game, selections, weights=DEFAULT_WEIGHTS):
+    return [sum(row) for row in get_score_matrix(ai_game, selections, weights)]
+
+# - verbose: print the scores of every move and the chosen move
+# - weights: the scorer weights to use (DEFAULT_WEIGHTS by default, see load_weights)
 class FirstAi:
-    def __init__(self, verbose=True):
+    def __init__(self, verbose=True, weights=None):
         self.verbose = verbose
+        self.weights = weights or DEFAULT_WEIGHTS
 
     def get_selection(self, ai_game, cards):
+        return instrumentation.record_decision(ai_game.age, self._get_selection, ai_game, cards)
+
+    def get_build_card_from_discard(self, ai_game, cards):
+        return instrumentation.record_decision(ai_game.age, self._get_build_card_from_discard, ai_game, cards)
+
+    # Helper for get_selection.
+    def _get_selection(self, ai_game, cards):
         wonder = ai_game.get_ai_wonder()
         possible_selections = wonder.get_all_possible_selections(ai_game.wonders, cards)
 
+        ai_game = DecisionContext(ai_game)
         selection = self.choose_pick_scores_reasons(ai_game, possible_selections)
         
         if selection.action == 'wonder':
             if len(cards) == 2 and any(e.type == 'build_from_discard' for e in wonder.get_next_free_stage().effects):
                 bury_card = next((card for card in cards if card in wonder.played_cards), None)
                 if not bury_card:
-                    bury_card = min(cards, key=lambda card: sum(get_score_distribution(ai_game, Selection(card, 'play', None)).values()))
+                    scores = get_total_scores(ai_game, [Selection(card, 'play', None) for card in cards], self.weights)
+                    bury_card = cards[min(range(len(cards)), key=lambda c: scores[c])]
             else:
                 bury_card = choice(cards)
             selection = Selection(bury_card, selection.action, selection.payment)
         elif selection.action == 'throw':
             if wonder.get_next_free_stage() and any(e.type == 'build_from_discard' for e in wonder.get_next_free_stage().effects):
                 possible_cards = [card for card in cards if card not in wonder.played_cards]
-                bury_card = max(possible_cards, key=lambda card: sum(get_score_distribution(ai_game, Selection(card, 'play', None)).values()))
+                scores = get_total_scores(ai_game, [Selection(card, 'play', None) for card in possible_cards], self.weights)
+                bury_card = possible_cards[max(range(len(possible_cards)), key=lambda c: scores[c])]
             else:
                 bury_card = choice(cards)
             selection = Selection(choice(cards), selection.action, selection.payment)
@@ -410,12 +594,14 @@ class FirstAi:
 
         return selection
     
-    def get_build_card_from_discard(self, ai_game, cards):
+    # Helper for get_build_card_from_discard.
+    def _get_build_card_from_discard(self, ai_game, cards):
         wonder = ai_game.get_ai_wonder()
         possible_cards = [card for card in cards if card not in wonder.played_cards]
 
         possible_selections = [Selection(card, 'play', None) for card in possible_cards]
 
+        ai_game = DecisionContext(ai_game)
         selection = self.choose_pick_scores_reasons(ai_game, possible_selections)
         card = selection.card
         
@@ -425,7 +611,8 @@ class FirstAi:
 
     # Print reasons for choosing each card and pick the best one.
     def choose_pick_scores_reasons(self, ai_game, possible_selections):
-        possible_selections_scores = [(selection, get_score_distribution(ai_game, selection)) for selection in possible_selections]
+        matrix = get_score_matrix(ai_game, possible_selections, self.weights)
+        possible_selections_scores = [(selection, dict(zip(SCORE_NAMES, row))) for selection, row in zip(possible_selections, matrix)]
         possible_selections_scores.sort(key=lambda ms: sum(ms[1].values()), reverse=True)
         
         if self.verbose:
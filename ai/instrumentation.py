@@ -0,0 +1,141 @@
+import json
+import time
+
+from game.base import Wonder
+
+# Optional instrumentation of FirstAi decisions, to find out what makes a move slow:
+# - call counts and cumulative time of each scorer of get_score_matrix
+# - number of calls to the expensive Wonder methods in COUNTED_WONDER_METHODS, per decision
+# It is off by default. When off, get_score_matrix only checks that recorder is None and the Wonder methods are
+# not wrapped at all.
+# Usage:
+#   recorder = start_instrumentation()
+#   ...play a game...
+#   stop_instrumentation()
+#   recorder.dump('instrumentation.json')
+# Dicts of several recorders (e.g. one per game of a batch, see run_batch_local_games_routine) are combined with
+# aggregate_instrumentation.
+# Instrumentation is single-threaded only: there is one recorder per process and start_instrumentation wraps the Wonder
+# methods for the whole process, so decisions made at the same time in other threads (e.g. run_sessions deciding in the
+# session threads) would be mixed into the same decisions and counts.
+
+COUNTED_WONDER_METHODS = ['with_simulated_selection', 'get_all_payment_plans', 'get_min_payment_plans']
+
+# The active Instrumentation, or None when instrumentation is off.
+recorder = None
+
+# Records scorer timings and Wonder method counts.
+# - scorers: dict of scorer name -> [calls, seconds]
+# - counts: dict of Wonder method name -> calls since the recorder started
+# - decisions: list of dicts for each decision: age, seconds, and counts (Wonder method calls during the decision)
+class Instrumentation:
+    def __init__(self):
+        self.scorers = {}
+        self.counts = {name: 0 for name in COUNTED_WONDER_METHODS}
+        self.decisions = []
+        self._decision_start = None
+
+    # Marks the start of an AI decision.
+    def start_decision(self, age):
+        self._decision_start = (age, time.perf_counter(), dict(self.counts))
+
+    # Marks the end of the AI decision started last.
+    def end_decision(self):
+        age, start, counts = self._decision_start
+        self.decisions.append({
+            'age': age,
+            'seconds': time.perf_counter() - start,
+            'counts': {name: self.counts[name] - counts[name] for name in self.counts},
+        })
+        self._decision_start = None
+
+    # Calls the batch scorer on the selections and records its time, as one call for each selection.
+    def time_batch_scorer(self, name, scorer, ai_game, selections):
+        start = time.perf_counter()
+        result = scorer(ai_game, selections)
+        entry = self.scorers.get(name)
+        if entry is None:
+            entry = self.scorers[name] = [0, 0.0]
+        entry[0] += len(selections)
+        entry[1] += time.perf_counter() - start
+        return result
+
+    # Returns the recorded data as a JSON-serializable dict.
+    def to_dict(self):
+        return {
+            'decisions': len(self.decisions),
+            'decision_seconds': sum(decision['seconds'] for decision in self.decisions),
+            'scorers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.scorers.items()},
+            'counts': dict(self.counts),
+            'per_decision': self.decisions,
+        }
+
+    # Writes the recorded data to a JSON file.
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+# Runs decide(*args) as one decision of the active recorder, if any, and returns its result. The decision is ended even
+# if decide raises, so that later timings aren't added to it.
+def record_decision(age, decide, *args):
+    active = recorder
+    if active is None:
+        return decide(*args)
+    active.start_decision(age)
+    try:
+        return decide(*args)
+    finally:
+        active.end_decision()
+
+# Starts instrumentation with a new Instrumentation and returns it.
+def start_instrumentation():
+    global recorder
+    if recorder is not None:
+        raise Exception("Instrumentation is already started")
+    recorder = Instrumentation()
+    for name in COUNTED_WONDER_METHODS:
+        setattr(Wonder, name, _counted(name, getattr(Wonder, name)))
+    return recorder
+
+# Stops instrumentation and returns the Instrumentation that was active.
+def stop_instrumentation():
+    global recorder
+    if recorder is None:
+        raise Exception("Instrumentation is not started")
+    for name in COUNTED_WONDER_METHODS:
+        setattr(Wonder, name, getattr(Wonder, name).original)
+    stopped, recorder = recorder, None
+    return stopped
+
+# Combines the dicts of several Instrumentations (from Instrumentation.to_dict) into one dict of the same format.
+def aggregate_instrumentation(dicts):
+    result = {'decisions': 0, 'decision_seconds': 0, 'scorers': {}, 'counts': {name: 0 for name in COUNTED_WONDER_METHODS}, 'per_decision': []}
+    for d in dicts:
+        result['decisions'] += d['decisions']
+        result['decision_seconds'] += d['decision_seconds']
+        for name, scorer in d['scorers'].items():
+            total = result['scorers'].setdefault(name, {'calls': 0, 'seconds': 0})
+            total['calls'] += scorer['calls']
+            total['seconds'] += scorer['seconds']
+        for name, count in d['counts'].items():
+            result['counts'][name] = result['counts'].get(name, 0) + count
+        result['per_decision'].extend(d['per_decision'])
+    return result
+
+# Returns a readable summary of an instrumentation dict: per-decision averages and scorers sorted by total time.
+def format_instrumentation(d):
+    decisions = max(d['decisions'], 1)
+    lines = [f"{d['decisions']} decisions, {1000 * d['decision_seconds'] / decisions:.2f} ms per decision"]
+    for name, count in d['counts'].items():
+        lines.append(f"  {name}: {count / decisions:.1f} calls per decision")
+    for name, scorer in sorted(d['scorers'].items(), key=lambda s: s[1]['seconds'], reverse=True):
+        lines.append(f"  {name}: {scorer['calls']} calls, {1000 * scorer['seconds']:.1f} ms total, {1e6 * scorer['seconds'] / max(scorer['calls'], 1):.1f} us per call")
+    return '\n'.join(lines)
+
+# Helper for start_instrumentation. Wraps a Wonder method to count its calls in the active recorder.
+def _counted(name, method):
+    def counted(self, *args, **kwargs):
+        recorder.counts[name] += 1
+        return method(self, *args, **kwargs)
+    counted.original = method
+    return counted
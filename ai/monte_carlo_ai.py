@@ -0,0 +1,246 @@
+import os
+import random
+import time
+
+from collections import namedtuple
+from multiprocessing import Pool, parent_process
+
+from game.base import *
+from game.deck import *
+from game.fast_game import FastGame
+from ai.first_ai import FirstAi
+from ai.rollout_ai import get_rollout_selection, get_rollout_discard_card
+from ai.transposition_table import TranspositionTable
+
+# An AI which searches with Monte Carlo playouts.
+# For each possible move, it plays many random games to the end on the headless FastGame engine (with the random moves
+# of RolloutAi, see ai/rollout_ai.py) and picks the move with the best average final rank (or score). Cards it can't see
+# are determinized for each playout:
+# - opponents' hands are the cards the AI saw in them (tracked by AiGame), completed with cards drawn at random from the
+#   unseen cards of the age deck (see the hand inference of AiGame)
+# - hands of later ages are dealt at random from their age decks
+# - the discard pile is only known when building from it, otherwise playouts start with an empty discard pile
+# Note: the unknown cards of age 3 include all guilds, not only the ones in the game.
+# Playout results are kept in a transposition table, by the hash of the position right after the AI's move together
+# with what the AI knows of the hidden cards (see get_candidate_hash):
+# - candidates that reach the same position (e.g. two copies of a card in hand) share their playouts
+# - a decision seen again (e.g. the same opening in another game, or a turn asked again after a reconnection) starts
+#   from the playouts of the earlier searches, which the new ones add to
+# - time_budget: wall-clock seconds to spend on each decision (each worker finishes its current playout after it)
+# - processes: number of worker processes (defaults to the number of cores). 1, or running inside a worker process of
+#   another pool (e.g. run_batch_local_games_routine or the AI pool of run_sessions), searches in this process
+# - objective: 'rank' to maximize the expected final rank (then score), 'score' to maximize the expected final score
+class MonteCarloAi:
+    def __init__(self, time_budget=5, processes=None, objective='rank', verbose=True):
+        if objective not in ['rank', 'score']:
+            raise Exception(f"Unknown objective '{objective}'")
+        self.time_budget = time_budget
+        self.processes = processes or os.cpu_count()
+        self.objective = objective
+        self.verbose = verbose
+        self.last_selection = None
+        self.table = TranspositionTable(1 << 12)
+
+    def get_selection(self, ai_game, cards):
+        wonder = ai_game.get_ai_wonder()
+        candidates = get_candidate_selections(wonder, ai_game.wonders, cards)
+
+        # Only Babylon's last card play is made with a single card in hand.
+        mode = 'last_card' if len(cards) == 1 else 'turn'
+        hand_sizes = [len(cards) if mode == 'turn' or j == ai_game.i else 0 for j in range(len(ai_game.wonders))]
+        selection = self.search(ai_game, cards, hand_sizes, [], mode, candidates)
+
+        if self.verbose: print('AI wants to:', selection)
+
+        self.last_selection = selection
+        return selection
+
+    def get_build_card_from_discard(self, ai_game, cards):
+        wonder = ai_game.get_ai_wonder()
+        candidates = [card for card in cards if card not in wonder.played_cards] + [None]
+
+        # The tracked hands are from before the turn: every player has used one card since, and the last card of the age
+        # is discarded (or played by Babylon, which also empties the tracked hand) before the discard play.
+        hand = ai_game.get_ai_hand()[:]
+        if self.last_selection and self.last_selection.card in hand:
+            hand.remove(self.last_selection.card)
+        hand_size = len(ai_game.get_ai_hand()) - 1
+        if hand_size <= 1:
+            hand, hand_size = [], 0
+        hand_sizes = [hand_size] * len(ai_game.wonders)
+        card = self.search(ai_game, hand, hand_sizes, cards, 'discard', candidates)
+
+        if self.verbose: print('AI wants play from discard:', card.name if card else None)
+
+        return card
+
+    # Sides are not searched, same choice as FirstAi.
+    def get_wonder_side(self, wonder_names):
+        return FirstAi(verbose=False).get_wonder_side(wonder_names)
+
+    # Runs playouts for every candidate until the time budget is spent and returns the best candidate.
+    # - hand, hand_sizes: the AI's hand and the current hand size of each player
+    # - discard_pile: the known discard pile
+    # - mode: 'turn', 'last_card' or 'discard' (see run_playout)
+    # - candidates: Selections ('turn', 'last_card') or Cards/None ('discard') to choose from
+    def search(self, ai_game, hand, hand_sizes, discard_pile, mode, candidates):
+        if len(candidates) == 1:
+            return candidates[0]
+
+        deadline = time.time() + self.time_budget
+        state = PlayoutState(ai_game, hand, hand_sizes, discard_pile)
+        # Only search one of the candidates that reach the same position
+        hashes = []
+        searched = []
+        for candidate in candidates:
+            h = get_candidate_hash(state, mode, candidate)
+            if h not in hashes:
+                hashes.append(h)
+                searched.append(candidate)
+        if len(searched) == 1:
+            return searched[0]
+
+        # Pools of worker processes would start a pool per worker and oversubscribe the machine.
+        processes = 1 if parent_process() else self.processes
+        tasks = [(state, mode, searched, deadline, random.getrandbits(63), k * len(searched) // processes) for k in range(processes)]
+        if processes == 1:
+            results = [run_playouts(task) for task in tasks]
+        else:
+            # A pool per search, so that no worker process outlives the decision.
+            with Pool(processes) as pool:
+                results = pool.map(run_playouts, tasks)
+
+        # Sum the (playouts, rank sum, score sum) of all workers and of earlier searches, and store them for later ones
+        self.table.new_search()
+        totals = []
+        for c in range(len(searched)):
+            total = self.table.get(hashes[c]) or (0, 0, 0)
+            total = tuple(total[k] + sum(result[c][k] for result in results) for k in range(3))
+            self.table.put(hashes[c], total, total[0])
+            totals.append(total)
+        stats = [(rank_sum / n, score_sum / n) if n else (len(hand_sizes), 0) for n, rank_sum, score_sum in totals]
+        if self.objective == 'rank':
+            keys = [(-rank, score) for rank, score in stats]
+        else:
+            keys = [(score, -rank) for rank, score in stats]
+        best = max(range(len(searched)), key=lambda c: keys[c])
+
+        if self.verbose:
+            print(f"{sum(total[0] for total in totals)} playouts:", ', '.join(f"{searched[c]} (rank {stats[c][0]:.2f}, score {stats[c][1]:.1f}, n={totals[c][0]})" for c in range(len(searched))))
+
+        return searched[best]
+
+# Everything a playout needs to know about the decision, from the AI's perspective.
+# - ai_game: the AiGame of the AI, with its wonders (copied for each playout) and its inference of the unseen hands
+# - hand: the AI's hand
+# - hand_sizes: the number of cards in each player's hand
+# - discard_pile: the known discard pile
+PlayoutState = namedtuple('PlayoutState', ['ai_game', 'hand', 'hand_sizes', 'discard_pile'])
+
+# Returns all the selections the AI can choose from, with every distinct card of the hand to bury for wonder and throw moves.
+def get_candidate_selections(wonder, wonders, cards):
+    distinct_cards = []
+    for card in cards:
+        if card not in distinct_cards:
+            distinct_cards.append(card)
+    candidates = []
+    for selection in wonder.get_all_possible_selections(wonders, cards):
+        if selection.action == 'play':
+            candidates.append(selection)
+        else:
+            candidates.extend(Selection(card, selection.action, selection.payment) for card in distinct_cards)
+    return candidates
+
+# Returns the hash of the position right after the AI plays the candidate (see FastGame.get_state_hash), combined with
+# the mode, the hand sizes and what the AI knows of the hidden cards (the hands it saw and the unseen cards), so that equal
+# hashes mean the same playouts.
+def get_candidate_hash(state, mode, candidate):
+    ai_game, i = state.ai_game, state.ai_game.i
+    game = FastGame([wonder.copy() for wonder in ai_game.wonders])
+    game.age = ai_game.age
+    game.hands = [state.hand[:] if j == i else [] for j in range(len(ai_game.wonders))]
+    game.discard_pile = state.discard_pile[:]
+    if mode == 'discard':
+        if candidate:
+            game.wonders[i].add_played_card(candidate)
+            game.execute_effects(i, compile_card(candidate).effects)
+            game.discard_pile.remove(candidate)
+    else:
+        game.execute_selection(i, candidate)
+        if candidate.action == 'play':
+            game.execute_effects(i, compile_card(candidate.card).effects)
+        elif candidate.action == 'wonder':
+            game.execute_effects(i, game.wonders[i].get_last_built_stage_effects())
+
+    h = game.get_state_hash() ^ zobrist_key(SEARCH_TAG, ['turn', 'last_card', 'discard'].index(mode))
+    for j in range(len(ai_game.wonders)):
+        known = state.hand if j == i else ai_game.hands[j]
+        hand_hash = cards_hash(known) if ai_game.hand_seen[j] else MASK_64
+        h ^= position_hash(SEARCH_TAG, 8 + j, hand_hash ^ zobrist_key(SEARCH_TAG, 64 + state.hand_sizes[j]))
+    return h ^ position_hash(SEARCH_TAG, 4, card_counts_hash(ai_game.unseen_counts))
+
+# Deals random hands for an age, same as get_random_starting_hands but with the given Random.
+def deal_age(player_count, age, rng):
+    deck = get_cards_for_players_age(player_count, age)
+    if age == 3:
+        guilds, deck = deck[:10], deck[10:]
+        deck = rng.sample(guilds, player_count+2) + deck
+    rng.shuffle(deck)
+    return [deck[7*i:7*(i+1)] for i in range(player_count)]
+
+# Worker for MonteCarloAi.search. Runs playouts over the candidates in turn, starting from first_candidate, until the
+# deadline (every candidate gets at least one playout). Returns (playouts, rank sum, score sum) for each candidate.
+def run_playouts(task):
+    state, mode, candidates, deadline, seed, first_candidate = task
+    rng = random.Random(seed)
+    results = [[0, 0, 0] for _ in candidates]
+    c, played = first_candidate, 0
+    while played < len(candidates) or time.time() < deadline:
+        scores = run_playout(state, mode, candidates[c % len(candidates)], rng)
+        result = results[c % len(candidates)]
+        result[0] += 1
+        i = state.ai_game.i
+        result[1] += 1 + sum(score > scores[i] for score in scores)
+        result[2] += scores[i]
+        c, played = c + 1, played + 1
+    return results
+
+# Runs one determinized playout where the AI starts with the candidate and everyone plays randomly after. Returns the
+# final scores of all wonders.
+# - mode 'turn': regular turn, the candidate is the AI's Selection
+# - mode 'last_card': Babylon's last card play, the candidate is the AI's Selection
+# - mode 'discard': Halikarnassos' discard play, the candidate is the Card to build (or None)
+def run_playout(state, mode, candidate, rng):
+    ai_game = state.ai_game
+    hands = ai_game.sample_hands(rng, state.hand, state.hand_sizes)
+
+    game = FastGame([wonder.copy() for wonder in ai_game.wonders])
+    game.initialize_age(ai_game.age, hands)
+    game.discard_pile = state.discard_pile[:]
+    wonders = game.wonders
+    if mode == 'turn':
+        selections = [get_rollout_selection(wonders, wonders[j], hands[j], rng) if j != ai_game.i else candidate for j in range(len(wonders))]
+        game.execute_turn(selections)
+    elif mode == 'last_card':
+        game.wait_for_last_card_play = True
+        game.execute_last_card_turn(candidate)
+    else:
+        game.wait_for_discard_play = True
+        game.execute_discard_turn(candidate)
+
+    later_hands = {age: deal_age(len(wonders), age, rng) for age in range(ai_game.age + 1, 4)}
+    while True:
+        if game.wait_for_last_card_play:
+            j = next(j for j in range(len(wonders)) if wonders[j].has_effect('play_last_card'))
+            game.execute_last_card_turn(get_rollout_selection(wonders, wonders[j], game.hands[j], rng))
+        elif game.wait_for_discard_play:
+            j = next(j for j in range(len(wonders)) if wonders[j].has_effect('build_from_discard'))
+            game.execute_discard_turn(get_rollout_discard_card(wonders[j], game.discard_pile, rng))
+        elif not game.age_initialized:
+            if game.age == 3:
+                break
+            game.initialize_age(game.age + 1, later_hands[game.age + 1])
+        else:
+            game.execute_turn([get_rollout_selection(wonders, wonders[j], game.hands[j], rng) for j in range(len(wonders))])
+
+    return game.get_scores()
@@ -4,6 +4,9 @@ from random import choice
 
 # An AI which makes random choices from the list of possible moves.
 class RandomAi:
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+
     def get_selection(self, ai_game, cards):
         wonder = ai_game.get_ai_wonder()
         possible_selections = wonder.get_all_possible_selections(ai_game.wonders, cards)
@@ -20,7 +23,7 @@ class RandomAi:
         if selection.action in ['wonder', 'throw']:
             selection = Selection(choice(cards), selection.action, selection.payment)
         
-        print('AI wants to:', selection)
+        if self.verbose: print('AI wants to:', selection)
 
         return selection
     
@@ -32,12 +35,12 @@ class RandomAi:
 
         # Returning None skips the discard play.
         if len(possible_cards) == 0:
-            print(f"No possible cards in the discard: {cards}")
+            if self.verbose: print(f"No possible cards in the discard: {cards}")
             return None
         
         card = choice(possible_cards)
 
-        print('AI wants to play from discard:', card.name)
+        if self.verbose: print('AI wants to play from discard:', card.name)
 
         return card
     
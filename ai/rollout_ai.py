@@ -0,0 +1,99 @@
+import random
+import threading
+
+from game.base import *
+
+# An AI which plays random moves as fast as possible, e.g. as the rollout policy of a search (see MonteCarloAi).
+# Its moves follow the same distribution as RandomAi (every possible play or wonder stage is equally likely, throw only
+# if nothing else is possible, minimum gold payments, random card to bury or throw), but moves are sampled lazily
+# instead of listing every possible selection:
+# - the options (each card of the hand, then the next wonder stage) are tried in a random order, drawn one at a time
+#   with a partial Fisher-Yates shuffle of a preallocated index buffer, and the first affordable one is played
+# - an option is affordable if the cheapest payment of its PaymentEntry (see Wonder.get_payment_entry) is, so payment
+#   plans are never listed and the payment solver only runs the first time a cost is seen with the same boards
+# Nothing is printed.
+# - rng: the random generator to use (anything with a random() method). Defaults to the random module, so that seeded
+#   games (see run_seeded_local_game_routine) are reproducible
+class RolloutAi:
+    def __init__(self, rng=None):
+        self.rng = rng or random
+
+    def get_selection(self, ai_game, cards):
+        return get_rollout_selection(ai_game.wonders, ai_game.get_ai_wonder(), cards, self.rng)
+
+    def get_build_card_from_discard(self, ai_game, cards):
+        return get_rollout_discard_card(ai_game.get_ai_wonder(), cards, self.rng)
+
+    def get_wonder_side(self, wonder_names):
+        return 'Day' if self.rng.random() < 0.5 else 'Night'
+
+# Index buffers for the random order of options, by number of options, for each thread (playouts can run in several
+# threads at once, e.g. MonteCarloAi in the session threads of run_sessions). Each buffer always holds a permutation of
+# its indices, so it can be shuffled again in place without being reset.
+ORDER_BUFFERS = threading.local()
+
+# Selections used to look up payments, by card id (see get_play_probe), and for the next wonder stage.
+PLAY_PROBES = {}
+WONDER_PROBE = Selection(None, 'wonder', None)
+
+# Returns the index buffer for n options of the current thread.
+def get_order_buffer(n):
+    buffers = getattr(ORDER_BUFFERS, 'buffers', None)
+    if buffers is None:
+        buffers = ORDER_BUFFERS.buffers = [list(range(k)) for k in range(16)]
+    while len(buffers) <= n:
+        buffers.append(list(range(len(buffers))))
+    return buffers[n]
+
+# Returns the Selection to play a card without payment, to look up its payment.
+def get_play_probe(card):
+    card_id = compile_card(card).id
+    probe = PLAY_PROBES.get(card_id)
+    if probe is None:
+        probe = PLAY_PROBES.setdefault(card_id, Selection(card, 'play', None))
+    return probe
+
+# Returns a random Selection for the wonder's hand (see RolloutAi), or None if the hand is empty.
+def get_rollout_selection(wonders, wonder, hand, rng):
+    rand = rng.random
+    n = len(hand)
+    if n == 0:
+        return None
+    options = n + 1 if wonder.get_next_free_stage() else n
+    order = get_order_buffer(options)
+    for t in range(options):
+        j = t + int(rand() * (options - t))
+        order[t], order[j] = order[j], order[t]
+        k = order[t]
+        if k == n:
+            payment = get_affordable_payment(wonders, wonder, hand, WONDER_PROBE)
+            if payment:
+                return Selection(hand[int(rand() * n)], 'wonder', payment)
+        elif not wonder.has_played_card(hand[k]):
+            payment = get_affordable_payment(wonders, wonder, hand, get_play_probe(hand[k]))
+            if payment:
+                return Selection(hand[k], 'play', payment)
+    return Selection(hand[int(rand() * n)], 'throw', None)
+
+# Returns a random Card of the discard pile that the wonder hasn't played yet, or None if there is none.
+def get_rollout_discard_card(wonder, cards, rng):
+    rand = rng.random
+    n = len(cards)
+    order = get_order_buffer(n)
+    for t in range(n):
+        j = t + int(rand() * (n - t))
+        order[t], order[j] = order[j], order[t]
+        card = cards[order[t]]
+        if not wonder.has_played_card(card):
+            return card
+    return None
+
+# Helper for get_rollout_selection. Returns the min gold Payment of the selection if the wonder can afford it, or None.
+def get_affordable_payment(wonders, wonder, hand, selection):
+    entry = wonder.get_payment_entry(wonders, hand, selection)
+    if entry is None:
+        return None
+    cheapest = entry.get_cheapest_payment()
+    if cheapest is None or wonder.gold < entry.bank + cheapest[0] + cheapest[1]:
+        return None
+    return Payment(cheapest[0], entry.bank, cheapest[1])
@@ -0,0 +1,59 @@
+# A bounded transposition table for game-tree search: stores a value (e.g. an evaluation) for a state hash (see
+# KnownGame.get_state_hash), so that a search reaching the same state again, e.g. by another move order, reuses it.
+# MonteCarloAi keeps its playout results in one (see ai/monte_carlo_ai.py).
+# The table has a fixed number of buckets, picked by the low bits of the hash, with two entries per bucket:
+# - the first entry keeps the deepest value (the one that took the most search to compute). A new value only replaces
+#   it if it is at least as deep, or if the entry was stored during an older search (see new_search)
+# - the second entry takes every other new value, so that recent states are found even when the first entry is taken
+# The full hash is stored with each entry to tell apart the states that share a bucket. Values can't be None.
+# Usage:
+#   table = TranspositionTable()
+#   value = table.get(game.get_state_hash(), depth)
+#   if value is None:
+#       value = ...search...
+#       table.put(game.get_state_hash(), value, depth)
+# - size: number of buckets, rounded up to a power of 2 (the table holds at most 2 * size values)
+# - generation: the current search, increased by new_search
+# - hits, misses: number of get calls that found / didn't find a value
+class TranspositionTable:
+    def __init__(self, size=1 << 16):
+        self.size = 1 << max(size - 1, 0).bit_length()
+        self.mask = self.size - 1
+        self.clear()
+
+    # Removes every value.
+    def clear(self):
+        self.hashes = [None] * (2 * self.size)
+        self.depths = [0] * (2 * self.size)
+        self.generations = [0] * (2 * self.size)
+        self.values = [None] * (2 * self.size)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Marks the start of a new search. Values stored before stay readable, but deep ones no longer block new values.
+    def new_search(self):
+        self.generation += 1
+
+    # Returns the value stored for the hash with at least the given depth, or None.
+    def get(self, state_hash, depth=0):
+        slot = (state_hash & self.mask) << 1
+        for i in (slot, slot + 1):
+            if self.hashes[i] == state_hash and self.depths[i] >= depth:
+                self.hits += 1
+                return self.values[i]
+        self.misses += 1
+        return None
+
+    # Stores the value for the hash, computed with the given depth (see the replacement policy above).
+    def put(self, state_hash, value, depth=0):
+        slot = (state_hash & self.mask) << 1
+        if self.hashes[slot] is None or self.hashes[slot] == state_hash or depth >= self.depths[slot] or self.generations[slot] != self.generation:
+            if self.hashes[slot + 1] == state_hash:
+                self.hashes[slot + 1] = None
+        else:
+            slot += 1
+        self.hashes[slot] = state_hash
+        self.depths[slot] = depth
+        self.generations[slot] = self.generation
+        self.values[slot] = value
@@ -0,0 +1,132 @@
+import random
+
+from functools import partial
+from math import ceil
+from multiprocessing import Pool
+
+from routines.batch_local_games_routine import get_batch_seeds, run_seeded_local_game_routine
+from ai.first_ai import FirstAi, DEFAULT_WEIGHTS, save_weights
+
+# Genetic search over FirstAi's scorer weights (see DEFAULT_WEIGHTS in ai/first_ai.py).
+#
+# Every weight of the base weights is a parameter, except 'points' which is the unit of the others and stays at 1.
+# Each generation:
+# - every candidate plays seeded games in one seat against baseline FirstAis (with the base weights) in the other seats.
+#   All candidates of a generation play the same seeds and seats, so they are compared on the same games
+# - games are played in rounds. After each round but the last, the worse half of the remaining candidates is dropped
+#   (keeping at least the elites), so bad candidates don't use up the games (successive halving)
+# - the fitness of a game is 1 for first place, 0 for last place and in between for other places (ties share the better
+#   place). A candidate as strong as the baseline has a fitness of about 0.5
+# - the elites go to the next generation as they are. The rest of the next generation are children of two candidates of
+#   the better half: each weight is taken from either parent, then mutated with a gaussian relative to its base value
+# Games run on a process pool. The best weights are those of the best candidate of the last generation: elites play new
+# games in every generation, so a candidate that was lucky once doesn't stay on top.
+
+# Runs the genetic search above.
+# - base_weights: the weights of the baseline AIs and of the first candidate
+# - player_count: number of players in the tuning games
+# - population: number of candidates in each generation
+# - elites: number of best candidates kept as they are in the next generation
+# - sigma: standard deviation of mutations, relative to each weight's base value (or 0.1 for small weights)
+# - games_per_round, rounds: games of each remaining candidate per round, and number of rounds per generation
+# - processes: number of worker processes (defaults to the number of cores). 1 plays the games in this process
+# - seed: seed of the search (mutations and game seeds)
+# - verbose: print the results of each generation
+class WeightTuner:
+    def __init__(self, base_weights=DEFAULT_WEIGHTS, player_count=4, population=16, elites=4, sigma=0.3, games_per_round=8, rounds=3, processes=None, seed=0, verbose=True):
+        if elites >= population:
+            raise Exception("There must be fewer elites than candidates")
+        self.base_weights = base_weights
+        self.keys = get_weight_keys(base_weights)
+        self.player_count = player_count
+        self.population = population
+        self.elites = elites
+        self.sigma = sigma
+        self.games_per_round = games_per_round
+        self.rounds = rounds
+        self.processes = processes
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+
+    # Runs the search for the given number of generations and returns the best weights found. If output_path is given,
+    # the best weights are written to it (see save_weights) after each generation.
+    def run(self, generations, output_path=None):
+        candidates = [weights_to_vector(self.base_weights, self.keys)]
+        candidates += [self.mutate(candidates[0]) for _ in range(self.population - 1)]
+        pool = Pool(self.processes) if self.processes != 1 else None
+        try:
+            for generation in range(generations):
+                ranking, fitness, games = self.evaluate(candidates, pool)
+                best = ranking[0]
+                best_weights = vector_to_weights(candidates[best], self.keys, self.base_weights)
+                if output_path:
+                    save_weights(best_weights, output_path)
+                if self.verbose:
+                    print(f"Generation {generation}: best fitness {fitness[best]:.3f} over {games[best]} games, {sum(games)} games played")
+                candidates = self.next_generation(candidates, ranking)
+        finally:
+            if pool:
+                pool.close()
+        return best_weights
+
+    # Plays the games of a generation and returns (ranking, fitness, games): the candidate indices from best to worst,
+    # and the average fitness and number of games of each candidate. Candidates that played more rounds rank higher.
+    def evaluate(self, candidates, pool):
+        seeds = get_batch_seeds(self.games_per_round * self.rounds, self.rng.getrandbits(63))
+        totals = [0] * len(candidates)
+        games = [0] * len(candidates)
+        remaining = list(range(len(candidates)))
+        for round_i in range(self.rounds):
+            round_seeds = seeds[round_i * self.games_per_round:(round_i + 1) * self.games_per_round]
+            tasks = [
+                (c, vector_to_weights(candidates[c], self.keys, self.base_weights), seed, k % self.player_count)
+                for c in remaining for k, seed in enumerate(round_seeds, round_i * self.games_per_round)
+            ]
+            play = partial(_play_tuning_game, self.base_weights, self.player_count)
+            for c, game_fitness in (pool.imap_unordered(play, tasks) if pool else map(play, tasks)):
+                totals[c] += game_fitness
+                games[c] += 1
+            if round_i < self.rounds - 1:
+                remaining.sort(key=lambda c: totals[c] / games[c], reverse=True)
+                remaining = remaining[:max(self.elites, ceil(len(remaining) / 2))]
+        fitness = [totals[c] / games[c] for c in range(len(candidates))]
+        ranking = sorted(range(len(candidates)), key=lambda c: (games[c], fitness[c]), reverse=True)
+        return ranking, fitness, games
+
+    # Returns the candidates of the next generation from the ranking of the current one.
+    def next_generation(self, candidates, ranking):
+        parents = [candidates[c] for c in ranking[:max(2, len(ranking) // 2)]]
+        children = [candidates[c] for c in ranking[:self.elites]]
+        while len(children) < self.population:
+            a, b = self.rng.sample(parents, 2)
+            children.append(self.mutate([self.rng.choice(pair) for pair in zip(a, b)]))
+        return children
+
+    # Returns a copy of a weight vector with a gaussian mutation on every weight.
+    def mutate(self, vector):
+        base = weights_to_vector(self.base_weights, self.keys)
+        return [w + self.rng.gauss(0, self.sigma * max(abs(b), 0.1)) for w, b in zip(vector, base)]
+
+# Returns the (age, name) of every tuned weight of the weights, in a fixed order.
+def get_weight_keys(weights):
+    return [(age, name) for age in sorted(weights) for name in sorted(weights[age]) if name != 'points']
+
+# Returns the list of values of the weights for the keys.
+def weights_to_vector(weights, keys):
+    return [weights[age][name] for age, name in keys]
+
+# Returns weights with the values of the vector for the keys, and the other weights of base_weights.
+def vector_to_weights(vector, keys, base_weights):
+    weights = {age: dict(age_weights) for age, age_weights in base_weights.items()}
+    for (age, name), value in zip(keys, vector):
+        weights[age][name] = round(value, 4)
+    return weights
+
+# Helper for WeightTuner.evaluate (must be module-level to be picklable). Plays one game with the candidate in the
+# given seat and returns (candidate index, fitness).
+def _play_tuning_game(base_weights, player_count, task):
+    c, weights, seed, seat = task
+    ais = [FirstAi(verbose=False, weights=weights if i == seat else base_weights) for i in range(player_count)]
+    scores = run_seeded_local_game_routine(ais, seed).scores
+    place = sum(score > scores[seat] for score in scores)
+    return c, 1 - place / (player_count - 1)
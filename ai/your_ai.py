@@ -14,11 +14,17 @@ from random import choice
 # - All wonders                         : ai_game.wonders -> Wonder[]
 # - All hands                           : ai_game.hands -> Card[][]
 # - Current age                         : ai_game.age -> number
+# - Likely cards in a player's hand     : ai_game.get_hand_distribution(player_index) -> (Card, number)[]
+# - Random hands consistent with play   : ai_game.sample_hands([rng]) -> Card[][]
 # - All cards in age deck               : get_cards_for_players_age(player_count, age) -> Card[]
+# - Age deck (read-only, no copy)       : get_age_deck(player_count, age) -> (Card, ...)
+# - Age of a card                      : get_card_age(card) -> number
+# - Card by name                        : get_card_by_name(name) -> Card
 # - All possible moves                  : wonder.get_all_possible_selections(wonders, hand) -> Selection[]
 # - Validate selection                  : wonder.validate_selection(wonders, hand, selection) -> (bool, string)
 # - Get Payment with min total          : wonder.get_min_gold_payment(wonders, hand, selection) -> Payment
 # - Get all Payment options             : wonder.get_all_payment_plans(wonders, hand, selection) -> Payment[]
+# - Get cheapest Payment options        : wonder.get_min_payment_plans(wonders, hand, selection) -> Payment[]
 # - New wonder with selection performed : wonder.with_simulated_selection(wonders, selection) -> Wonder
 # - Total points                        : wonder.compute_points_total() -> number
 # - Check if wonder has an effect       : wonder.has_effect(effect_type[, effect_subtype]) -> bool
@@ -26,10 +32,13 @@ from random import choice
 # - All purchasable resources           : wonder.get_purchasable_resources() -> (string[], string[])
 # - Full list of resources produced     : wonder.get_all_resources_produced() -> string[]
 # - All cards of a color                : wonder.get_cards_by_color(color) -> Card[]
+# - Number of cards of a color          : wonder.count_cards_by_color(color) -> number
 # - Latest-build stage                  : wonder.get_last_built_stage() -> WonderStage
 # - Next free stage                     : wonder.get_next_free_stage() -> WonderStage
 # - Total shield count                  : wonder.get_shields() -> number
 # - Has a specific chain                : wonder.has_chain(chain) -> bool
+# - Points for one more science symbol  : wonder.get_science_marginal_values() -> (gear, compass, tablet, wildcard)
+# - FirstAi's scores of a move          : get_score_distribution(ai_game, selection) -> dict (see ai/first_ai.py)
 
 
 # Compute the point gain of the move.
@@ -0,0 +1,254 @@
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+
+from routines.batch_local_games_routine import get_batch_seeds, run_seeded_local_game_routine
+from game.base import *
+from game.deck import *
+from game.wonders import *
+from ai.random_ai import RandomAi
+from ai.rollout_ai import RolloutAi
+from ai.first_ai import FirstAi
+
+# Headless benchmarks for the rules engine and AI decision latency. Measures:
+# - payment.<case>.cold_ms / warm_ms: get_all_payment_plans on hard costs, with empty and filled solver caches
+# - selections.hand<n>.ms: get_all_possible_selections for each hand size, over the states of seeded FirstAi games
+# - first_ai.<n>p.age<a>.p50_ms / p90_ms / p99_ms / max_ms: FirstAi.get_selection latency per player count and age
+# - game.<ai>.<n>p.s_per_game: full games on FastGame, in this process
+# Every result is a time (lower is better). Results are written as JSON and compared with a stored baseline: any result
+# slower than the baseline by more than the tolerance is reported, and the script exits with status 1. Latency tails
+# (p99, max) come from too few decisions to be stable, so they are reported but not compared.
+# Times depend on the machine, so they are not compared directly: each run also times a fixed reference workload (see
+# reference_workload), and results are compared as multiples of it. A baseline saved on one machine can then be used on
+# another one, as long as both run the same Python version.
+# Steps:
+# - 1. Run `python benchmark.py` (add --quick for a shorter run)
+# - 2. After an intended performance change, run `python benchmark.py --save-baseline` and commit benchmark_baseline.json
+
+baseline_path = 'benchmark_baseline.json'
+output_path = 'bench_output.json'
+tolerance = 0.25
+uncompared_suffixes = ('.p99_ms', '.max_ms')
+base_seed = 0
+
+# An AI wrapper that times the wrapped AI's get_selection and get_all_possible_selections on every decision.
+# - timings: dict of result name -> list of times in seconds
+class TimedAi:
+    def __init__(self, ai, timings):
+        self.ai = ai
+        self.timings = timings
+
+    def get_selection(self, ai_game, cards):
+        start = time.perf_counter()
+        selection = self.ai.get_selection(ai_game, cards)
+        self.record(f"first_ai.{len(ai_game.wonders)}p.age{ai_game.age}", start)
+
+        start = time.perf_counter()
+        ai_game.get_ai_wonder().get_all_possible_selections(ai_game.wonders, cards)
+        self.record(f"selections.hand{len(cards)}", start)
+        return selection
+
+    def get_build_card_from_discard(self, ai_game, cards):
+        return self.ai.get_build_card_from_discard(ai_game, cards)
+
+    def get_wonder_side(self, wonder_names):
+        return self.ai.get_wonder_side(wonder_names)
+
+    def record(self, name, start):
+        self.timings.setdefault(name, []).append(time.perf_counter() - start)
+
+# Returns the hard payment cases as (name, wonders, hand, selection), with the paying wonder first.
+# All of them mix single and multi resources on both sides with trading discounts.
+def get_payment_cases():
+    def wonder_with(wonder, cards, stages_built=0):
+        for card in cards:
+            wonder.add_played_card(card)
+        for _ in range(stages_built):
+            wonder.build_stage()
+        return wonder
+
+    cases = []
+
+    wonders = [
+        wonder_with(ALEXANDRIA_NIGHT(), [TREE_FARM, FOREST_CAVE, CARAVANSERY, WEST_TRADING_POST, MARKETPLACE], 1),
+        wonder_with(GIZA_DAY(), [EXCAVATION, CLAY_PIT, MINE, PRESS, LOOM, GLASSWORKS]),
+        wonder_with(RHODOS_DAY(), [TREE_FARM, TIMBER_YARD, FOREST_CAVE, PRESS, GLASSWORKS]),
+    ]
+    cases.append(('palace', wonders, [PALACE], Selection(PALACE, 'play', None)))
+
+    wonders = [
+        wonder_with(GIZA_DAY(), [EAST_TRADING_POST]),
+        wonder_with(BABYLON_DAY(), [CLAY_PIT, EXCAVATION, TREE_FARM, GLASSWORKS, PRESS, LOOM]),
+        wonder_with(EPHESOS_DAY(), [CLAY_PIT, MINE, TREE_FARM, EXCAVATION, GLASSWORKS, LOOM, PRESS]),
+    ]
+    cases.append(('pantheon', wonders, [PANTHEON], Selection(PANTHEON, 'play', None)))
+
+    wonders = [
+        wonder_with(OLYMPIA_DAY(), [FOREST_CAVE, CARAVANSERY, MARKETPLACE]),
+        wonder_with(HALIKARNASSOS_DAY(), [TREE_FARM, TIMBER_YARD, MINE, EXCAVATION]),
+        wonder_with(GIZA_NIGHT(), [FOREST_CAVE, MINE, CLAY_PIT, TIMBER_YARD]),
+    ]
+    cases.append(('senate', wonders, [SENATE], Selection(SENATE, 'play', None)))
+
+    wonders = [
+        wonder_with(GIZA_NIGHT(), [TREE_FARM, WEST_TRADING_POST, EAST_TRADING_POST], 3),
+        wonder_with(RHODOS_NIGHT(), [MINE, EXCAVATION, CLAY_PIT, FOREST_CAVE, GLASSWORKS]),
+        wonder_with(ALEXANDRIA_DAY(), [TIMBER_YARD, TREE_FARM, MINE, PRESS, LOOM]),
+    ]
+    cases.append(('giza_stage4', wonders, [LOOM], Selection(None, 'wonder', None)))
+
+    return cases
+
+# Benchmarks get_all_payment_plans on each hard case, with empty (cold) and filled (warm) solver caches.
+def benchmark_payments(results, repeat):
+    for name, wonders, hand, selection in get_payment_cases():
+        wonder = wonders[0]
+        if not wonder.get_all_payment_plans(wonders, hand, selection):
+            raise Exception(f"Payment case {name} has no payment plan")
+        cold = []
+        for _ in range(repeat):
+            clear_payment_caches()
+            start = time.perf_counter()
+            wonder.get_all_payment_plans(wonders, hand, selection)
+            cold.append(time.perf_counter() - start)
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(100):
+                wonder.get_all_payment_plans(wonders, hand, selection)
+            warm.append((time.perf_counter() - start) / 100)
+        results[f"payment.{name}.cold_ms"] = 1000 * median(cold)
+        results[f"payment.{name}.warm_ms"] = 1000 * min(warm)
+
+# Benchmarks FirstAi decisions and get_all_possible_selections over seeded games for each player count.
+def benchmark_decisions(results, games_per_player_count):
+    timings = {}
+    for player_count in range(3, 8):
+        ai = TimedAi(FirstAi(verbose=False), timings)
+        for seed in get_batch_seeds(games_per_player_count, base_seed + player_count):
+            run_seeded_local_game_routine([ai] * player_count, seed)
+    for name, times in sorted(timings.items()):
+        if name.startswith('selections.'):
+            results[f"{name}.ms"] = 1000 * sum(times) / len(times)
+        else:
+            for p in [50, 90, 99]:
+                results[f"{name}.p{p}_ms"] = 1000 * percentile(times, p)
+            results[f"{name}.max_ms"] = 1000 * max(times)
+
+# Benchmarks full games on FastGame for each AI.
+def benchmark_games(results, games_per_ai):
+    for name, ai, player_count, num_games in [('random', RandomAi(verbose=False), 4, 10 * games_per_ai), ('rollout', RolloutAi(), 4, 10 * games_per_ai), ('first', FirstAi(verbose=False), 4, games_per_ai)]:
+        start = time.perf_counter()
+        for seed in get_batch_seeds(num_games, base_seed):
+            run_seeded_local_game_routine([ai] * player_count, seed)
+        results[f"game.{name}.{player_count}p.s_per_game"] = (time.perf_counter() - start) / num_games
+
+# A fixed pure Python workload that doesn't use the code being benchmarked (dicts, lists, tuples, integer arithmetic and
+# method calls, like the engine), so that its time only depends on the machine and the Python version.
+def reference_workload():
+    counts = {}
+    total = 0
+    for i in range(3000):
+        key = (i % 97, i % 13)
+        counts[key] = counts.get(key, 0) + 1
+        vector = [(i >> k) & 3 for k in range(7)]
+        total += sum(min(a, b) for a, b in zip(vector, vector[1:]))
+    return sorted(counts.items(), key=lambda item: item[1])[0], total
+
+# Returns the time of the reference workload in milliseconds (best of repeat runs). The garbage collector is off while it
+# runs, since its cost grows with everything the benchmarks keep alive (e.g. the payment caches).
+def benchmark_reference(repeat):
+    times = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            reference_workload()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return 1000 * min(times)
+
+# Returns the p-th percentile of a list of values (nearest rank).
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+# Returns the median of a list of values.
+def median(values):
+    return percentile(values, 50)
+
+# Returns the list of (name, baseline, result) of results slower than the baseline by more than the tolerance, with
+# results and baseline as multiples of their reference workload times (see benchmark_reference).
+def compare_with_baseline(results, reference_ms, baseline, baseline_reference_ms, tolerance):
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline or name.endswith(uncompared_suffixes):
+            continue
+        old, new = baseline[name] / baseline_reference_ms, results[name] / reference_ms
+        if new > old * (1 + tolerance):
+            regressions.append((name, old, new))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the rules engine and AI decision latency.')
+    parser.add_argument('--quick', action='store_true', help='shorter run (less stable results)')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--baseline', default=baseline_path, help=f"baseline file (default: {baseline_path})")
+    parser.add_argument('--output', default=output_path, help=f"results file (default: {output_path})")
+    parser.add_argument('--tolerance', type=float, default=tolerance, help=f"allowed slowdown before reporting a regression (default: {tolerance})")
+    args = parser.parse_args()
+
+    # The reference is timed between the benchmarks and its median is used, in case the machine's speed changes during the
+    # run (e.g. CPU boost).
+    references = [benchmark_reference(repeat=20)]
+    results = {}
+    benchmark_payments(results, repeat=5 if args.quick else 50)
+    references.append(benchmark_reference(repeat=20))
+    benchmark_decisions(results, games_per_player_count=1 if args.quick else 5)
+    references.append(benchmark_reference(repeat=20))
+    benchmark_games(results, games_per_ai=1 if args.quick else 5)
+    references.append(benchmark_reference(repeat=20))
+    reference_ms = median(references)
+
+    output = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'reference_ms': reference_ms,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+    for name in sorted(results):
+        print(f"{name}: {results[name]:.4f} ({results[name] / reference_ms:.4f}x reference)")
+    print(f"reference_ms: {reference_ms:.4f}")
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        sys.exit(0)
+    if 'reference_ms' not in baseline:
+        print(f"The baseline at {args.baseline} has no reference time, run with --save-baseline to create a new one")
+        sys.exit(0)
+    if baseline['python'] != output['python']:
+        print(f"Note: the baseline was saved with Python {baseline['python']}, results may not be comparable")
+
+    regressions = compare_with_baseline(results, reference_ms, baseline['results'], baseline['reference_ms'], args.tolerance)
+    print()
+    for name, old, new in regressions:
+        print(f"REGRESSION {name}: {old:.4f} -> {new:.4f} times the reference ({new / old:.2f}x)")
+    print(f"{len(regressions)} regressions (tolerance {args.tolerance:.0%})")
+    sys.exit(1 if regressions else 0)
@@ -1,15 +1,16 @@
-import traceback
 from concurrent.futures.thread import ThreadPoolExecutor
 
 from users import USERS
 from session.ai_session import AiSession
+from session.orchestrator import run_sessions
+from game.game_record import GameRecordWriter
 from game.ai_game import *
 from ai.random_ai import RandomAi
 from ai.first_ai import FirstAi
 from webdriver.common import *
 from selenium import webdriver
 from time import sleep
-from random import uniform, choice
+from random import choice
 
 # Runs a full session on BGA.
 # Prerequisites:
@@ -21,11 +22,15 @@ from random import uniform, choice
 # - 3. Run `python bga_session.py`
 # - 4. Navigate to the game on BGA until you are in-game (i.e. you can see your wonder board)
 # - 5. Press enter in console to start the AI
-# - 6. If manual_mode is True, press enter on each turn to perform the action.
+# - 6. If manual_mode is True, press enter on each turn to perform the action (one session at a time).
 
 players = USERS
 manual_mode = False
 ai = FirstAi()
+wait_timeout = 30  # Seconds each wait for a turn can last before checking again
+ai_processes = None  # Processes for AI decisions (one per session by default, 0 to decide in the session threads)
+record_path = None  # Record file to append each session's game to when it is done (see game/game_record.py)
+record_writer = None
 
 def create_session(player):
     options = webdriver.FirefoxOptions()
@@ -33,55 +38,26 @@ def create_session(player):
     options.add_argument("--height=1000")
     driver = webdriver.Firefox(options=options)
     driver.implicitly_wait(2)
-    return AiSession(driver, player[0], player[1], ai)
+    return AiSession(driver, player[0], player[1], ai, record_writer)
+
+if __name__ == '__main__':
+    if record_path:
+        record_writer = GameRecordWriter(record_path)
+    executor = ThreadPoolExecutor(len(players))
+    sessions = list(executor.map(create_session, players))
+
+    input('Enter to start AI')
+    for session in sessions:
+        session.start_ai()
+        session.set_state()
+        if session.game_state == CHOOSE_SIDE:
+            session.choose_side()
+            sleep(0.5)
+
+    # Each session plays on its own (see session/orchestrator.py) until every game is done.
+    run_sessions(sessions, ai_processes, wait_timeout, manual_mode)
+    if record_writer:
+        record_writer.close()
 
-executor = ThreadPoolExecutor(len(players))
-sessions = list(executor.map(create_session, players))
-
-input('Enter to start AI')
-for session in sessions:
-    session.start_ai()
-    session.set_state()
-    if session.game_state == CHOOSE_SIDE:
-        session.choose_side()
-        sleep(0.5)
-
-while any(session.game_state != DONE for session in sessions):
-    print('Waiting for next move...')
-    while all(session.game_state in [WAITING, DONE] for session in sessions):
-        if all(session.game_state == DONE for session in sessions):
-            break
-        for session in sessions:
-            session.set_state()
-        sleep(0.5)
-    
-    sleep(uniform(0, 1))
-
-    try:
-        selections = [session.select() for session in sessions]
-    except Exception:
-        traceback.print_exc()
-        selections = [None for session in sessions]
-
-    print()
-    print(sessions[0].ai_game)
     print()
-
-    for session, selection in zip(sessions, selections):
-        if selection:
-            print(session.name, 'will:', selection)
-
-    if manual_mode:
-        print()
-        input('Enter to continue')
-
-    for session, selection in zip(sessions, selections):
-        try:
-            session.act(selection)
-        except Exception:
-            traceback.print_exc()
-            continue
-        sleep(0.5)
-
-print()
-print('Game is done')
+    print('Game is done')
@@ -0,0 +1,55 @@
+from pathlib import Path
+from time import perf_counter
+
+from selenium import webdriver
+from webdriver.common import *
+
+# Checks the event-driven turn detection (wait_for_game_state) against a local stand-in for the BGA page
+# (webdriver/bga_stand_in.html). Each case sets up the page, waits for the turn and checks the game state returned and
+# how long the wait took.
+# Prerequisites: same as bga_session.py (Selenium and the Firefox webdriver).
+# Steps:
+# - 1. Run `python check_turn_detection.py`
+
+stand_in_url = (Path(__file__).parent / 'webdriver' / 'bga_stand_in.html').resolve().as_uri()
+play_title = 'You must choose a card to play'
+turn_states = [PLAY_NORMAL, PLAY_LAST_CARD, PLAY_DISCARD]
+# The turn that was just played: card 11 was played from a hand of cards 11, 12 and 13
+played_keys = get_played_turn_keys(play_title, ['11', '12', '13'], '11')
+
+# (name, page setup script, skip_keys, game_states, timeout, expected game state, min seconds, max seconds)
+cases = [
+    ('turn already started', f"setTurn('{play_title}', ['11', '12', '13'])", None, None, 5, PLAY_NORMAL, 0, 0.5),
+    ('turn starts later', f"setTitleLater('{play_title}', 1000)", None, None, 5, PLAY_NORMAL, 0.9, 1.5),
+    ('played turn is skipped', f"setTurn('{play_title}', ['11', '12', '13']); setTitleLater('Everyone must choose a card to play', 500); setTurnLater('{play_title}', ['21', '22'], 1000)", played_keys, None, 5, PLAY_NORMAL, 0.9, 1.5),
+    ('played card leaves the hand first', f"setTurn('{play_title}', ['12', '13']); setTurnLater('{play_title}', ['21', '22'], 1000)", played_keys, None, 5, PLAY_NORMAL, 0.9, 1.5),
+    ('next turn started before waiting', f"setTurn('{play_title}', ['21', '22'])", played_keys, None, 5, PLAY_NORMAL, 0, 0.5),
+    ('no new turn times out', f"setTurn('{play_title}', ['11', '12', '13'])", played_keys, None, 1, WAITING, 0.9, 1.5),
+    ('last card', "setTitleLater('You may play your last card', 500)", None, turn_states, 5, PLAY_LAST_CARD, 0.4, 1),
+    ('discard', "setTitleLater('You may construct a card from the discard pile for free', 500)", None, turn_states, 5, PLAY_DISCARD, 0.4, 1),
+    ('other states are ignored', "setTitle('You must choose a side of your Wonder board')", None, turn_states, 1, WAITING, 0.9, 1.5),
+    ('game end', "endGameLater(500)", None, turn_states, 5, DONE, 0.4, 1),
+    # Only gamedatas changes: caught by the 3 second fallback check of WAIT_FOR_TURN_SCRIPT
+    ('game end without page change', "endGameQuietlyLater(500)", None, turn_states, 10, DONE, 2.9, 3.5),
+]
+
+if __name__ == '__main__':
+    options = webdriver.FirefoxOptions()
+    options.add_argument('--headless')
+    driver = webdriver.Firefox(options=options)
+    ok = True
+    try:
+        for name, setup, skip_keys, game_states, timeout, expected, min_seconds, max_seconds in cases:
+            driver.get(stand_in_url)
+            driver.execute_script(setup)
+            start = perf_counter()
+            game_state = wait_for_game_state(driver, timeout, skip_keys, game_states)
+            elapsed = perf_counter() - start
+            same = game_state == expected and min_seconds <= elapsed <= max_seconds
+            ok = ok and same
+            print(f"{'OK  ' if same else 'FAIL'} {name}: {game_state} after {elapsed:.2f}s (expected {expected} in {min_seconds}-{max_seconds}s)")
+    finally:
+        driver.quit()
+
+    print()
+    print('Turn detection works' if ok else 'Turn detection FAILED')
@@ -0,0 +1,65 @@
+from copy import deepcopy
+
+import fixed_game
+import fixed_game_2
+from routines.batch_local_games_routine import get_batch_seeds, run_seeded_local_game_routine
+from game.known_game import KnownGame
+from game.fast_game import FastGame
+from game.base import *
+from ai.random_ai import RandomAi
+from ai.first_ai import FirstAi
+
+# Cross-checks the headless FastGame engine against KnownGame. Both engines must end every game with the same final scores.
+# - The fixed games from fixed_game.py and fixed_game_2.py are played move by move on both engines, which must also have
+#   the same state hash after every move (see KnownGame.get_state_hash).
+# - num_seeded_games seeded AI games per player count are played with both engines (same seed => same game).
+# Steps:
+# - 1. Run `python cross_check_fast_game.py`
+
+num_seeded_games = 5
+
+# Plays predetermined moves on a game engine. Same moves format as run_known_game_routine.
+# - hashes: a list to append the game's state hash to after every move
+def play_moves(game, starting_hands, moves, hashes):
+    for age in [1, 2, 3]:
+        game.initialize_age(age, deepcopy(starting_hands[age]))
+        hashes.append(game.get_state_hash())
+        for move in moves[age]:
+            if type(move) is list:
+                game.execute_turn(move)
+            elif type(move) is Selection:
+                game.execute_last_card_turn(move)
+            else:
+                game.execute_discard_turn(move)
+            hashes.append(game.get_state_hash())
+    return game
+
+# Returns each wonder's points string in the game.
+def get_points(game):
+    return [wonder.get_points_str(game.wonders) for wonder in game.wonders]
+
+# Prints and returns whether both point lists match.
+def check(name, known_points, fast_points):
+    same = known_points == fast_points
+    print(f"{'OK  ' if same else 'FAIL'} {name}: {known_points}" + ('' if same else f" != {fast_points}"))
+    return same
+
+if __name__ == '__main__':
+    ok = True
+    for module in [fixed_game, fixed_game_2]:
+        known_hashes, fast_hashes = [], []
+        known_game = play_moves(KnownGame(deepcopy(module.wonders), verbose=False), module.starting_hands, module.moves, known_hashes)
+        fast_game = play_moves(FastGame(deepcopy(module.wonders)), module.starting_hands, module.moves, fast_hashes)
+        ok = check(module.__name__, get_points(known_game), get_points(fast_game)) and ok
+        different = sum(known_hash != fast_hash for known_hash, fast_hash in zip(known_hashes, fast_hashes))
+        ok = check(f"{module.__name__} state hashes", f"{len(known_hashes)} states", f"{different} different" if different else f"{len(fast_hashes)} states") and ok
+
+    for player_count in range(3, 8):
+        for ais in [[RandomAi(verbose=False)] * player_count, [FirstAi(verbose=False)] * player_count]:
+            for seed in get_batch_seeds(num_seeded_games, player_count):
+                known_result = run_seeded_local_game_routine(ais, seed, fast=False)
+                fast_result = run_seeded_local_game_routine(ais, seed, fast=True)
+                ok = check(f"{type(ais[0]).__name__} x{player_count} seed {seed}", known_result.points, fast_result.points) and ok
+
+    print()
+    print('All games match' if ok else 'MISMATCH between FastGame and KnownGame')
@@ -64,4 +64,5 @@ moves = {
     ]
 }
 
-run_known_game_routine(ai, ai_i, wonders, starting_hands, moves, verbose=True, pause_each_move=True)
+if __name__ == '__main__':
+    run_known_game_routine(ai, ai_i, wonders, starting_hands, moves, verbose=True, pause_each_move=True)
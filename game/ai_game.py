@@ -1,6 +1,8 @@
 from collections import namedtuple
+from random import Random
 
 from game.base import *
+from game.deck import get_age_deck_counts
 
 # Represents a partially-known game from a single player/AI's perspective.
 # - i: the index of the AI's wonder/hand/etc.
@@ -8,6 +10,16 @@ from game.base import *
 # - hands: a list of Hands representing the tracked hand of each player
 # - wonders: a list of Wonders in the game, in order
 # - initialized: describes if the game has been initialized
+# - played_before_age: number of played cards of each wonder when the current age was initialized
+# Hand inference: every hand is a multiset drawn from the age deck. Each physical hand is tracked as it rotates:
+# - a hand the AI has seen is known exactly, minus the cards removed without being shown since (opponents' wonder and
+#   throw moves): the hand is then a random subset of its tracked cards (hands[j]) of size hand_size
+# - a hand the AI hasn't seen is a random draw from the unseen cards: the age deck minus every card seen in a hand and
+#   every card played from an unseen hand this age (for age 3, this includes the guilds that are not in the game)
+# Everything is updated incrementally on each move (see get_hand_distribution and sample_hands).
+# - hand_seen: for each hand, whether the AI has seen it this age
+# - hand_size: the number of cards in each hand
+# - unseen_counts: the unseen cards as a list of counts indexed by card id (see cards_to_counts)
 class AiGame:
     def __init__(self, i):
         self.i = i
@@ -15,6 +27,10 @@ class AiGame:
         self.hands = []
         self.wonders = []
         self.initialized = False
+        self.played_before_age = []
+        self.hand_seen = []
+        self.hand_size = 0
+        self.unseen_counts = []
 
     # Returns the Wonder controlled by the AI.
     def get_ai_wonder(self):
@@ -24,13 +40,23 @@ class AiGame:
     def get_ai_hand(self):
         return self.hands[self.i]
 
+    # Returns the list of Cards played by all wonders since the current age was initialized.
+    def get_played_cards_this_age(self):
+        return [card for wonder, count in zip(self.wonders, self.played_before_age) for card in wonder.played_cards[count:]]
+
     # Initializes this game state on entering the game and at the start of each age.
+    # Note: when entering a game in the middle of an age, cards that left the hands before are counted as unseen.
     def initialize(self, age, wonders, cards):
         self.age = age
         self.wonders = wonders
         self.hands = []
         for i in range(len(self.wonders)):
             self.hands.append(cards[:] if i == self.i else [])
+        self.played_before_age = [len(wonder.played_cards) for wonder in wonders]
+        self.hand_seen = [i == self.i for i in range(len(self.wonders))]
+        self.hand_size = len(cards)
+        self.unseen_counts = list(get_age_deck_counts(len(wonders), age))
+        self.remove_unseen(cards)
         self.initialized = True
 
     # Runs after each regular move (non-discard play). Rotates and tracks hands as they move around the board.
@@ -42,19 +68,77 @@ class AiGame:
                 continue
             if selection.action == 'play' and selection.card in hand:
                 hand.remove(selection.card)
+            elif selection.action == 'play' and selection.card:
+                # A card from the unknown part of the hand, it is no longer unseen.
+                self.remove_unseen([selection.card])
             if selection.action in ['wonder', 'throw'] and selection.card in hand and i == self.i:
                 hand.remove(selection.card)
         if len(cards) > 1:
             if self.age % 2 == 0:
                 self.hands.append(self.hands.pop(0))  # Rotate neg in age 2
+                self.hand_seen.append(self.hand_seen.pop(0))
             else:
                 self.hands.insert(0, self.hands.pop())  # Rotate pos in age 1,3
+                self.hand_seen.insert(0, self.hand_seen.pop())
+        if not self.hand_seen[self.i]:
+            self.remove_unseen(cards)
+            self.hand_seen[self.i] = True
         self.hands[self.i] = cards[:]
+        self.hand_size = len(cards)
 
     # Called before Babylon's last card play to ensure Babylon knows what its last card is.
     def pre_last_card_play(self, wonders, cards):
         self.hands[self.i] = cards[:]
 
+    # Removes seen cards from the unseen cards.
+    def remove_unseen(self, cards):
+        for card in cards:
+            card_id = get_card_id(card)
+            if card_id < len(self.unseen_counts) and self.unseen_counts[card_id] > 0:
+                self.unseen_counts[card_id] -= 1
+
+    # Returns the list of unseen Cards (see hand inference above).
+    def get_unseen_cards(self):
+        return counts_to_cards(self.unseen_counts)
+
+    # Returns the probability distribution of the cards in a player's hand, as a list of (Card, expected count) sorted by
+    # expected count. For hands that hold at most one copy of a card, the expected count is the probability that the card
+    # is in the hand.
+    def get_hand_distribution(self, j):
+        if self.hand_seen[j]:
+            counts = cards_to_counts(self.hands[j])
+        else:
+            counts = self.unseen_counts
+        total = sum(counts)
+        if total == 0:
+            return []
+        p = min(self.hand_size, total) / total
+        distribution = [(CARDS_BY_ID[card_id], count * p) for card_id, count in enumerate(counts) if count]
+        distribution.sort(key=lambda entry: entry[1], reverse=True)
+        return distribution
+
+    # Returns one random assignment of all hands consistent with what the AI has seen (see hand inference above). The AI's
+    # hand is its actual hand.
+    # - rng: the Random to sample with (a new one by default)
+    # - hand: the AI's hand to use instead of its tracked hand (e.g. after the AI used a card this turn)
+    # - hand_sizes: the number of cards of each hand, if they're not all hand_size (e.g. only Babylon has a card left)
+    def sample_hands(self, rng=None, hand=None, hand_sizes=None):
+        rng = rng or Random()
+        unseen_cards = self.get_unseen_cards()
+        rng.shuffle(unseen_cards)
+        hands = []
+        for j in range(len(self.wonders)):
+            size = hand_sizes[j] if hand_sizes else self.hand_size
+            if j == self.i:
+                hands.append((self.hands[j] if hand is None else hand)[:])
+            elif self.hand_seen[j] and len(self.hands[j]) >= size:
+                hands.append(rng.sample(self.hands[j], size))
+            else:
+                known = self.hands[j] if self.hand_seen[j] else []
+                missing = min(size - len(known), len(unseen_cards))
+                hands.append(known + [unseen_cards.pop() for _ in range(missing)])
+        return hands
+
     # Returns a representation of each wonder, points distribution, and known hands on separate lines.
     def __repr__(self):
         points = [wonder.get_points_str(self.wonders) for wonder in self.wonders]
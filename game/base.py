@@ -1,5 +1,10 @@
 from collections import namedtuple
 
+from game.payments import *
+from game.science import *
+from game.card_table import *
+from game.zobrist import *
+
 # Resource lists
 BROWN_RESOURCES = ['wood', 'ore', 'clay', 'stone']
 GREY_RESOURCES = ['glass', 'press', 'loom']
@@ -52,6 +57,10 @@ class Payment(Payment):
     def __repr__(self):
         return f"<{self.neg}, {self.bank}, {self.pos}>"
 
+# The payment problem for a purchase that is free (chained, free build, or no resources needed). See Wonder.get_payment_problem.
+FREE_PAYMENT_PROBLEM = (0, EMPTY_VECTOR, (), EMPTY_VECTOR, (), EMPTY_VECTOR, (), None, None)
+FREE_PAYMENT_ENTRY = PaymentEntry(FREE_PAYMENT_PROBLEM)
+
 # Represents a selection to be played by a player during a turn.
 # - card: the card selected. can be None if unknown
 # - action: the action to be performed
@@ -73,34 +82,122 @@ class Selection(Selection):
             return f"Throw{card} for 3 gold"
         return 'ERROR'
 
+# Returns a table of amounts by color index, for the effects that count cards of a color (e.g. gold per card).
+def color_table(**amounts):
+    return {COLOR_INDEX[color]: amount for color, amount in amounts.items()}
+
+GOLD_FOR_CARDS = color_table(brown=1, grey=2)
+GOLD_FOR_OWN_CARDS = color_table(brown=1, grey=2, yellow=1, red=3)
+POINTS_FOR_OWN_CARDS = color_table(brown=1, grey=2, yellow=1, red=1)
+POINTS_FOR_NEIGHBOR_CARDS = color_table(brown=1, grey=2, blue=1, yellow=1, red=1, green=1)
+
+# An index over a group of effects (and the cards providing them), updated incrementally as effects are added.
+# A Wonder keeps one summary for its starting effects, one for its built stages and one for its played cards (see Wonder.get_summaries).
+# - effect_counts: number of effects for each (type code, subtype code), and for each (type code, None) regardless of
+#   subtype (see get_effect_key)
+# - resources: single resources produced, in effect order (e.g. ["wood", "ore", "ore"])
+# - multi_resources: all multi-resources produced, as lists of their resources
+# - purchasable_multi_resources: multi-resources purchasable by neighbors
+# - resource_counts: count vector of resources (see game/payments.py)
+# - multi_resource_masks / purchasable_multi_resource_masks: bitmasks of multi_resources / purchasable_multi_resources
+# - shields: total number of shields
+# - science: dict counts of each science symbol
+# - multi_science: lists of science symbols produced by multi_science effects
+# - chains: bitmask of chains provided by cards (see game/card_table.py)
+# - card_counts: number of cards of each color, indexed by color index
+# - cards: bitset of the ids of all cards
+# - sources: number of stages/cards added
+class EffectSummary:
+    def __init__(self):
+        self.effect_counts = {}
+        self.resources = []
+        self.multi_resources = []
+        self.purchasable_multi_resources = []
+        self.resource_counts = [0] * NUM_RESOURCES
+        self.multi_resource_masks = []
+        self.purchasable_multi_resource_masks = []
+        self.shields = 0
+        self.science = {'gear': 0, 'compass': 0, 'tablet': 0}
+        self.multi_science = []
+        self.chains = 0
+        self.card_counts = [0] * len(COLORS)
+        self.cards = 0
+        self.sources = 0
+
+    # Adds the effects of one stage (or the starting effects) to the summary.
+    # - compiled_effects: the encoded effects (see compile_effects)
+    def add_effects(self, effects, compiled_effects):
+        self.sources += 1
+        for effect, (code, subtype, amount) in zip(effects, compiled_effects):
+            self.effect_counts[(code, subtype)] = self.effect_counts.get((code, subtype), 0) + 1
+            self.effect_counts[(code, None)] = self.effect_counts.get((code, None), 0) + 1
+            if code == EFFECT_RESOURCE:
+                self.resources.extend(effect.subtype for _ in range(amount))
+                self.resource_counts[subtype] += amount
+            elif code == EFFECT_MULTI_RESOURCE or code == EFFECT_MULTI_RESOURCE_UNPURCHASABLE:
+                multi_resource = effect.subtype.split('/')
+                for _ in range(amount):
+                    self.multi_resources.append(multi_resource)
+                    self.multi_resource_masks.append(subtype)
+                    if code == EFFECT_MULTI_RESOURCE:
+                        self.purchasable_multi_resources.append(multi_resource)
+                        self.purchasable_multi_resource_masks.append(subtype)
+            elif code == EFFECT_SHIELDS:
+                self.shields += amount
+            elif code == EFFECT_SCIENCE:
+                self.science[SCIENCE_SYMBOLS[subtype]] += amount
+            elif code == EFFECT_MULTI_SCIENCE:
+                self.multi_science.append(effect.subtype.split('/'))
+
+    # Adds a played card and its effects to the summary.
+    def add_card(self, card):
+        compiled = compile_card(card)
+        self.add_effects(card.effects, compiled.effects)
+        self.chains |= compiled.chains
+        self.card_counts[compiled.color] += 1
+        self.cards |= 1 << compiled.id
+
 # Represents a wonder board in the game and everything attached to it.
 # - name: the name of the wonder (e.g. "Giza")
 # - side: the side of the wonder ("Day", "Night")
 # - starting_effects: effects the wonder starts with (e.g. Giza starts with 1 stone)
 # - stages: list of WonderStages of this wonder
+# - compiled_starting_effects, compiled_stage_effects: the encoded starting effects and effects of each stage (see
+#   compile_effects). Compiled on creation, unless given as (compiled_starting_effects, compiled_stage_effects), e.g. by copy
 # - stages_built: number of stages currently built by this wonder
 # - gold: wonder's current gold
 # - military tokens: list of this wonder's current military token amounts (e.g. [-1, -1, 3, 5])
 # - played_cards: list of all Cards played by this wonders
 class Wonder:
-    def __init__(self, name, side, starting_gold, starting_effects, stages):
+    def __init__(self, name, side, starting_gold, starting_effects, stages, compiled_effects=None):
         self.name = name
         self.side = side
         self.starting_effects = starting_effects
         self.stages = stages
+        if compiled_effects is None:
+            compiled_effects = (compile_effects(starting_effects), [compile_effects(stage.effects) for stage in stages])
+        self.compiled_starting_effects, self.compiled_stage_effects = compiled_effects
         self.stages_built = 0
 
         self.gold = starting_gold
         self.military_tokens = []
         self.played_cards = []
+
+        self._summaries = None
+        self._payment_signature = None
     
-    # Returns a new Wonder with the specified selection played and all immediate effects applied.
-    def with_simulated_selection(self, wonders, selection):
-        new_wonder = Wonder(self.name, self.side, self.gold, self.starting_effects, self.stages)
+    # Returns an independent copy of this wonder, e.g. to play out a game without touching the original.
+    # Cards, stages and effects are shared; played cards and military tokens are copied.
+    def copy(self):
+        new_wonder = Wonder(self.name, self.side, self.gold, self.starting_effects, self.stages, (self.compiled_starting_effects, self.compiled_stage_effects))
         new_wonder.stages_built = self.stages_built
-        new_wonder.military_tokens = self.military_tokens[:]
+        new_wonder.military_tokens = list(self.military_tokens)
         new_wonder.played_cards = self.played_cards[:]
+        return new_wonder
 
+    # Returns a SimulatedWonder (a read-only view of this wonder) with the specified selection played and all immediate effects applied.
+    def with_simulated_selection(self, wonders, selection):
+        new_wonder = SimulatedWonder(self)
         new_wonder.play_selection(wonders, selection, apply_immediate_effects=True)
         return new_wonder
 
@@ -109,34 +206,75 @@ class Wonder:
         if selection.action == 'play':
             if selection.payment:
                 self.gold -= selection.payment.total()
-            self.played_cards.append(selection.card)
+            self.add_played_card(selection.card)
             if apply_immediate_effects:
-                self.apply_immediate_effects(wonders, selection.card.effects)
+                self.apply_immediate_effects(wonders, compile_card(selection.card).effects)
         if selection.action == 'wonder':
             if selection.payment:
                 self.gold -= selection.payment.total()
-            self.stages_built += 1
+            self.build_stage()
             if apply_immediate_effects:
-                self.apply_immediate_effects(wonders, self.get_last_built_stage().effects)
+                self.apply_immediate_effects(wonders, self.get_last_built_stage_effects())
         if selection.action == 'throw':
             self.gold += 3
 
+    # Adds a card to the played cards and to the effect index.
+    def add_played_card(self, card):
+        self.played_cards.append(card)
+        self.get_summaries()
+
+    # Builds the next wonder stage and adds its effects to the effect index.
+    def build_stage(self):
+        self.stages_built += 1
+        self.get_summaries()
+
+    # Returns the effect index of this wonder as a tuple of EffectSummaries: (starting effects, built stages, played cards).
+    # The index follows played_cards and stages_built: cards/stages added since the last call are indexed incrementally,
+    # and the index is rebuilt if cards or stages were removed.
+    def get_summaries(self):
+        summaries = self._summaries
+        if summaries is not None and summaries[1].sources == self.stages_built and summaries[2].sources == len(self.played_cards):
+            return summaries
+        if self._summaries is None:
+            starting_summary = EffectSummary()
+            starting_summary.add_effects(self.starting_effects, self.compiled_starting_effects)
+            self._summaries = (starting_summary, EffectSummary(), EffectSummary())
+        starting_summary, stages_summary, cards_summary = self._summaries
+        if stages_summary.sources != self.stages_built or cards_summary.sources != len(self.played_cards):
+            self._payment_signature = None
+        if stages_summary.sources > self.stages_built:
+            stages_summary = EffectSummary()
+        while stages_summary.sources < self.stages_built:
+            stages_summary.add_effects(self.stages[stages_summary.sources].effects, self.compiled_stage_effects[stages_summary.sources])
+        if cards_summary.sources > len(self.played_cards):
+            cards_summary = EffectSummary()
+        while cards_summary.sources < len(self.played_cards):
+            cards_summary.add_card(self.played_cards[cards_summary.sources])
+        self._summaries = (starting_summary, stages_summary, cards_summary)
+        return self._summaries
+
+    # Returns how many of the EffectSummaries from get_summaries come before the played cards (starting effects and stages).
+    def get_stage_summary_count(self):
+        return 2
+
     # Applies all immediate effects (e.g. gold from playing Vineyard).
-    def apply_immediate_effects(self, wonders, effects):
-        neg_neighbor, pos_neighbor = self.get_neighbors(wonders)
-        for effect in effects:
-            if effect.type == 'gold':
-                self.gold += effect.amount
-            elif effect.type == 'gold_for_cards':
-                gold_per_card = {'brown': 1, 'grey': 2}[effect.subtype]
-                num_cards = len(neg_neighbor.get_cards_by_color(effect.subtype)) + len(self.get_cards_by_color(effect.subtype)) + len(pos_neighbor.get_cards_by_color(effect.subtype))
+    # effects: the encoded effects (e.g. compile_card(card).effects or get_last_built_stage_effects()).
+    # neighbors: optional (negative_neighbor, positive_neighbor) tuple, to skip looking them up in wonders.
+    def apply_immediate_effects(self, wonders, effects, neighbors=None):
+        neg_neighbor, pos_neighbor = neighbors or self.get_neighbors(wonders)
+        for code, subtype, amount in effects:
+            if code == EFFECT_GOLD:
+                self.gold += amount
+            elif code == EFFECT_GOLD_FOR_CARDS:
+                gold_per_card = GOLD_FOR_CARDS[subtype]
+                num_cards = neg_neighbor.count_cards_by_color_index(subtype) + self.count_cards_by_color_index(subtype) + pos_neighbor.count_cards_by_color_index(subtype)
                 total_gold = gold_per_card * num_cards
                 self.gold += total_gold
-            elif effect.type == 'gold_and_points_for_cards':
-                gold_per_card = {'brown': 1, 'grey': 2, 'yellow': 1, 'red': 3}[effect.subtype]
-                total_gold = gold_per_card * len(self.get_cards_by_color(effect.subtype))
+            elif code == EFFECT_GOLD_AND_POINTS_FOR_CARDS:
+                gold_per_card = GOLD_FOR_OWN_CARDS[subtype]
+                total_gold = gold_per_card * self.count_cards_by_color_index(subtype)
                 self.gold += total_gold
-            elif effect.type == 'gold_and_points_for_stages':
+            elif code == EFFECT_GOLD_AND_POINTS_FOR_STAGES:
                 total_gold = 3 * self.stages_built
                 self.gold += total_gold
     
@@ -157,9 +295,16 @@ class Wonder:
         yield from (effect for stage in self.stages[:self.stages_built] for effect in stage.effects)
         yield from (effect for card in self.played_cards for effect in card.effects)
     
+    # Returns the encoded effects of all effects present in this wonder, in the same order as all_effects.
+    def all_compiled_effects(self):
+        yield from self.compiled_starting_effects
+        yield from (effect for effects in self.compiled_stage_effects[:self.stages_built] for effect in effects)
+        yield from (effect for card in self.played_cards for effect in compile_card(card).effects)
+
     # Returns True iff the wonder has an effect with the specified type (and optionally subtype).
     def has_effect(self, type, subtype=None):
-        return any(effect.type == type and (subtype is None or effect.subtype == subtype) for effect in self.all_effects())
+        key = get_effect_key(type, subtype)
+        return any(key in summary.effect_counts for summary in self.get_summaries())
     
     # Returns (resources, multi_resources), with:
     # - resources: all single resources produced (e.g. with Loom and Foundry, resources=["loom", "ore", "ore"])
@@ -167,26 +312,55 @@ class Wonder:
     def get_resources(self):
         resources = []
         multi_resources = []
-        for effect in self.all_effects():
-            if effect.type == 'resource':
-                resources.extend(effect.subtype for _ in range(effect.amount))
-            if effect.type == 'multi_resource':
-                multi_resources.extend(effect.subtype.split('/') for _ in range(effect.amount))
-            if effect.type == 'multi_resource_unpurchasable':
-                multi_resources.extend(effect.subtype.split('/') for _ in range(effect.amount))
+        for summary in self.get_summaries():
+            resources.extend(summary.resources)
+            multi_resources.extend(summary.multi_resources)
         return (resources, multi_resources)
     
     # Same result as get_resources method, but limited to only resources/multi-resources purchasable by neighbors.
     def get_purchasable_resources(self):
         resources = []
         multi_resources = []
-        for effect in self.all_effects():
-            if effect.type == 'resource':
-                resources.extend(effect.subtype for _ in range(effect.amount))
-            if effect.type == 'multi_resource':
-                multi_resources.extend(effect.subtype.split('/') for _ in range(effect.amount))
+        for summary in self.get_summaries():
+            resources.extend(summary.resources)
+            multi_resources.extend(summary.purchasable_multi_resources)
         return (resources, multi_resources)
     
+    # Same as get_resources, but as (resource count vector, multi-resource bitmasks). See game/payments.py.
+    def get_resource_vectors(self):
+        summaries = self.get_summaries()
+        counts = tuple(map(sum, zip(*(summary.resource_counts for summary in summaries))))
+        return (counts, tuple(mask for summary in summaries for mask in summary.multi_resource_masks))
+    
+    # Same as get_purchasable_resources, but as (resource count vector, multi-resource bitmasks). See game/payments.py.
+    def get_purchasable_resource_vectors(self):
+        summaries = self.get_summaries()
+        counts = tuple(map(sum, zip(*(summary.resource_counts for summary in summaries))))
+        return (counts, tuple(mask for summary in summaries for mask in summary.purchasable_multi_resource_masks))
+    
+    # Returns the id of this wonder's payment signature (see game/payments.py): its resources, the multi-resources its
+    # neighbors can buy and its trading effects. Two wonders with the same signature pay the same for everything.
+    # Recomputed only when cards or stages were added since the last call.
+    def get_payment_signature(self):
+        self.get_summaries()
+        if self._payment_signature is None:
+            resources, multi_resources = self.get_resource_vectors()
+            purchasable_multi_resources = self.get_purchasable_resource_vectors()[1]
+            self._payment_signature = get_payment_signature_id((
+                resources, tuple(sorted(multi_resources)), tuple(sorted(purchasable_multi_resources)),
+                self.has_effect('tradingpost', 'neg'), self.has_effect('tradingpost', 'pos'), self.has_effect('marketplace', ''),
+            ))
+        return self._payment_signature
+
+    # Returns the 64-bit hash of this wonder's state: board, played cards, stages built, gold and military tokens.
+    # See game/zobrist.py.
+    def get_state_hash(self):
+        cards = 0
+        for summary in self.get_summaries():
+            cards |= summary.cards
+        return (wonder_key(self.name, self.side) ^ card_bitset_hash(cards) ^ zobrist_key(STAGES_TAG, self.stages_built)
+                ^ zobrist_key(GOLD_TAG, self.gold) ^ military_hash(self.military_tokens))
+
     # Returns a list of all resources produced, treating multi-resources as separate resources (e.g. with Loom and Clay Pit, this returns ["loom", "clay", "ore"])
     def get_all_resources_produced(self):
         resources, multi_resources = self.get_resources()
@@ -198,6 +372,19 @@ class Wonder:
     def get_cards_by_color(self, color):
         return [card for card in self.played_cards if card.color == color]
 
+    # Returns the number of cards of the given color.
+    def count_cards_by_color(self, color):
+        return self.count_cards_by_color_index(COLOR_INDEX[color])
+
+    # Returns the number of cards of the given color index (see game/card_table.py).
+    def count_cards_by_color_index(self, color):
+        return sum(summary.card_counts[color] for summary in self.get_summaries())
+
+    # Returns True iff a card with the same name as the given card has been played by this wonder.
+    def has_played_card(self, card):
+        card_bit = 1 << compile_card(card).id
+        return any(summary.cards & card_bit for summary in self.get_summaries())
+
     # Returns the last built stage (e.g. if the wonder has build TWO stages, returns the SECOND stage)
     # Returns None if no stages are built.
     def get_last_built_stage(self):
@@ -205,6 +392,10 @@ class Wonder:
             return None
         return self.stages[self.stages_built-1]
 
+    # Returns the encoded effects of the last built stage (see get_last_built_stage and compile_effects).
+    def get_last_built_stage_effects(self):
+        return self.compiled_stage_effects[self.stages_built-1]
+
     # Returns the next stage to build (e.g. if the wonder has build TWO stages, returns the THIRD stage)
     # Returns None if all stages are built.
     def get_next_free_stage(self):
@@ -214,15 +405,15 @@ class Wonder:
     
     # Gets the total number of shields in this wonder.
     def get_shields(self):
-        shields = 0
-        for effect in self.all_effects():
-            if effect.type == 'shields':
-                shields += effect.amount
-        return shields
+        return sum(summary.shields for summary in self.get_summaries())
     
     # Returns True iff this wonder has the given chain on one of its played cards.
     def has_chain(self, chain):
-        return any(chain in card.chains for card in self.played_cards)
+        return self.has_chain_bits(CHAIN_BITS.get(chain, 0))
+
+    # Returns True iff this wonder has one of the chains in the chain bitmask (see game/card_table.py).
+    def has_chain_bits(self, chain_bits):
+        return any(summary.chains & chain_bits for summary in self.get_summaries())
     
     # Returns (science, multi_science), with:
     # - science: dict counts of each science symbol present
@@ -230,58 +421,76 @@ class Wonder:
     def get_science(self):
         science = {'gear': 0, 'compass': 0, 'tablet': 0}
         multi_science = []
-        for effect in self.all_effects():
-            if effect.type == 'science':
-                science[effect.subtype] += effect.amount
-            elif effect.type == 'multi_science':
-                multi_science.append(effect.subtype.split('/'))
+        for summary in self.get_summaries():
+            for symbol in science:
+                science[symbol] += summary.science[symbol]
+            multi_science.extend(summary.multi_science)
         return (science, multi_science)
     
     # Computes the current total number of points for this wonder.
-    def compute_points_total(self, wonders):
-        return sum(self.compute_points_distribution(wonders).values())
+    def compute_points_total(self, wonders, neighbors=None):
+        return sum(self.compute_points_distribution(wonders, neighbors).values())
     
     # Computes a string representation of the points distribution.
     # Format: military/gold/raw-points/science/yellow/guild/total
-    def get_points_str(self, wonders):
-        distr = self.compute_points_distribution(wonders)
+    def get_points_str(self, wonders, neighbors=None):
+        distr = self.compute_points_distribution(wonders, neighbors)
         return f"{distr.get('military', 0)}/{distr.get('gold', 0)}/{distr.get('points', 0)}/{distr.get('science', 0)}/{distr.get('yellow', 0)}/{distr.get('guild', 0)}/{sum(distr.values())}"
 
     # Computes the point distribution (as a dict) for points from all sources.
-    def compute_points_distribution(self, wonders):
-        neg_neighbor, pos_neighbor = self.get_neighbors(wonders)
+    # neighbors: optional (negative_neighbor, positive_neighbor) tuple, to skip looking them up in wonders.
+    def compute_points_distribution(self, wonders, neighbors=None):
+        neg_neighbor, pos_neighbor = neighbors or self.get_neighbors(wonders)
         points = {'points': 0, 'military': 0, 'gold': 0, 'science': 0, 'yellow': 0, 'guild': 0}
-        for effect in self.all_effects():
-            if effect.type == 'points':
-                points['points'] += effect.amount
-            elif effect.type == 'gold_and_points_for_cards':
-                points_per_card = {'brown': 1, 'grey': 2, 'yellow': 1, 'red': 1}[effect.subtype]
-                points['yellow'] += points_per_card * len(self.get_cards_by_color(effect.subtype))
-            elif effect.type == 'gold_and_points_for_stages':
+        for code, subtype, amount in self.all_compiled_effects():
+            if code == EFFECT_POINTS:
+                points['points'] += amount
+            elif code == EFFECT_GOLD_AND_POINTS_FOR_CARDS:
+                points_per_card = POINTS_FOR_OWN_CARDS[subtype]
+                points['yellow'] += points_per_card * self.count_cards_by_color_index(subtype)
+            elif code == EFFECT_GOLD_AND_POINTS_FOR_STAGES:
                 points['yellow'] += 1 * self.stages_built
-            elif effect.type == 'points_for_cards':
-                points_per_card = {'brown': 1, 'grey': 2, 'blue': 1, 'yellow': 1, 'red': 1, 'green': 1}[effect.subtype]
-                num_cards = len(neg_neighbor.get_cards_by_color(effect.subtype)) + len(pos_neighbor.get_cards_by_color(effect.subtype))
+            elif code == EFFECT_POINTS_FOR_CARDS:
+                points_per_card = POINTS_FOR_NEIGHBOR_CARDS[subtype]
+                num_cards = neg_neighbor.count_cards_by_color_index(subtype) + pos_neighbor.count_cards_by_color_index(subtype)
                 points['guild'] += points_per_card * num_cards
-            elif effect.type == 'points_for_stages':
+            elif code == EFFECT_POINTS_FOR_STAGES:
                 num_stages = neg_neighbor.stages_built + self.stages_built + pos_neighbor.stages_built
                 points['guild'] += 1 * num_stages
-            elif effect.type == 'points_for_finished_wonder':
+            elif code == EFFECT_POINTS_FOR_FINISHED_WONDER:
                 if self.stages_built == len(self.stages):
                     points['guild'] += 7
-            elif effect.type == 'points_for_self_cards':
-                points['guild'] += 1 * len(self.get_cards_by_color(effect.subtype))
+            elif code == EFFECT_POINTS_FOR_SELF_CARDS:
+                points['guild'] += 1 * self.count_cards_by_color_index(subtype)
         points['military'] += sum(self.military_tokens)
         points['gold'] += self.gold // 3
         points['science'] += self.compute_science_points()
         return points
     
+    # Returns the science of this wonder as (gear, compass, tablet, wildcards) counts, or None if it has a multi_science
+    # effect that can't be every symbol (then only get_science describes it).
+    def get_science_counts(self):
+        science, multi_science = self.get_science()
+        if any(len(ms) != len(science) for ms in multi_science):
+            return None
+        return (science['gear'], science['compass'], science['tablet'], len(multi_science))
+
+    # Returns the points gained by one more (gear, compass, tablet, wildcard) for this wonder (see game/science.py).
+    def get_science_marginal_values(self):
+        counts = self.get_science_counts()
+        if counts is None:
+            raise Exception("Cannot compute marginal science values with partial multi_science effects")
+        return science_marginal_values(*counts)
+
     # Computes the number of points from science.
     def compute_science_points(self):
+        counts = self.get_science_counts()
+        if counts is not None:
+            return science_points(*counts)
         science, multi_science = self.get_science()
         return max(self.science_points_for(science, multi_science))
     
-    # Helper for compute_science_points
+    # Helper for compute_science_points, for multi_science effects that can't be every symbol.
     def science_points_for(self, science, multi_science):
         if not multi_science:
             yield science['gear']**2 + science['compass']**2 + science['tablet']**2 + 7 * min(science[s] for s in science)
@@ -297,16 +506,16 @@ class Wonder:
     def get_all_possible_selections(self, wonders, hand):
         result = []
         for card in hand:
+            if self.has_played_card(card):
+                continue
             payment = self.get_min_gold_payment(wonders, hand, Selection(card, 'play', None))
-            selection = Selection(card, 'play', payment)
-            if payment and self.validate_selection(wonders, hand, selection)[0]:
-                result.append(selection)
+            if payment and self.gold >= payment.total():
+                result.append(Selection(card, 'play', payment))
         stage = self.get_next_free_stage()
         if stage:
             payment = self.get_min_gold_payment(wonders, hand, Selection(None, 'wonder', None))
-            selection = Selection(None, 'wonder', payment)
-            if payment and self.validate_selection(wonders, hand, selection)[0]:
-                result.append(selection)
+            if payment and self.gold >= payment.total():
+                result.append(Selection(None, 'wonder', payment))
         result.append(Selection(None, 'throw', None))
         return result
     
@@ -315,7 +524,7 @@ class Wonder:
         if selection.card and selection.card not in hand:
             return (False, f"Selection made for a card not in hand: {selection.card.name}")
         if selection.action == 'play':
-            if any(selection.card.name == card.name for card in self.played_cards):
+            if self.has_played_card(selection.card):
                 return (False, f"Selection made for a card already played in wonder: {selection.card.name}")
             return self.validate_purchase(wonders, hand, selection)
         if selection.action == 'wonder':
@@ -330,84 +539,81 @@ class Wonder:
         payment = selection.payment or Payment(0, 0, 0)
         if self.gold < payment.total():
             return (False, "Wonder does not have enough gold to complete purchase")
-        cost = selection.card.cost if selection.action == 'play' else self.get_next_free_stage().cost
-        payment_plans = self.get_all_payment_plans(wonders, hand, selection)
-        if payment not in payment_plans:
+        entry = self.get_payment_entry(wonders, hand, selection)
+        if entry is None or payment.bank != entry.bank or (payment.neg, payment.pos) not in entry.get_achievable_payments():
             return (False, f"{payment} is not a valid payment plan for purchase")
         return (True, None)
     
     # Returns the lowest total Payment for the given selection.
-    # In the case of a tie, returns the Payment which best balances payment across neighbors.
+    # In the case of a tie, returns the Payment which best balances payment across neighbors, then the one paying less to the negative neighbor.
     def get_min_gold_payment(self, wonders, hand, selection):
-        payment_plans = self.get_all_payment_plans(wonders, hand, selection)
+        payment_plans = self.get_min_payment_plans(wonders, hand, selection)
         if not payment_plans:
             return None
-
-        min_payment_total = min(plan.total() for plan in payment_plans)
-
-        return min((plan for plan in payment_plans if plan.total() == min_payment_total), key=lambda plan: abs(plan.pos - plan.neg))
+        return min(payment_plans, key=lambda plan: (plan.total(), abs(plan.pos - plan.neg), plan.neg))
     
     # Returns a list of all valid Payments for the given selection.
     def get_all_payment_plans(self, wonders, hand, selection):
-        if selection.action == 'wonder' and not self.get_next_free_stage():
+        entry = self.get_payment_entry(wonders, hand, selection)
+        if entry is None:
             return []
-        cost = selection.card.cost if selection.action == 'play' else self.get_next_free_stage().cost
-        color = selection.card.color if selection.action == 'play' else None
-        neg_neighbor, pos_neighbor = self.get_neighbors(wonders)
-        if cost.chain and self.has_chain(cost.chain):
-            return [Payment(0, 0, 0)]
-        if color and self.has_effect('free_build_first_color', '') and len(self.get_cards_by_color(color)) == 0:
-            return [Payment(0, 0, 0)]
+        bank = entry.bank
+        return [Payment(neg, bank, pos) for neg, pos in sorted(entry.get_achievable_payments())]
+    
+    # Returns the Pareto-minimal Payments for the given selection (no other valid Payment pays less or equal to both neighbors).
+    # The min gold payment is always one of these.
+    def get_min_payment_plans(self, wonders, hand, selection):
+        entry = self.get_payment_entry(wonders, hand, selection)
+        if entry is None:
+            return []
+        bank = entry.bank
+        return [Payment(neg, bank, pos) for neg, pos in entry.get_minimal_payments()]
+    
+    # Returns the payment problem for the given selection as (bank, *payment solver arguments), see game/payments.py.
+    # Returns None if the selection can't be purchased at all (no stage left to build).
+    def get_payment_problem(self, wonders, hand, selection):
+        entry = self.get_payment_entry(wonders, hand, selection)
+        return entry.problem if entry else None
+
+    # Returns the PaymentEntry for the given selection, or None if the selection can't be purchased at all (no stage left
+    # to build). Free purchases (chains, free builds) are checked first, other purchases are looked up in the payment
+    # entries by the payment signatures of this wonder and its neighbors and the cost (see game/payments.py).
+    def get_payment_entry(self, wonders, hand, selection):
+        if selection.action == 'wonder' and not self.get_next_free_stage():
+            return None
+        if selection.action == 'play':
+            compiled = compile_card(selection.card)
+            cost_gold, cost_vector, color, cost_key = compiled.cost_gold, compiled.cost_vector, selection.card.color, compiled.id
+            if compiled.cost_chain and self.has_chain_bits(compiled.cost_chain):
+                return FREE_PAYMENT_ENTRY
+        else:
+            cost = self.get_next_free_stage().cost
+            cost_gold, cost_vector, color = cost.gold, resource_vector(cost.resources), None
+            cost_key = (cost_gold, cost_vector)
+        if color and self.has_effect('free_build_first_color', '') and self.count_cards_by_color(color) == 0:
+            return FREE_PAYMENT_ENTRY
         # Assuming the presence of a color means it's a card
         if color and self.has_effect('free_build_alpha', '') and len(hand) == 7:
-            return [Payment(0, 0, 0)]
+            return FREE_PAYMENT_ENTRY
         if color and self.has_effect('free_build_omega', '') and len(hand) == 2:
-            return [Payment(0, 0, 0)]
-        resources, multi_resources = self.get_resources()
-        pos_purchasable_resources, pos_purchasable_multi_resources = pos_neighbor.get_purchasable_resources()
-        neg_purchasable_resources, neg_purchasable_multi_resources = neg_neighbor.get_purchasable_resources()
-        has_pos_trading = self.has_effect('tradingpost', 'pos')
-        has_neg_trading = self.has_effect('tradingpost', 'neg')
-        has_marketplace = self.has_effect('marketplace', '')
-        required_resources = cost.resources[:]
-        for resource in resources:
-            if resource in required_resources:
-                required_resources.remove(resource)
-        payment_plans = self.payment_plans_for(cost.gold, required_resources, multi_resources, has_pos_trading, has_neg_trading, has_marketplace, pos_purchasable_resources, pos_purchasable_multi_resources, neg_purchasable_resources, neg_purchasable_multi_resources)
-        l = list(set(payment_plans))
-        return l
-    
-    # Helper for get_all_payment_plans
-    def payment_plans_for(self, gold, rr, mr, htpos, htneg, hm, prpos, pmrpos, prneg, pmrneg):
-        if not rr:
-            yield Payment(0, gold, 0)
-            return
-        resource = rr[0]
-        grey = resource in GREY_RESOURCES
-        for i in range(len(mr)):
-            if resource in mr[i]:
-                yield from self.payment_plans_for(gold, rr[1:], mr[:i] + mr[i+1:], htpos, htneg, hm, prpos, pmrpos, prneg, pmrneg)
-        for i in range(len(prpos)):
-            cost = 1 if grey and hm or not grey and htpos else 2
-            if resource == prpos[i]:
-                yield from self.add_payment(self.payment_plans_for(gold, rr[1:], mr, htpos, htneg, hm, prpos[:i] + prpos[i+1:], pmrpos, prneg, pmrneg), 0, 0, cost)
-        for i in range(len(prneg)):
-            cost = 1 if grey and hm or not grey and htneg else 2
-            if resource == prneg[i]:
-                yield from self.add_payment(self.payment_plans_for(gold, rr[1:], mr, htpos, htneg, hm, prpos, pmrpos, prneg[:i] + prneg[i+1:], pmrneg), cost, 0, 0)
-        for i in range(len(pmrpos)):
-            cost = 1 if grey and hm or not grey and htpos else 2
-            if resource in pmrpos[i]:
-                yield from self.add_payment(self.payment_plans_for(gold, rr[1:], mr, htpos, htneg, hm, prpos, pmrpos[:i] + pmrpos[i+1:], prneg, pmrneg), 0, 0, cost)
-        for i in range(len(pmrneg)):
-            cost = 1 if grey and hm or not grey and htneg else 2
-            if resource in pmrneg[i]:
-                yield from self.add_payment(self.payment_plans_for(gold, rr[1:], mr, htpos, htneg, hm, prpos, pmrpos, prneg, pmrneg[:i] + pmrneg[i+1:]), cost, 0, 0)
-
-    # Helper for payment_plans_for
-    def add_payment(self, plans, neg, bank, pos):
-        for payment in plans:
-            yield Payment(payment.neg + neg, payment.bank + bank, payment.pos + pos)
+            return FREE_PAYMENT_ENTRY
+        neg_neighbor, pos_neighbor = self.get_neighbors(wonders)
+        key = (self.get_payment_signature(), neg_neighbor.get_payment_signature(), pos_neighbor.get_payment_signature(), cost_key)
+        entry = PAYMENT_ENTRIES.get(key)
+        if entry is None:
+            entry = add_payment_entry(key, self.build_payment_problem(neg_neighbor, pos_neighbor, cost_gold, cost_vector))
+        return entry
+
+    # Helper for get_payment_entry. Builds the payment problem of a cost that isn't free.
+    def build_payment_problem(self, neg_neighbor, pos_neighbor, cost_gold, cost_vector):
+        resources, multi_resources = self.get_resource_vectors()
+        required = subtract_vector(cost_vector, resources)
+        if required == EMPTY_VECTOR:
+            return (cost_gold,) + FREE_PAYMENT_PROBLEM[1:]
+        neg_resources, neg_multi_resources = neg_neighbor.get_purchasable_resource_vectors()
+        pos_resources, pos_multi_resources = pos_neighbor.get_purchasable_resource_vectors()
+        neg_prices, pos_prices = trading_prices(self.has_effect('tradingpost', 'neg'), self.has_effect('tradingpost', 'pos'), self.has_effect('marketplace', ''))
+        return (cost_gold, required, multi_resources, neg_resources, neg_multi_resources, pos_resources, pos_multi_resources, neg_prices, pos_prices)
 
     # Returns a representation of the wonder.
     # Format: [name][side](gold=[gold], res=[resources])
@@ -416,3 +622,61 @@ class Wonder:
         resources, multi_resources = self.get_resources()
         resources_str = ''.join(r[0] for r in resources) + ''.join('m' for m in multi_resources)
         return f"{self.name}{self.side}(gold={self.gold}, res={resources_str})"
+
+# A view of a parent Wonder with one extra selection played on top of it, as returned by Wonder.with_simulated_selection.
+# The view shares the parent's played cards and effect index, and only stores the delta (gold, stages built and an
+# EffectSummary for the selection), so building one doesn't copy anything but the military tokens, as a tuple.
+# Views are meant to be short-lived and read-only: they reflect the parent as it was when created and should be
+# discarded once the parent changes.
+# - parent: the Wonder this view was created from
+# - card: the extra card played in this view, if any
+class SimulatedWonder(Wonder):
+    def __init__(self, parent):
+        self.parent = parent
+        self.name = parent.name
+        self.side = parent.side
+        self.starting_effects = parent.starting_effects
+        self.stages = parent.stages
+        self.compiled_starting_effects = parent.compiled_starting_effects
+        self.compiled_stage_effects = parent.compiled_stage_effects
+        self.stages_built = parent.stages_built
+        self.gold = parent.gold
+        self.military_tokens = tuple(parent.military_tokens)  # A tuple, so that writing tokens to the view fails
+        self.card = None
+
+        self._summaries = parent.get_summaries()
+        self._stage_summaries = parent.get_stage_summary_count()
+        self._payment_signature = parent.get_payment_signature()
+
+    # Played cards of the parent plus the extra card. Only built when requested.
+    @property
+    def played_cards(self):
+        if self.card is None:
+            return self.parent.played_cards
+        return self.parent.played_cards + [self.card]
+
+    # Records the extra card in the view instead of the parent's played cards.
+    def add_played_card(self, card):
+        self.card = card
+        summary = EffectSummary()
+        summary.add_card(card)
+        self._summaries = self._summaries + (summary,)
+        self._payment_signature = None
+
+    # Records the extra stage in the view. Its summary goes after the parent's stages to keep effect order.
+    def build_stage(self):
+        self.stages_built += 1
+        summary = EffectSummary()
+        summary.add_effects(self.stages[self.stages_built-1].effects, self.compiled_stage_effects[self.stages_built-1])
+        i = self._stage_summaries
+        self._summaries = self._summaries[:i] + (summary,) + self._summaries[i:]
+        self._stage_summaries += 1
+        self._payment_signature = None
+
+    # Returns the parent's EffectSummaries plus the summary of the extra selection.
+    def get_summaries(self):
+        return self._summaries
+
+    # Same as Wonder.get_stage_summary_count
+    def get_stage_summary_count(self):
+        return self._stage_summaries
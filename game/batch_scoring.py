@@ -0,0 +1,146 @@
+import numpy as np
+
+from collections import namedtuple
+
+from game.base import *
+
+# This file contains a vectorized version of Wonder.compute_points_distribution, to score every wonder of a batch of
+# game states in one pass with NumPy (e.g. at the end of many simulated games).
+#
+# Usage:
+#   batch = pack_game_states([game.wonders for game in games])
+#   points = score_batch(batch)      # dict of category -> array of points, one entry per wonder
+#   points['total'][batch.offsets[g] + i] is the total points of wonder i in game g
+
+# Points per card for the per-color effects, indexed by color index (see game/card_table.py).
+# Colors that an effect doesn't apply to have 0 points per card.
+GOLD_AND_POINTS_PER_CARD = np.array([{'brown': 1, 'grey': 2, 'yellow': 1, 'red': 1}.get(color, 0) for color in COLORS])
+POINTS_FOR_CARDS_PER_CARD = np.array([{'brown': 1, 'grey': 2, 'blue': 1, 'yellow': 1, 'red': 1, 'green': 1}.get(color, 0) for color in COLORS])
+
+# Game states packed into arrays, one row per wonder (all games concatenated).
+# - offsets: index of the first wonder of each game
+# - neg, pos: index of each wonder's negative/positive neighbor
+# - card_counts: [wonders, colors] number of played cards of each color
+# - military: sum of military tokens
+# - gold: current gold
+# - stages_built, stages: number of stages built / total stages
+# - science: [wonders, 3] count of each science symbol (gear, compass, tablet)
+# - wildcards: number of multi_science effects
+# - raw_points: sum of 'points' effects
+# - yellow_cards: [wonders, colors] number of gold_and_points_for_cards effects for each color
+# - yellow_stages: number of gold_and_points_for_stages effects
+# - guild_cards: [wonders, colors] number of points_for_cards effects for each color
+# - guild_self_cards: [wonders, colors] number of points_for_self_cards effects for each color
+# - guild_stages: number of points_for_stages effects
+# - guild_finished: number of points_for_finished_wonder effects
+BatchState = namedtuple('BatchState', [
+    'offsets', 'neg', 'pos',
+    'card_counts', 'military', 'gold', 'stages_built', 'stages',
+    'science', 'wildcards', 'raw_points',
+    'yellow_cards', 'yellow_stages', 'guild_cards', 'guild_self_cards', 'guild_stages', 'guild_finished',
+])
+
+# Packs a list of games (each a list of Wonders in turn order) into a BatchState.
+def pack_game_states(games):
+    num_wonders = sum(len(wonders) for wonders in games)
+    num_colors = len(COLORS)
+    offsets = np.zeros(len(games), dtype=np.int64)
+    neg = np.zeros(num_wonders, dtype=np.int64)
+    pos = np.zeros(num_wonders, dtype=np.int64)
+    card_counts = np.zeros((num_wonders, num_colors), dtype=np.int64)
+    military = np.zeros(num_wonders, dtype=np.int64)
+    gold = np.zeros(num_wonders, dtype=np.int64)
+    stages_built = np.zeros(num_wonders, dtype=np.int64)
+    stages = np.zeros(num_wonders, dtype=np.int64)
+    science = np.zeros((num_wonders, 3), dtype=np.int64)
+    wildcards = np.zeros(num_wonders, dtype=np.int64)
+    raw_points = np.zeros(num_wonders, dtype=np.int64)
+    yellow_cards = np.zeros((num_wonders, num_colors), dtype=np.int64)
+    yellow_stages = np.zeros(num_wonders, dtype=np.int64)
+    guild_cards = np.zeros((num_wonders, num_colors), dtype=np.int64)
+    guild_self_cards = np.zeros((num_wonders, num_colors), dtype=np.int64)
+    guild_stages = np.zeros(num_wonders, dtype=np.int64)
+    guild_finished = np.zeros(num_wonders, dtype=np.int64)
+
+    w = 0
+    for g, wonders in enumerate(games):
+        offsets[g] = w
+        n = len(wonders)
+        for i, wonder in enumerate(wonders):
+            neg[w] = offsets[g] + (i-1) % n
+            pos[w] = offsets[g] + (i+1) % n
+            for c, color in enumerate(COLORS):
+                card_counts[w, c] = wonder.count_cards_by_color(color)
+            military[w] = sum(wonder.military_tokens)
+            gold[w] = wonder.gold
+            stages_built[w] = wonder.stages_built
+            stages[w] = len(wonder.stages)
+            symbols, multi_science = wonder.get_science()
+            science[w] = [symbols[s] for s in SCIENCE_SYMBOLS]
+            wildcards[w] = len(multi_science)
+            for effect in wonder.all_effects():
+                if effect.type == 'points':
+                    raw_points[w] += effect.amount
+                elif effect.type == 'gold_and_points_for_cards':
+                    yellow_cards[w, COLOR_INDEX[effect.subtype]] += 1
+                elif effect.type == 'gold_and_points_for_stages':
+                    yellow_stages[w] += 1
+                elif effect.type == 'points_for_cards':
+                    guild_cards[w, COLOR_INDEX[effect.subtype]] += 1
+                elif effect.type == 'points_for_self_cards':
+                    guild_self_cards[w, COLOR_INDEX[effect.subtype]] += 1
+                elif effect.type == 'points_for_stages':
+                    guild_stages[w] += 1
+                elif effect.type == 'points_for_finished_wonder':
+                    guild_finished[w] += 1
+            w += 1
+
+    return BatchState(
+        offsets, neg, pos,
+        card_counts, military, gold, stages_built, stages,
+        science, wildcards, raw_points,
+        yellow_cards, yellow_stages, guild_cards, guild_self_cards, guild_stages, guild_finished,
+    )
+
+# Returns the points of every wonder in the batch as a dict of category -> array, with the same categories as
+# Wonder.compute_points_distribution plus 'total'.
+def score_batch(batch):
+    neg, pos = batch.neg, batch.pos
+    points = {
+        'points': batch.raw_points,
+        'military': batch.military,
+        'gold': batch.gold // 3,
+        'science': score_science_batch(batch.science, batch.wildcards),
+        'yellow': (batch.yellow_cards * batch.card_counts) @ GOLD_AND_POINTS_PER_CARD + batch.yellow_stages * batch.stages_built,
+        'guild': (
+            (batch.guild_cards * (batch.card_counts[neg] + batch.card_counts[pos])) @ POINTS_FOR_CARDS_PER_CARD
+            + batch.guild_stages * (batch.stages_built[neg] + batch.stages_built + batch.stages_built[pos])
+            + 7 * batch.guild_finished * (batch.stages_built == batch.stages)
+            + (batch.guild_self_cards * batch.card_counts).sum(axis=1)
+        ),
+    }
+    points['total'] = sum(points.values())
+    return points
+
+# Returns the science points of every wonder, trying every assignment of wildcards to symbols.
+# - science: [wonders, 3] symbol counts
+# - wildcards: number of wildcards of each wonder
+def score_science_batch(science, wildcards):
+    result = np.zeros(len(science), dtype=np.int64)
+    for num_wildcards in np.unique(wildcards):
+        rows = wildcards == num_wildcards
+        best = None
+        for gears in range(num_wildcards + 1):
+            for compasses in range(num_wildcards - gears + 1):
+                symbols = science[rows] + np.array([gears, compasses, num_wildcards - gears - compasses])
+                score = (symbols ** 2).sum(axis=1) + 7 * symbols.min(axis=1)
+                best = score if best is None else np.maximum(best, score)
+        result[rows] = best
+    return result
+
+# Returns the points string of every wonder (same format as Wonder.get_points_str) from the result of score_batch.
+def get_points_strs(points):
+    return [
+        f"{points['military'][w]}/{points['gold'][w]}/{points['points'][w]}/{points['science'][w]}/{points['yellow'][w]}/{points['guild'][w]}/{points['total'][w]}"
+        for w in range(len(points['total']))
+    ]
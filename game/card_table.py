@@ -0,0 +1,185 @@
+from array import array
+from collections import namedtuple
+
+from game.payments import RESOURCE_INDEX, resource_vector, multi_resource_mask
+
+# This file contains the compiled card table: a compact, integer-encoded form of every Card, used by the engine and
+# payment code on hot paths. The Card namedtuples in game/deck.py stay the public API; compile_card maps a Card to its
+# CompiledCard.
+#
+# Encodings:
+# - card ids: index of the card in the table. game/deck.py registers all base game cards in a fixed order on import,
+#   so ids are the same in every process
+# - colors: index into COLORS, and a bit (1 << index) for color masks
+# - chains: a bit per chain name, assigned as cards are registered
+# - effects: (type code, subtype code, amount) with type codes from EFFECT_TYPES. Subtype codes depend on the type:
+#   resource index for 'resource', resource bitmask for multi-resources, SCIENCE_SYMBOLS index for 'science',
+#   science bitmask for 'multi_science', color index for per-color effects, TRADING_SIDES index for 'tradingpost', 0 otherwise.
+#   The engine dispatches on these codes (see EffectSummary and Wonder.apply_immediate_effects); the Effect namedtuples
+#   are only read for their resource and science names
+# - hands and discard piles: arrays of card ids (cards_to_ids)
+# - hands, decks and unseen cards: count tuples indexed by card id (cards_to_counts)
+# - played cards: bitsets of card ids (cards_to_bitset, and see EffectSummary), since a wonder never plays the same card
+#   twice
+
+COLORS = ('brown', 'grey', 'blue', 'yellow', 'red', 'green', 'purple')
+COLOR_INDEX = {c: i for i, c in enumerate(COLORS)}
+SCIENCE_SYMBOLS = ('gear', 'compass', 'tablet')
+SCIENCE_INDEX = {s: i for i, s in enumerate(SCIENCE_SYMBOLS)}
+TRADING_SIDES = ('neg', 'pos')
+
+EFFECT_TYPES = (
+    'resource', 'multi_resource', 'multi_resource_unpurchasable',
+    'shields', 'science', 'multi_science', 'points', 'gold',
+    'gold_for_cards', 'gold_and_points_for_cards', 'gold_and_points_for_stages',
+    'points_for_cards', 'points_for_stages', 'points_for_finished_wonder', 'points_for_self_cards',
+    'marketplace', 'tradingpost',
+    'free_build_first_color', 'free_build_alpha', 'free_build_omega', 'play_last_card', 'build_from_discard',
+)
+EFFECT_CODES = {t: i for i, t in enumerate(EFFECT_TYPES)}
+# Type codes, prefixed so they don't shadow the card constants of game/deck.py (e.g. MARKETPLACE) in star imports
+(
+    EFFECT_RESOURCE, EFFECT_MULTI_RESOURCE, EFFECT_MULTI_RESOURCE_UNPURCHASABLE,
+    EFFECT_SHIELDS, EFFECT_SCIENCE, EFFECT_MULTI_SCIENCE, EFFECT_POINTS, EFFECT_GOLD,
+    EFFECT_GOLD_FOR_CARDS, EFFECT_GOLD_AND_POINTS_FOR_CARDS, EFFECT_GOLD_AND_POINTS_FOR_STAGES,
+    EFFECT_POINTS_FOR_CARDS, EFFECT_POINTS_FOR_STAGES, EFFECT_POINTS_FOR_FINISHED_WONDER, EFFECT_POINTS_FOR_SELF_CARDS,
+    EFFECT_MARKETPLACE, EFFECT_TRADINGPOST,
+    EFFECT_FREE_BUILD_FIRST_COLOR, EFFECT_FREE_BUILD_ALPHA, EFFECT_FREE_BUILD_OMEGA, EFFECT_PLAY_LAST_CARD, EFFECT_BUILD_FROM_DISCARD,
+) = range(len(EFFECT_TYPES))
+
+# A compiled Card.
+# - id: the card id
+# - name: the name of the card
+# - color: the color index of the card
+# - color_bit: 1 << color
+# - cost_gold: the gold cost of the card
+# - cost_vector: the resource cost of the card as a count vector (see game/payments.py)
+# - cost_chain: the bit of the chain that builds this card for free (0 if none)
+# - chains: bitmask of the chains this card provides
+# - effects: tuple of encoded effects
+CompiledCard = namedtuple('CompiledCard', ['id', 'name', 'color', 'color_bit', 'cost_gold', 'cost_vector', 'cost_chain', 'chains', 'effects'])
+
+# The table itself: compiled cards by id, card ids by name, original Cards by id, and chain bits by chain name.
+COMPILED_CARDS = []
+CARD_IDS = {}
+CARDS_BY_ID = []
+CHAIN_BITS = {}
+
+# Returns the bit for a chain name, assigning a new one if needed.
+def get_chain_bit(chain):
+    if chain not in CHAIN_BITS:
+        CHAIN_BITS[chain] = 1 << len(CHAIN_BITS)
+    return CHAIN_BITS[chain]
+
+# Returns the subtype code of an effect subtype, for an effect type code.
+def compile_effect_subtype(code, subtype):
+    if code == EFFECT_RESOURCE:
+        return RESOURCE_INDEX[subtype]
+    elif code in [EFFECT_MULTI_RESOURCE, EFFECT_MULTI_RESOURCE_UNPURCHASABLE]:
+        return multi_resource_mask(subtype.split('/'))
+    elif code == EFFECT_SCIENCE:
+        return SCIENCE_INDEX[subtype]
+    elif code == EFFECT_MULTI_SCIENCE:
+        return sum(1 << SCIENCE_INDEX[s] for s in subtype.split('/'))
+    elif code in [EFFECT_GOLD_FOR_CARDS, EFFECT_GOLD_AND_POINTS_FOR_CARDS, EFFECT_POINTS_FOR_CARDS, EFFECT_POINTS_FOR_SELF_CARDS]:
+        return COLOR_INDEX[subtype]
+    elif code == EFFECT_TRADINGPOST:
+        return TRADING_SIDES.index(subtype)
+    return 0
+
+# Encoded effects by Effect, computed on first use.
+COMPILED_EFFECTS = {}
+
+# Returns the encoded (type code, subtype code, amount) of an Effect.
+def compile_effect(effect):
+    compiled = COMPILED_EFFECTS.get(effect)
+    if compiled is None:
+        code = EFFECT_CODES[effect.type]
+        compiled = COMPILED_EFFECTS[effect] = (code, compile_effect_subtype(code, effect.subtype), effect.amount)
+    return compiled
+
+# Returns the encoded effects of a list of Effects (e.g. a wonder stage's effects) as a tuple.
+def compile_effects(effects):
+    return tuple(compile_effect(effect) for effect in effects)
+
+# Effect keys by (type, subtype), computed on first use.
+EFFECT_KEYS = {}
+
+# Returns the (type code, subtype code) key of an effect type and subtype, with None for any subtype (see
+# EffectSummary.effect_counts). Unknown types and subtypes get a key that no effect has.
+def get_effect_key(type, subtype=None):
+    key = EFFECT_KEYS.get((type, subtype))
+    if key is None:
+        try:
+            code = EFFECT_CODES[type]
+            key = (code, None if subtype is None else compile_effect_subtype(code, subtype))
+        except (KeyError, ValueError, AttributeError):
+            key = (-1, None)
+        EFFECT_KEYS[(type, subtype)] = key
+    return key
+
+# Adds the card to the table if it isn't in it yet and returns its CompiledCard. Cards are identified by name.
+def register_card(card):
+    card_id = CARD_IDS.get(card.name)
+    if card_id is not None:
+        return COMPILED_CARDS[card_id]
+    card_id = len(COMPILED_CARDS)
+    compiled = CompiledCard(
+        card_id,
+        card.name,
+        COLOR_INDEX[card.color],
+        1 << COLOR_INDEX[card.color],
+        card.cost.gold,
+        resource_vector(card.cost.resources),
+        get_chain_bit(card.cost.chain) if card.cost.chain else 0,
+        sum(get_chain_bit(chain) for chain in card.chains),
+        tuple(compile_effect(effect) for effect in card.effects),
+    )
+    COMPILED_CARDS.append(compiled)
+    CARDS_BY_ID.append(card)
+    CARD_IDS[card.name] = card_id
+    return compiled
+
+# Returns the CompiledCard for a Card (registering it if needed).
+def compile_card(card):
+    card_id = CARD_IDS.get(card.name)
+    if card_id is None:
+        return register_card(card)
+    return COMPILED_CARDS[card_id]
+
+# Returns the card id for a Card.
+def get_card_id(card):
+    return compile_card(card).id
+
+# Returns an array of card ids for a list of Cards (e.g. a hand or the discard pile).
+def cards_to_ids(cards):
+    return array('B', (compile_card(card).id for card in cards))
+
+# Returns the list of Cards for an iterable of card ids.
+def ids_to_cards(ids):
+    return [CARDS_BY_ID[card_id] for card_id in ids]
+
+# Returns the bitset of card ids for a collection of distinct Cards (e.g. a wonder's played cards).
+def cards_to_bitset(cards):
+    bitset = 0
+    for card in cards:
+        bitset |= 1 << compile_card(card).id
+    return bitset
+
+# Returns the list of Cards in a bitset of card ids, in id order.
+def bitset_to_cards(bitset):
+    return [CARDS_BY_ID[card_id] for card_id in range(bitset.bit_length()) if (bitset >> card_id) & 1]
+
+# Returns the multiset of Cards as a tuple of counts indexed by card id (e.g. for a hand that can hold duplicates).
+def cards_to_counts(cards):
+    counts = [0] * len(COMPILED_CARDS)
+    for card in cards:
+        card_id = compile_card(card).id
+        if card_id >= len(counts):
+            counts.extend(0 for _ in range(card_id + 1 - len(counts)))
+        counts[card_id] += 1
+    return tuple(counts)
+
+# Returns the list of Cards in a counts tuple, in id order.
+def counts_to_cards(counts):
+    return [CARDS_BY_ID[card_id] for card_id, count in enumerate(counts) for _ in range(count)]
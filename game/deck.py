@@ -1,4 +1,5 @@
 from game.base import *
+from random import shuffle
 
 # This file contains all cards in the base 7 Wonders game, for all player counts.
 
@@ -87,7 +88,31 @@ SHIPOWNERS_GUILD = Card('Shipowners Guild', 'purple', cost(wood=3, glass=1, pres
 
 # Returns a list of Cards in the deck for the given player count and age.
 # Note: will return all guilds in age 3 (at the beginning of the list). Removal of guilds must be done by the caller.
+# The list is a new copy of the age deck table (see get_age_deck), callers can modify it.
 def get_cards_for_players_age(players, age):
+    return list(get_age_deck(players, age))
+
+# Returns the age deck for the given player count and age as an immutable tuple, in the order of
+# get_cards_for_players_age. Decks are built once per (players, age), use this when the deck is only read.
+def get_age_deck(players, age):
+    deck = AGE_DECKS.get((players, age))
+    if deck is None:
+        deck = AGE_DECKS[(players, age)] = tuple(_build_age_deck(players, age))
+    return deck
+
+# Returns the multiset of Cards of an age deck as a tuple of counts indexed by card id (see cards_to_counts).
+def get_age_deck_counts(players, age):
+    counts = AGE_DECK_COUNTS.get((players, age))
+    if counts is None:
+        counts = AGE_DECK_COUNTS[(players, age)] = cards_to_counts(get_age_deck(players, age))
+    return counts
+
+# Returns the age of a card (1, 2, 3), or 0 for an unknown card. Grey cards are in the age 1 and age 2 decks, their age is 1.
+def get_card_age(card):
+    return CARD_AGES.get(card.name, 0)
+
+# Helper for get_age_deck. Builds the list of Cards of an age deck.
+def _build_age_deck(players, age):
     if age == 1:
         cards = [
             LUMBER_YARD, STONE_PIT, CLAY_POOL, ORE_VEIN, CLAY_PIT, TIMBER_YARD,
@@ -205,11 +230,52 @@ def get_cards_for_players_age(players, age):
         cards = []
     return cards
 
+# Age deck tables, built once for every player count and age (other player counts are built on first use):
+# - AGE_DECKS: (players, age) -> tuple of Cards (see get_age_deck)
+# - AGE_DECK_COUNTS: (players, age) -> tuple of card counts (see get_age_deck_counts)
+# - CARD_AGES: card name -> age (see get_card_age)
+# - CARDS_BY_NAME: card name -> Card (see get_card_by_name)
+AGE_DECKS = {}
+AGE_DECK_COUNTS = {}
+CARD_AGES = {}
+CARDS_BY_NAME = {}
+
+# Registers every card in the compiled card table (see game/card_table.py) in a fixed order, so card ids are the same everywhere,
+# and builds the age deck tables for every player count.
+# Runs once on import. A function, so that its loop variables don't leak into 'from game.deck import *'.
+def _register_cards():
+    for age in [1, 2, 3]:
+        for card in get_age_deck(7, age):
+            register_card(card)
+            CARDS_BY_NAME.setdefault(card.name, card)
+            CARD_AGES.setdefault(card.name, age)
+    for players in range(3, 8):
+        for age in [1, 2, 3]:
+            get_age_deck_counts(players, age)
+
+_register_cards()
+
 # Gets a card by its name.
 def get_card_by_name(name):
-    for age in [1, 2, 3]:
-        for card in get_cards_for_players_age(7, age):
-            if card.name == name:
-                return card
-    return None
-    
\ No newline at end of file
+    return CARDS_BY_NAME.get(name)
+
+
+# Returns random starting hands for a game, as a dict of age -> list of 7-card hands (one per player).
+# Deals from the age decks the way the physical game does: player_count+2 random guilds are added to the age 3 deck.
+def get_random_starting_hands(player_count):
+    deck1 = get_cards_for_players_age(player_count, 1)
+    deck2 = get_cards_for_players_age(player_count, 2)
+    deck3 = get_cards_for_players_age(player_count, 3)
+    guilds, deck3 = deck3[:10], deck3[10:]
+    shuffle(guilds)
+    deck3 = guilds[:player_count+2] + deck3
+
+    shuffle(deck1)
+    shuffle(deck2)
+    shuffle(deck3)
+
+    return {
+        1: [deck1[7*i:7*(i+1)] for i in range(player_count)],
+        2: [deck2[7*i:7*(i+1)] for i in range(player_count)],
+        3: [deck3[7*i:7*(i+1)] for i in range(player_count)],
+    }
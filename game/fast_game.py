@@ -0,0 +1,186 @@
+from game.base import *
+
+# Headless version of KnownGame for bulk self-play. Same rules and same public interface as KnownGame, but:
+# - neighbors are held by index around the wonder ring instead of being looked up by name
+# - selections are trusted by default (e.g. coming from Wonder.get_all_possible_selections) and are not re-validated
+# - nothing is ever printed or formatted
+# Results are identical to KnownGame for valid selections (see cross_check_fast_game.py).
+# - wonders: a list of Wonders in this game
+# - validate: validate every selection like KnownGame does (slower, for untrusted input)
+# - hands: a list of Card lists representing each player's hand
+# - discard_pile: a list of all Cards in the discard pile
+# - age: the age of the game (1, 2, 3)
+# - age_initialized: describes if the age has been initialized
+# - wait_for_last_card_play: describes if we are waiting for Babylon to play its last card
+# - wait_for_discard_play: describes if we are waiting for Halikarnassos to build from the discard
+# - neighbors: (negative_neighbor, positive_neighbor) Wonders of each wonder, by index
+class FastGame:
+    def __init__(self, wonders, validate=False):
+        self.wonders = wonders
+        self.validate = validate
+        self.hands = [[] for wonder in wonders]
+        self.discard_pile = []
+        self.age = 1
+        self.age_initialized = False
+        self.wait_for_last_card_play = False
+        self.wait_for_discard_play = False
+        n = len(wonders)
+        self.neighbors = [(wonders[(i-1) % n], wonders[(i+1) % n]) for i in range(n)]
+
+    # Initializes the age with the given hands dealt to players.
+    def initialize_age(self, age, hands):
+        if len(hands) != len(self.wonders):
+            raise Exception("Number of wonders is different from the number of hands")
+        if self.validate and any(len(hand) != 7 for hand in hands):
+            raise Exception("Hands do not all contain 7 cards")
+        self.hands = hands
+        self.wait_for_last_card_play = False
+        self.wait_for_discard_play = False
+        self.age = age
+        self.age_initialized = True
+
+    # Executes a turn with all selections provided.
+    def execute_turn(self, selections):
+        if self.validate:
+            self.validate_turn(selections)
+        wonders = self.wonders
+        for i in range(len(wonders)):
+            self.execute_selection(i, selections[i])
+        for i in range(len(wonders)):
+            selection = selections[i]
+            if selection.action == 'play':
+                self.execute_effects(i, compile_card(selection.card).effects)
+            elif selection.action == 'wonder':
+                self.execute_effects(i, wonders[i].get_last_built_stage_effects())
+
+        # Discard cards at end of age
+        if len(self.hands[0]) == 1:
+            for i in range(len(wonders)):
+                if wonders[i].has_effect('play_last_card', ''):
+                    self.wait_for_last_card_play = True
+                else:
+                    self.discard_pile.extend(self.hands[i])
+                    self.hands[i].clear()
+
+        # Only process the end of the turn after last-card-play/discard-play.
+        if not self.wait_for_last_card_play and not self.wait_for_discard_play:
+            self.process_end_of_turn()
+
+    # Executes Babylon's last card turn with the provided Selection.
+    def execute_last_card_turn(self, selection):
+        if self.validate and not self.wait_for_last_card_play:
+            raise Exception("Cannot play last card now")
+        for i in range(len(self.wonders)):
+            if not self.wonders[i].has_effect('play_last_card'):
+                continue
+            if self.validate:
+                is_valid, error = self.wonders[i].validate_selection(self.wonders, self.hands[i], selection)
+                if not is_valid:
+                    raise Exception(f"Error for {self.wonders[i].name}: {error}")
+            self.execute_selection(i, selection)
+            if selection.action == 'play':
+                self.execute_effects(i, compile_card(selection.card).effects)
+            elif selection.action == 'wonder':
+                self.execute_effects(i, self.wonders[i].get_last_built_stage_effects())
+            break
+        self.wait_for_last_card_play = False
+        if not self.wait_for_discard_play:
+            self.process_end_of_turn()
+
+    # Executes Halikarnassos' discard play with the provided Card (None to skip).
+    def execute_discard_turn(self, card):
+        if self.validate and (not self.wait_for_discard_play or self.wait_for_last_card_play):
+            raise Exception("Cannot build from the discard now")
+        for i in range(len(self.wonders)):
+            wonder = self.wonders[i]
+            if not wonder.has_effect('build_from_discard'):
+                continue
+            if not card:
+                break
+            if self.validate and wonder.has_played_card(card):
+                raise Exception(f"Cannot build card {card.name} from discard since it is already in the player's wonder")
+            wonder.add_played_card(card)
+            self.execute_effects(i, compile_card(card).effects)
+            self.discard_pile.remove(card)
+            break
+        self.wait_for_discard_play = False
+        self.process_end_of_turn()
+
+    # Process end of turn, including:
+    # - Rotating hands around the table
+    # - Resolving military post-age
+    # - Ending each age
+    def process_end_of_turn(self):
+        if len(self.hands[0]) == 0:
+            shields = [wonder.get_shields() for wonder in self.wonders]
+            victory_token = { 1: 1, 2: 3, 3: 5 }[self.age]
+            for i in range(len(self.wonders)):
+                wonder, neg_wonder = self.wonders[i], self.neighbors[i][0]
+                neg_shields = shields[i-1]
+                if shields[i] > neg_shields:
+                    wonder.military_tokens.append(victory_token)
+                    neg_wonder.military_tokens.append(-1)
+                elif shields[i] < neg_shields:
+                    neg_wonder.military_tokens.append(victory_token)
+                    wonder.military_tokens.append(-1)
+            self.age_initialized = False
+        elif self.age % 2 == 0:
+            self.hands.append(self.hands.pop(0))  # Rotate neg in age 2
+        else:
+            self.hands.insert(0, self.hands.pop())  # Rotate pos in age 1,3
+
+    # Validates a turn the same way KnownGame.execute_turn does. Raises an Exception if any selection is invalid.
+    def validate_turn(self, selections):
+        if not self.age_initialized:
+            raise Exception("Age is not initialized")
+        if self.wait_for_last_card_play or self.wait_for_discard_play:
+            raise Exception("Cannot play now, waiting for a last card or discard play")
+        if len(selections) != len(self.wonders):
+            raise Exception("Number of selections is different from the number of hands")
+        for i in range(len(self.wonders)):
+            is_valid, error = self.wonders[i].validate_selection(self.wonders, self.hands[i], selections[i])
+            if not is_valid:
+                raise Exception(f"Error for {self.wonders[i].name}: {error}")
+
+    # Helper for execute_turn. Plays the selection and its payment, without immediate effects.
+    def execute_selection(self, i, selection):
+        wonder = self.wonders[i]
+        wonder.play_selection(self.wonders, selection, apply_immediate_effects=False)
+        if selection.action == 'throw':
+            self.discard_pile.append(selection.card)
+        elif selection.payment:
+            neg_neighbor, pos_neighbor = self.neighbors[i]
+            neg_neighbor.gold += selection.payment.neg
+            pos_neighbor.gold += selection.payment.pos
+        self.hands[i].remove(selection.card)
+
+    # Helper for execute_turn. The effects are encoded (see compile_effects).
+    def execute_effects(self, i, effects):
+        self.wonders[i].apply_immediate_effects(self.wonders, effects, self.neighbors[i])
+        if any(code == EFFECT_BUILD_FROM_DISCARD for code, _, _ in effects):
+            self.wait_for_discard_play = True
+
+    # Returns the 64-bit hash of the game state, equal to KnownGame.get_state_hash for the same state (see game/zobrist.py).
+    # Hands are hashed on each call rather than kept up to date, so that playouts don't pay for it.
+    def get_state_hash(self):
+        h = zobrist_key(FLAGS_TAG, self.age * 8 + self.age_initialized * 4 + self.wait_for_last_card_play * 2 + self.wait_for_discard_play)
+        for i, wonder in enumerate(self.wonders):
+            h ^= position_hash(WONDER_TAG, i, wonder.get_state_hash())
+        for i, hand in enumerate(self.hands):
+            h ^= position_hash(HAND_TAG, i, cards_hash(hand))
+        return h ^ position_hash(DISCARD_TAG, 0, cards_hash(self.discard_pile))
+
+    # Returns the total points of each wonder, in order.
+    def get_scores(self):
+        return [self.wonders[i].compute_points_total(self.wonders, self.neighbors[i]) for i in range(len(self.wonders))]
+
+    # Returns the current sum total score of all wonders in the game.
+    def get_total_score(self):
+        return sum(self.get_scores())
+
+    # Returns a representation of each wonder, points distribution, hands, and discard count on separate lines.
+    def __repr__(self):
+        points = [self.wonders[i].get_points_str(self.wonders, self.neighbors[i]) for i in range(len(self.wonders))]
+        wonders = '\n'.join([f"Wonder: {self.wonders[i]}, Points: {points[i]}, Hand: {[card.name for card in self.hands[i]]}" for i in range(len(self.wonders))])
+        discard = f"Discarded cards: {len(self.discard_pile)}"
+        return f"{wonders}\n{discard}"
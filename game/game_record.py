@@ -0,0 +1,190 @@
+import gzip
+import json
+import os
+
+from threading import Lock
+
+from game.base import *
+from game.deck import *
+from game.wonders import *
+
+# This file contains the game record format, to store played games and replay them later.
+#
+# A record file is append-only JSON lines (gzip-compressed if the path ends with .gz):
+# - the first line is a header with the format version and the card table: the list of card names, a card's id being
+#   its index in the list. Records are decoded with the header of their file, so files stay readable if the deck changes
+# - every other line is one game, written as soon as the game ends:
+#   {"wonders": [[name, side], ...], "hands": {age: [hand, ...]}, "moves": {age: [move, ...]}, "scores": [...], "info": {...}}
+#   - hands: the starting hands of each age as lists of card ids. Unknown hands (e.g. opponents in a live game) are null
+#   - moves: the moves of each age, in the order of run_known_game_routine:
+#     - a regular turn is the list of each player's selection
+#     - Babylon's last card play is {"l": selection}
+#     - Halikarnassos' discard play is {"d": card id}, null to skip
+#   - a selection is [card id, action, neg, bank, pos], or [card id, action] without payment. Action is the first letter
+#     of 'play', 'wonder' or 'throw', and the card id is null when unknown (e.g. opponents' wonder and throw moves on BGA)
+#   - scores: the final total points of each wonder
+#   - info: free-form data about the game (e.g. the seed of a local game)
+# Millions of games fit in a file: a local game is 1 to 3 KB (a few hundred bytes compressed), and the reader only
+# decodes one line at a time.
+
+RECORD_FORMAT = '7wai-game-records'
+RECORD_VERSION = 1
+
+# The card table of new record files.
+RECORD_CARD_NAMES = list(CARDS_BY_NAME)
+RECORD_CARD_IDS = {name: i for i, name in enumerate(RECORD_CARD_NAMES)}
+
+ACTION_CODES = {'play': 'p', 'wonder': 'w', 'throw': 't'}
+ACTIONS_BY_CODE = {code: action for action, code in ACTION_CODES.items()}
+
+# Returns a game as a record dict (one line of a record file), with the card ids of RECORD_CARD_NAMES.
+# - wonders: the Wonders of the game (only their names and sides are recorded)
+# - starting_hands: dict of age -> list of starting hands, with None for unknown hands
+# - moves: dict of age -> list of moves, in the format of run_known_game_routine
+# - scores: the final total points of each wonder
+# - info: optional dict of JSON-serializable data about the game
+def encode_game_record(wonders, starting_hands, moves, scores, info=None):
+    return {
+        'wonders': [[wonder.name, wonder.side] for wonder in wonders],
+        'hands': {str(age): [encode_cards(hand) if hand is not None else None for hand in hands] for age, hands in starting_hands.items()},
+        'moves': {str(age): [encode_move(move) for move in age_moves] for age, age_moves in moves.items()},
+        'scores': list(scores),
+        'info': info or {},
+    }
+
+# Returns the card ids of a list of Cards.
+def encode_cards(cards):
+    return [RECORD_CARD_IDS[card.name] for card in cards]
+
+# Returns the record of a move (see the format above).
+def encode_move(move):
+    if type(move) is list:
+        return [encode_selection(selection) for selection in move]
+    if type(move) is Selection:
+        return {'l': encode_selection(move)}
+    return {'d': RECORD_CARD_IDS[move.name] if move else None}
+
+# Returns the record of a Selection (see the format above).
+def encode_selection(selection):
+    if selection is None:
+        return None
+    card_id = RECORD_CARD_IDS[selection.card.name] if selection.card else None
+    if selection.payment is None:
+        return [card_id, ACTION_CODES[selection.action]]
+    return [card_id, ACTION_CODES[selection.action], selection.payment.neg, selection.payment.bank, selection.payment.pos]
+
+# A game read from a record file. Wonders, scores and info are decoded when the line is read, hands and moves only when
+# asked for, so scanning a file for some games is cheap.
+# - wonders: list of (name, side) of the wonders in the game, in turn order
+# - scores: the final total points of each wonder
+# - info: the info dict of the game
+class GameRecord:
+    def __init__(self, data, cards):
+        self.data = data
+        self.cards = cards
+        self.wonders = [tuple(wonder) for wonder in data['wonders']]
+        self.scores = data['scores']
+        self.info = data.get('info', {})
+
+    # Returns True if every starting hand is known, i.e. the game can be replayed.
+    def is_complete(self):
+        return all(hand is not None for hands in self.data['hands'].values() for hand in hands)
+
+    # Returns new Wonders for the game, at the start of the game.
+    def get_wonders(self):
+        return [get_wonder_by_name_side(name, side)() for name, side in self.wonders]
+
+    # Returns the starting hands as a dict of age -> list of hands (None for unknown hands).
+    def get_starting_hands(self):
+        return {int(age): [self.decode_cards(hand) if hand is not None else None for hand in hands] for age, hands in self.data['hands'].items()}
+
+    # Returns the moves as a dict of age -> list of moves, in the format of run_known_game_routine.
+    def get_moves(self):
+        return {int(age): [self.decode_move(move) for move in moves] for age, moves in self.data['moves'].items()}
+
+    def decode_cards(self, ids):
+        return [self.cards[card_id] for card_id in ids]
+
+    def decode_move(self, move):
+        if type(move) is list:
+            return [self.decode_selection(selection) for selection in move]
+        if 'l' in move:
+            return self.decode_selection(move['l'])
+        return self.cards[move['d']] if move['d'] is not None else None
+
+    def decode_selection(self, selection):
+        if selection is None:
+            return None
+        card = self.cards[selection[0]] if selection[0] is not None else None
+        payment = Payment(*selection[2:]) if len(selection) > 2 else None
+        return Selection(card, ACTIONS_BY_CODE[selection[1]], payment)
+
+# Appends game records to a file, one line per game, flushed as soon as it is written so that a crash loses at most the
+# game being played. Creates the file with its header if it doesn't exist. Safe to share between threads (e.g. the
+# sessions of run_sessions).
+# Usage:
+#   with GameRecordWriter('games.jsonl.gz') as writer:
+#       writer.write(encode_game_record(...))
+class GameRecordWriter:
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            header = read_record_header(path)
+            if header['cards'] != RECORD_CARD_NAMES:
+                raise Exception(f"Cannot append to {path}, its card table is different from the current deck")
+            self.file = open_record_file(path, 'at')
+        else:
+            self.file = open_record_file(path, 'wt')
+            self.write_line({'format': RECORD_FORMAT, 'version': RECORD_VERSION, 'cards': RECORD_CARD_NAMES})
+
+    # Writes a record dict (see encode_game_record).
+    def write(self, record):
+        with self.lock:
+            self.write_line(record)
+
+    # Encodes and writes a game (same arguments as encode_game_record).
+    def write_game(self, wonders, starting_hands, moves, scores, info=None):
+        self.write(encode_game_record(wonders, starting_hands, moves, scores, info))
+
+    def write_line(self, data):
+        self.file.write(json.dumps(data, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Opens a record file in the given text mode, compressed if the path ends with .gz.
+def open_record_file(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+# Returns the header of a record file.
+def read_record_header(path):
+    with open_record_file(path, 'rt') as f:
+        return parse_record_header(path, f.readline())
+
+# Returns the header of a record file from its first line.
+def parse_record_header(path, line):
+    header = json.loads(line) if line.strip() else {}
+    if header.get('format') != RECORD_FORMAT:
+        raise Exception(f"{path} is not a game record file")
+    if header['version'] > RECORD_VERSION:
+        raise Exception(f"{path} has record version {header['version']}, only up to {RECORD_VERSION} is supported")
+    return header
+
+# Yields the GameRecords of a record file one by one, reading the file as it goes.
+def read_game_records(path):
+    with open_record_file(path, 'rt') as f:
+        header = parse_record_header(path, f.readline())
+        cards = [get_card_by_name(name) for name in header['cards']]
+        for line in f:
+            if line.strip():
+                yield GameRecord(json.loads(line), cards)
@@ -1,5 +1,17 @@
+from collections import namedtuple
+
 from game.base import *
 
+# The state of a KnownGame before a logged call, as kept in its undo log (see KnownGame.undo). Only what the calls
+# change is kept, so a record costs a few small tuples instead of a copy of the game:
+# - age, age_initialized, wait_for_last_card_play, wait_for_discard_play: the game's attributes
+# - hands: the hands list, and (hand, cards) for each hand so that undo restores the same list objects
+# - discard_count: the number of cards in the discard pile
+# - discard_removed: (index, Card) of the card built from the discard pile by the call, if any
+# - wonder_states: (gold, played card count, stages built, military token count) of each wonder
+# - hand_hashes, discard_hash: the game's attributes
+UndoRecord = namedtuple('UndoRecord', ['age', 'age_initialized', 'wait_for_last_card_play', 'wait_for_discard_play', 'hands', 'discard_count', 'discard_removed', 'wonder_states', 'hand_hashes', 'discard_hash'])
+
 # Simulates a 7 Wonders game locally.
 # - wonders: a list of Wonders in this game
 # - verbose: print out all selections/states as they occur
@@ -9,10 +21,23 @@ from game.base import *
 # - age_initialized: describes if the age has been initialized
 # - wait_for_last_card_play: describes if we are waiting for Babylon to play its last card
 # - wait_for_discard_play: describes if we are waiting for Halikarnassos to build from the discard
+# - undo_log: list of UndoRecords, one for each call to initialize_age, execute_turn, execute_last_card_turn and
+#   execute_discard_turn (which include process_end_of_turn), most recent last. None if the game is not undoable
+# - hand_hashes: the hash of each hand, kept up to date as cards leave the hands (see get_state_hash)
+# - discard_hash: the hash of the discard pile, kept up to date as cards are discarded or built from it
+# Undoable games let a search try a line of turns and take it back with undo instead of copying the game:
+#   game = KnownGame(wonders, verbose=False, undoable=True)
+#   depth = len(game.undo_log)
+#   game.execute_turn(selections)
+#   ...
+#   game.undo_to(depth)
 class KnownGame:
-    def __init__(self, wonders, verbose=True):
+    def __init__(self, wonders, verbose=True, undoable=False):
         self.wonders = wonders
         self.verbose = verbose
+        self.undo_log = [] if undoable else None
+        self.hand_hashes = [0 for wonder in wonders]
+        self.discard_hash = 0
         self.hands = [[] for wonder in wonders]
         self.discard_pile = []
         self.age = 1
@@ -26,7 +51,9 @@ class KnownGame:
             raise Exception("Number of wonders is different from the number of hands")
         if any(len(hand) != 7 for hand in hands):
             raise Exception("Hands do not all contain 7 cards")
+        self.log_undo()
         self.hands = hands
+        self.hand_hashes = [cards_hash(hand) for hand in hands]
         self.wait_for_last_card_play = False
         self.wait_for_discard_play = False
         self.age = age
@@ -47,6 +74,7 @@ class KnownGame:
             is_valid, error = self.wonders[i].validate_selection(self.wonders, self.hands[i], selections[i])
             if not is_valid:
                 raise Exception(f"Error for {self.wonders[i].name}: {error}")
+        self.log_undo()
         # Perform turn
         effects_for_process = [[] for wonder in self.wonders]
         for i in range(len(self.wonders)):
@@ -64,6 +92,8 @@ class KnownGame:
                 else:
                     self.discard_pile.extend(self.hands[i])
                     self.hands[i].clear()
+                    self.discard_hash = (self.discard_hash + self.hand_hashes[i]) & MASK_64
+                    self.hand_hashes[i] = 0
 
         # Only process the end of the turn after last-card-play/discard-play.
         if not self.wait_for_last_card_play and not self.wait_for_discard_play:
@@ -82,6 +112,7 @@ class KnownGame:
             is_valid, error = self.wonders[i].validate_selection(self.wonders, self.hands[i], selection)
             if not is_valid:
                 raise Exception(f"Error for {self.wonders[i].name}: {error}")
+            self.log_undo()
             effects_for_process = [[] for wonder in self.wonders]
             self.execute_selection(i, selection, effects_for_process)
             self.execute_effects(self.wonders[i], effects_for_process[i])
@@ -105,11 +136,15 @@ class KnownGame:
             if card in self.wonders[i].played_cards:
                 raise Exception(f"Cannot build card {card.name} from discard since it is already in the player's wonder")
             if not card:
+                self.log_undo()
                 if self.verbose: print(f"{self.wonders[i].name} has decided not to play a card from the discard")
                 break
-            self.wonders[i].played_cards.append(card)
-            self.execute_effects(self.wonders[i], card.effects)
-            self.discard_pile.remove(card)
+            discard_index = self.discard_pile.index(card)
+            self.log_undo((discard_index, card))
+            self.wonders[i].add_played_card(card)
+            self.execute_effects(self.wonders[i], compile_card(card).effects)
+            del self.discard_pile[discard_index]
+            self.discard_hash = (self.discard_hash - card_key(card)) & MASK_64
             if self.verbose: print(f"{self.wonders[i].name} plays {card.name}")
             break
         self.wait_for_discard_play = False
@@ -141,8 +176,10 @@ class KnownGame:
         else:
             if self.age % 2 == 0:
                 self.hands.append(self.hands.pop(0))  # Rotate neg in age 2
+                self.hand_hashes.append(self.hand_hashes.pop(0))
             else:
                 self.hands.insert(0, self.hands.pop())  # Rotate pos in age 1,3
+                self.hand_hashes.insert(0, self.hand_hashes.pop())
 
     # Helper for execute_turn
     def execute_selection(self, i, selection, effects_for_process):
@@ -150,18 +187,20 @@ class KnownGame:
         wonder.play_selection(self.wonders, selection, apply_immediate_effects=False)
         if selection.action == 'play':
             self.execute_payment(wonder, selection.payment)
-            effects_for_process[i] = selection.card.effects
+            effects_for_process[i] = compile_card(selection.card).effects
             if self.verbose: print(f"{wonder.name} plays {selection.card.name}")
         if selection.action == 'wonder':
             self.execute_payment(wonder, selection.payment)
-            effects_for_process[i] = wonder.get_last_built_stage().effects
+            effects_for_process[i] = wonder.get_last_built_stage_effects()
             if self.verbose: print(f"{wonder.name} buries {selection.card.name} to build wonder stage {wonder.stages_built}")
         if selection.action == 'throw':
             self.discard_pile.append(selection.card)
+            self.discard_hash = (self.discard_hash + card_key(selection.card)) & MASK_64
             if self.verbose: print(f"{wonder.name} throws {selection.card.name} for 3 gold")
         hand.remove(selection.card)
+        self.hand_hashes[i] = (self.hand_hashes[i] - card_key(selection.card)) & MASK_64
 
-    # Helper for execute_turn
+    # Helper for execute_turn. The effects are encoded (see compile_effects).
     def execute_effects(self, wonder, effects):
         previous_gold = wonder.gold
         wonder.apply_immediate_effects(self.wonders, effects)
@@ -169,7 +208,7 @@ class KnownGame:
         gold_gain = wonder.gold - previous_gold
         if wonder.gold != previous_gold:
             if self.verbose: print(f"{wonder.name} gains {wonder.gold - previous_gold} gold")
-        if any(e.type == 'build_from_discard' for e in effects):
+        if any(code == EFFECT_BUILD_FROM_DISCARD for code, _, _ in effects):
             if self.verbose: print(f"{wonder.name} can build a card from the discard pile")
             self.wait_for_discard_play = True
 
@@ -190,6 +229,60 @@ class KnownGame:
             if payment.total() > 0:
                 if self.verbose: print(f"{wonder.name} pays: {', '.join(pm)}")
 
+    # Helper for the logged calls (see undo_log). Adds the current state to the undo log, if the game is undoable.
+    def log_undo(self, discard_removed=None):
+        if self.undo_log is None:
+            return
+        self.undo_log.append(UndoRecord(
+            self.age, self.age_initialized, self.wait_for_last_card_play, self.wait_for_discard_play,
+            (self.hands, tuple((hand, tuple(hand)) for hand in self.hands)),
+            len(self.discard_pile), discard_removed,
+            tuple((wonder.gold, len(wonder.played_cards), wonder.stages_built, len(wonder.military_tokens)) for wonder in self.wonders),
+            tuple(self.hand_hashes), self.discard_hash,
+        ))
+
+    # Takes back the last logged call (see undo_log), restoring the game and its wonders as they were before it.
+    def undo(self):
+        if not self.undo_log:
+            raise Exception("Nothing to undo")
+        record = self.undo_log.pop()
+        self.age = record.age
+        self.age_initialized = record.age_initialized
+        self.wait_for_last_card_play = record.wait_for_last_card_play
+        self.wait_for_discard_play = record.wait_for_discard_play
+        self.hands, hand_cards = record.hands
+        self.hands[:] = [hand for hand, cards in hand_cards]
+        for hand, cards in hand_cards:
+            hand[:] = cards
+        del self.discard_pile[record.discard_count:]
+        if record.discard_removed:
+            self.discard_pile.insert(*record.discard_removed)
+        self.hand_hashes = list(record.hand_hashes)
+        self.discard_hash = record.discard_hash
+        for wonder, (gold, played_count, stages_built, token_count) in zip(self.wonders, record.wonder_states):
+            wonder.gold = gold
+            del wonder.military_tokens[token_count:]
+            if len(wonder.played_cards) != played_count or wonder.stages_built != stages_built:
+                del wonder.played_cards[played_count:]
+                wonder.stages_built = stages_built
+                # Rebuild the effect index now, before other cards can be added in place of the removed ones
+                wonder.get_summaries()
+
+    # Takes back logged calls until the undo log has the given length (e.g. len(undo_log) before trying a line of play).
+    def undo_to(self, depth):
+        while len(self.undo_log) > depth:
+            self.undo()
+
+    # Returns the 64-bit hash of the game state: age and waiting flags, each wonder's state, hands and discard pile (see
+    # game/zobrist.py). Equal states have equal hashes whatever the order of the moves that led to them.
+    def get_state_hash(self):
+        h = zobrist_key(FLAGS_TAG, self.age * 8 + self.age_initialized * 4 + self.wait_for_last_card_play * 2 + self.wait_for_discard_play)
+        for i, wonder in enumerate(self.wonders):
+            h ^= position_hash(WONDER_TAG, i, wonder.get_state_hash())
+        for i, hand_hash in enumerate(self.hand_hashes):
+            h ^= position_hash(HAND_TAG, i, hand_hash)
+        return h ^ position_hash(DISCARD_TAG, 0, self.discard_hash)
+
     # Returns the current sum total score of all wonders in the game.
     def get_total_score(self):
         return sum(wonder.compute_points_total(self.wonders) for wonder in self.wonders)
@@ -0,0 +1,204 @@
+from functools import lru_cache
+from itertools import count
+
+# This file contains the payment solver used to find every way a wonder can pay for a cost.
+#
+# Everything here works on resource count vectors instead of resource lists:
+# - a count vector is a tuple with one count per resource, in RESOURCE_ORDER order (e.g. 2 wood + 1 loom = (2, 0, 0, 0, 0, 0, 1))
+# - a multi-resource is a bitmask over RESOURCE_ORDER (e.g. "wood/clay" = 0b101)
+# - a plan is a (neg, pos) tuple of gold paid to the negative and positive neighbors. Bank gold is fixed by the cost, so it is not part of the search.
+
+RESOURCE_ORDER = ('wood', 'ore', 'clay', 'stone', 'glass', 'press', 'loom')
+RESOURCE_INDEX = {r: i for i, r in enumerate(RESOURCE_ORDER)}
+NUM_RESOURCES = len(RESOURCE_ORDER)
+EMPTY_VECTOR = (0,) * NUM_RESOURCES
+
+# Returns the count vector for a list of resources (e.g. ["wood", "wood", "loom"]).
+def resource_vector(resources):
+    counts = [0] * NUM_RESOURCES
+    for r in resources:
+        counts[RESOURCE_INDEX[r]] += 1
+    return tuple(counts)
+
+# Returns the bitmask for a multi-resource given as a list of its resources (e.g. ["wood", "clay"]).
+def multi_resource_mask(multi_resource):
+    mask = 0
+    for r in multi_resource:
+        mask |= 1 << RESOURCE_INDEX[r]
+    return mask
+
+# Returns the resources still required after using the given single resources, as a count vector.
+def subtract_vector(required, produced):
+    return tuple(max(r - p, 0) for r, p in zip(required, produced))
+
+# Returns the trading price vectors (neg_prices, pos_prices) for the given trading flags.
+# Brown resources cost 1 from a side with a trading post, grey resources cost 1 from both sides with a marketplace. Everything else costs 2.
+@lru_cache(maxsize=None)
+def trading_prices(has_neg_trading, has_pos_trading, has_marketplace):
+    grey = 1 if has_marketplace else 2
+    neg = (1 if has_neg_trading else 2,) * 4 + (grey,) * 3
+    pos = (1 if has_pos_trading else 2,) * 4 + (grey,) * 3
+    return (neg, pos)
+
+# The plans of a cost that is already covered: nothing to pay to neighbors.
+FREE_PLANS = frozenset({(0, 0)})
+
+# Returns the frozenset of all (neg, pos) plans that cover the required count vector.
+# - required: resources not covered by the wonder's own single resources
+# - own_multi: bitmasks of the wonder's own multi-resources (used for free)
+# - neg_singles, pos_singles: count vectors of single resources purchasable from each neighbor
+# - neg_multi, pos_multi: bitmasks of multi-resources purchasable from each neighbor
+# - neg_prices, pos_prices: price vectors from trading_prices
+# Returns an empty frozenset if the cost can't be covered.
+def achievable_payments(required, own_multi, neg_singles, neg_multi, pos_singles, pos_multi, neg_prices, pos_prices):
+    if required == EMPTY_VECTOR:
+        return FREE_PLANS
+    # Drop everything that can't help with this cost so that equivalent boards share a cache entry.
+    needed_mask = multi_resource_mask(r for r, n in zip(RESOURCE_ORDER, required) if n > 0)
+    own_multi = _relevant_masks(own_multi, needed_mask)
+    neg_singles, neg_multi = _cap_vector(neg_singles, required), _relevant_masks(neg_multi, needed_mask)
+    pos_singles, pos_multi = _cap_vector(pos_singles, required), _relevant_masks(pos_multi, needed_mask)
+    if neg_singles == EMPTY_VECTOR and not neg_multi:
+        neg_prices = None
+    if pos_singles == EMPTY_VECTOR and not pos_multi:
+        pos_prices = None
+    return _achievable_payments(required, own_multi, neg_singles, neg_multi, pos_singles, pos_multi, neg_prices, pos_prices)
+
+# Same arguments as achievable_payments, but returns only the Pareto-minimal plans, i.e. plans where no other plan pays
+# at most as much to both neighbors. Sorted for determinism.
+def minimal_payments(required, own_multi, neg_singles, neg_multi, pos_singles, pos_multi, neg_prices, pos_prices):
+    return pareto_minimal(achievable_payments(required, own_multi, neg_singles, neg_multi, pos_singles, pos_multi, neg_prices, pos_prices))
+
+# Clears the solver caches and the payment entries (e.g. to measure cold solves).
+def clear_payment_caches():
+    _achievable_payments.cache_clear()
+    pareto_minimal.cache_clear()
+    PAYMENT_ENTRIES.clear()
+    PAYMENT_SIGNATURE_IDS.clear()
+
+# Payment entries cache the payments of a cost for a wonder and its neighbors, so that move generation and validation
+# don't rebuild and solve the same payment problem on every call (see Wonder.get_payment_entry).
+# They are keyed on (own signature id, neg neighbor signature id, pos neighbor signature id, cost key), where a payment
+# signature is everything on a wonder that payments depend on: its resources and trading effects. A signature only
+# changes when the wonder gains production or trading effects, so entries stay valid across turns, games and playouts
+# while those boards don't change.
+# - PAYMENT_ENTRIES: key -> PaymentEntry, cleared when it reaches MAX_PAYMENT_ENTRIES
+# - PAYMENT_SIGNATURE_IDS: payment signature -> small int id. Ids are never reused, even after clear_payment_caches
+PAYMENT_ENTRIES = {}
+MAX_PAYMENT_ENTRIES = 1 << 16
+PAYMENT_SIGNATURE_IDS = {}
+_signature_ids = count()
+
+# The payment problem of a cost, as (bank, *achievable_payments arguments), with its solutions computed on first use.
+class PaymentEntry:
+    def __init__(self, problem):
+        self.problem = problem
+        self.bank = problem[0]
+        self._minimal = None
+        self._achievable = None
+        self._cheapest = None
+
+    # Same as minimal_payments for the problem.
+    def get_minimal_payments(self):
+        if self._minimal is None:
+            self._minimal = minimal_payments(*self.problem[1:])
+        return self._minimal
+
+    # Returns the (neg, pos) of the minimal payment with the least gold, preferring payments split evenly between neighbors
+    # (same choice as Wonder.get_min_gold_payment), or None if the cost can't be paid.
+    def get_cheapest_payment(self):
+        if self._cheapest is None:
+            minimal = self.get_minimal_payments()
+            self._cheapest = min(minimal, key=lambda plan: (plan[0] + plan[1], abs(plan[1] - plan[0]), plan[0])) if minimal else ()
+        return self._cheapest or None
+
+    # Same as achievable_payments for the problem.
+    def get_achievable_payments(self):
+        if self._achievable is None:
+            self._achievable = achievable_payments(*self.problem[1:])
+        return self._achievable
+
+# Returns the id of a payment signature (any hashable), the same for equal signatures until clear_payment_caches.
+def get_payment_signature_id(signature):
+    signature_id = PAYMENT_SIGNATURE_IDS.get(signature)
+    if signature_id is None:
+        signature_id = PAYMENT_SIGNATURE_IDS[signature] = next(_signature_ids)
+    return signature_id
+
+# Adds a PaymentEntry for the problem to the cache and returns it.
+def add_payment_entry(key, problem):
+    if len(PAYMENT_ENTRIES) >= MAX_PAYMENT_ENTRIES:
+        PAYMENT_ENTRIES.clear()
+    entry = PAYMENT_ENTRIES[key] = PaymentEntry(problem)
+    return entry
+
+# Returns the Pareto-minimal plans of a set of (neg, pos) plans, sorted by neg.
+@lru_cache(maxsize=4096)
+def pareto_minimal(plans):
+    result = []
+    for plan in sorted(plans):
+        # Sorted by neg ascending, so a plan is minimal iff it pays strictly less to pos than every plan before it.
+        if not result or plan[1] < result[-1][1]:
+            result.append(plan)
+    return tuple(result)
+
+# Helper for achievable_payments
+def _relevant_masks(masks, needed_mask):
+    return tuple(sorted(m & needed_mask for m in masks if m & needed_mask))
+
+# Helper for achievable_payments
+def _cap_vector(counts, required):
+    return tuple(min(c, r) for c, r in zip(counts, required))
+
+# Helper for achievable_payments. Dynamic program over payment sources.
+# States map each remaining-requirement vector to the set of (neg, pos) plans that reach it.
+# Each source (own multi-resource, neighbor single resource stack, neighbor multi-resource) is either left unused
+# or assigned to one resource still required, so identical assignments in a different order collapse into the same state.
+@lru_cache(maxsize=65536)
+def _achievable_payments(required, own_multi, neg_singles, neg_multi, pos_singles, pos_multi, neg_prices, pos_prices):
+    states = {required: {(0, 0)}}
+
+    for mask in own_multi:
+        states = _use_multi(states, mask, None, 0)
+
+    for side, singles, prices in [(0, neg_singles, neg_prices), (1, pos_singles, pos_prices)]:
+        for i in range(NUM_RESOURCES):
+            if singles[i] == 0:
+                continue
+            new_states = {}
+            for need, plans in states.items():
+                for k in range(min(singles[i], need[i]) + 1):
+                    new_need = need[:i] + (need[i] - k,) + need[i+1:]
+                    cost = k * prices[i]
+                    target = new_states.setdefault(new_need, set())
+                    if side == 0:
+                        target.update((neg + cost, pos) for neg, pos in plans)
+                    else:
+                        target.update((neg, pos + cost) for neg, pos in plans)
+            states = new_states
+
+    for mask in neg_multi:
+        states = _use_multi(states, mask, neg_prices, 0)
+    for mask in pos_multi:
+        states = _use_multi(states, mask, pos_prices, 1)
+
+    return frozenset(states.get(EMPTY_VECTOR, ()))
+
+# Helper for _achievable_payments. Applies one multi-resource source to every state.
+# prices is None for the wonder's own multi-resources, which are free.
+def _use_multi(states, mask, prices, side):
+    new_states = {}
+    for need, plans in states.items():
+        new_states.setdefault(need, set()).update(plans)
+        for i in range(NUM_RESOURCES):
+            if not (mask >> i) & 1 or need[i] == 0:
+                continue
+            new_need = need[:i] + (need[i] - 1,) + need[i+1:]
+            target = new_states.setdefault(new_need, set())
+            if prices is None:
+                target.update(plans)
+            elif side == 0:
+                target.update((neg + prices[i], pos) for neg, pos in plans)
+            else:
+                target.update((neg, pos + prices[i]) for neg, pos in plans)
+    return new_states
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+# This file contains science scoring from symbol counts.
+#
+# Every multi_science effect in the game (Scientists Guild, Babylon's stages) can be any of the three symbols, so a
+# wonder's science is fully described by (gear, compass, tablet, wildcards). Points only depend on the multiset of the
+# three symbol counts, so the table is keyed on the sorted counts and shared between permutations.
+
+# Returns the science points for the given symbol counts without wildcards.
+def science_points_without_wildcards(gear, compass, tablet):
+    return gear**2 + compass**2 + tablet**2 + 7 * min(gear, compass, tablet)
+
+# Returns the science points for the given symbol counts, with each wildcard assigned to its best symbol.
+def science_points(gear, compass, tablet, wildcards=0):
+    if wildcards == 0:
+        return science_points_without_wildcards(gear, compass, tablet)
+    return _science_points(*sorted((gear, compass, tablet)), wildcards)
+
+# Helper for science_points. a <= b <= c. Tries every split of the wildcards between the three symbols.
+@lru_cache(maxsize=None)
+def _science_points(a, b, c, wildcards):
+    return max(
+        science_points_without_wildcards(a + x, b + y, c + wildcards - x - y)
+        for x in range(wildcards + 1)
+        for y in range(wildcards - x + 1)
+    )
+
+# Returns the points gained by one more (gear, compass, tablet, wildcard) for the given symbol counts.
+@lru_cache(maxsize=None)
+def science_marginal_values(gear, compass, tablet, wildcards=0):
+    points = science_points(gear, compass, tablet, wildcards)
+    return (
+        science_points(gear + 1, compass, tablet, wildcards) - points,
+        science_points(gear, compass + 1, tablet, wildcards) - points,
+        science_points(gear, compass, tablet + 1, wildcards) - points,
+        science_points(gear, compass, tablet, wildcards + 1) - points,
+    )
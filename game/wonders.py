@@ -123,3 +123,11 @@ def get_wonder_by_bga_name_side(name, side):
     if name not in name_i or side not in side_i:
         raise Exception(f"Could not parse wonder: {name} {side}")
     return ALL_WONDERS[name_i[name]][side_i[side]]
+
+# Returns the wonder factory for the given wonder name and side, as in Wonder.name and Wonder.side (e.g. 'Giza', 'Day').
+def get_wonder_by_name_side(name, side):
+    name_i = {'Giza': 0, 'Ephesos': 1, 'Rhodos': 2, 'Alexandria': 3, 'Olympia': 4, 'Babylon': 5, 'Halikarnassos': 6}
+    side_i = {'Day': 0, 'Night': 1}
+    if name not in name_i or side not in side_i:
+        raise Exception(f"Unknown wonder: {name} {side}")
+    return ALL_WONDERS[name_i[name]][side_i[side]]
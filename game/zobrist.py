@@ -0,0 +1,81 @@
+from zlib import crc32
+
+from game.card_table import compile_card
+
+# This file contains the keys of the 64-bit state hashes of KnownGame and FastGame (see KnownGame.get_state_hash), so
+# that search can recognize a position reached by different move orders (e.g. the same two turns played in either order).
+#
+# Hashes are Zobrist-style: every part of the state has a pseudo-random 64-bit key, and a state's hash combines the keys
+# of its parts, so that it can be updated as parts change instead of being recomputed:
+# - sets and multisets (hands, discard pile, military tokens) add up the keys of their elements modulo 2^64, so adding or
+#   removing a card is one addition or subtraction, and a hand can be moved to the discard pile by adding its hash
+# - played cards are already a bitset of card ids on each wonder (see EffectSummary), which is mixed into a key
+# - a part's hash is mixed with a key for its position (wonder or hand index), so that the same board or hand at another
+#   seat gives a different hash
+# Keys come from a fixed mixing function, not a random generator, so hashes are the same in every process.
+
+MASK_64 = (1 << 64) - 1
+
+# Tags that keep the keys of different kinds of parts apart.
+CARD_TAG = 1 << 56
+GOLD_TAG = 2 << 56
+STAGES_TAG = 3 << 56
+MILITARY_TAG = 4 << 56
+WONDER_TAG = 5 << 56
+HAND_TAG = 6 << 56
+DISCARD_TAG = 7 << 56
+FLAGS_TAG = 8 << 56
+CARD_SET_TAG = 9 << 56
+SEARCH_TAG = 10 << 56  # Parts of a search's own state (e.g. MonteCarloAi's hand inference)
+
+# Returns a well-mixed 64-bit integer for an integer (the splitmix64 finalizer).
+def mix_64(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return x ^ (x >> 31)
+
+# Keys by (tag + value), computed on first use.
+ZOBRIST_KEYS = {}
+
+# Returns the key of a value of a kind of part (e.g. zobrist_key(GOLD_TAG, 7) for 7 gold).
+def zobrist_key(tag, value):
+    key = ZOBRIST_KEYS.get(tag + value)
+    if key is None:
+        key = ZOBRIST_KEYS[tag + value] = mix_64(tag + value)
+    return key
+
+# Returns the key of a Card in a hand or the discard pile.
+def card_key(card):
+    return zobrist_key(CARD_TAG, compile_card(card).id)
+
+# Returns the hash of a list of Cards that can hold duplicates (e.g. a hand).
+def cards_hash(cards):
+    return sum(card_key(card) for card in cards) & MASK_64
+
+# Returns the hash of cards given as a list of counts indexed by card id (see cards_to_counts), equal to cards_hash of the
+# same cards.
+def card_counts_hash(counts):
+    return sum(count * zobrist_key(CARD_TAG, card_id) for card_id, count in enumerate(counts) if count) & MASK_64
+
+# Returns the hash of a bitset of card ids (e.g. a wonder's played cards), one 64-bit word at a time.
+def card_bitset_hash(bitset):
+    h = 0
+    word = 0
+    while bitset:
+        h ^= mix_64((bitset & MASK_64) ^ zobrist_key(CARD_SET_TAG, word))
+        bitset >>= 64
+        word += 1
+    return h
+
+# Returns the hash of a list of military tokens.
+def military_hash(tokens):
+    return sum(zobrist_key(MILITARY_TAG, token) for token in tokens) & MASK_64
+
+# Returns the key of a wonder board (name and side), the same in every process.
+def wonder_key(name, side):
+    return zobrist_key(WONDER_TAG, crc32(f"{name}/{side}".encode()))
+
+# Returns the hash of a part at a position (e.g. a hand's hash at hand index 2), with the tag of the kind of part.
+def position_hash(tag, position, h):
+    return mix_64(h ^ zobrist_key(tag, position))
@@ -1,47 +1,51 @@
-from routines.ai_local_game_routine import run_ai_local_game_routine
+from routines.batch_local_games_routine import run_batch_local_games_routine, run_seeded_local_game_routine
 from game.deck import *
 from game.wonders import *
 from ai.random_ai import RandomAi
 from ai.first_ai import FirstAi
-from random import shuffle, sample
+from ai.instrumentation import aggregate_instrumentation, format_instrumentation
+from game.game_record import GameRecordWriter
 
-# Runs multiple local AI games automatically.
-# At the end, outputs the result of the "best game" (highest total score).
+# Runs multiple local AI games automatically, spread over all cores.
+# At the end, outputs the result of the "best game" (highest total score) and its seed.
 # Steps:
-# - 1: Adjust the ais and num_games below to your liking.
+# - 1: Adjust the ais, num_games and base_seed below to your liking.
 # - 2: Run `python loop_local_games.py`
+# - 3: To replay a game move by move, set replay_seed to the seed of the game and run again.
+# - 4: To see where the AI spends its time, set instrument to True.
+# - 5: To keep every game, set record_path to a record file (e.g. 'games.jsonl.gz'). Games are appended to it as they
+#      finish, see replay_game.py to replay them.
 
 ai = FirstAi(verbose=False)
 ais = [ai, ai, ai, ai]
 num_games = 20
-
-player_count = len(ais)
-best_game = None
-
-for _ in range(num_games):
-    wonders = get_random_wonders(player_count)
-
-    deck1 = get_cards_for_players_age(player_count, 1)
-    deck2 = get_cards_for_players_age(player_count, 2)
-    deck3 = get_cards_for_players_age(player_count, 3)
-    guilds, deck3 = deck3[:10], deck3[10:]
-    shuffle(guilds)
-    deck3 = guilds[:player_count+2] + deck3
-
-    shuffle(deck1)
-    shuffle(deck2)
-    shuffle(deck3)
-
-    starting_hands = {
-        1: [deck1[7*i:7*(i+1)] for i in range(player_count)],
-        2: [deck2[7*i:7*(i+1)] for i in range(player_count)],
-        3: [deck3[7*i:7*(i+1)] for i in range(player_count)],
-    }
-
-    game = run_ai_local_game_routine(ais, wonders, starting_hands, verbose=False, pause_each_move=False)
-
-    if not best_game or game.get_total_score() > best_game.get_total_score():
-        best_game = game
-
-print("Best game:")
-print(best_game)
\ No newline at end of file
+base_seed = 0
+replay_seed = None
+instrument = False
+record_path = None
+
+if __name__ == '__main__':
+    if replay_seed is not None:
+        run_seeded_local_game_routine(ais, replay_seed, verbose=True, pause_each_move=True)
+    else:
+        best_result = None
+        instrumentations = []
+        writer = GameRecordWriter(record_path) if record_path else None
+        for result in run_batch_local_games_routine(ais, num_games, base_seed, instrument=instrument, record=writer is not None):
+            print(f"Game {result.seed}: {result.points}")
+            if writer:
+                writer.write(result.record)
+            if not best_result or sum(result.scores) > sum(best_result.scores):
+                best_result = result
+            if result.instrumentation:
+                instrumentations.append(result.instrumentation)
+        if writer:
+            writer.close()
+
+        print()
+        print(f"Best game (seed {best_result.seed}):")
+        print(best_result.game)
+
+        if instrument:
+            print()
+            print(format_instrumentation(aggregate_instrumentation(instrumentations)))
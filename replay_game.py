@@ -0,0 +1,25 @@
+from itertools import islice
+
+from routines.known_game_routine import run_game_record_routine
+from game.game_record import read_game_records
+from ai.random_ai import RandomAi
+from ai.first_ai import FirstAi
+
+# Replays a recorded game locally (see game/game_record.py), e.g. from the record_path of loop_local_games.py.
+# Steps:
+# - 1. Set record_path to the record file and game_index to the index of the game in the file (0 for the first game)
+# - 2. Replace ai with the AI you want and ai_i with the index of the wonder it watches
+# - 3. Run `python replay_game.py`
+# - 4. Press enter to go to the next move.
+
+record_path = 'games.jsonl.gz'
+game_index = 0
+ai = FirstAi()
+ai_i = 0
+
+if __name__ == '__main__':
+    record = next(islice(read_game_records(record_path), game_index, None), None)
+    if record is None:
+        raise Exception(f"{record_path} has no game {game_index}")
+    print(f"Game {game_index}: {record.wonders}, scores {record.scores}, info {record.info}")
+    run_game_record_routine(ai, ai_i, record, verbose=True, pause_each_move=True)
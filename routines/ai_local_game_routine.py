@@ -1,5 +1,6 @@
 from game.base import *
 from game.known_game import *
+from game.fast_game import *
 from game.ai_game import *
 from game.deck import *
 from game.wonders import *
@@ -14,12 +15,16 @@ def print_pause(game, pause_each_move):
         print()
 
 # Runs a full local game using the input AIs and starting hands. Optional parameter to pause on each move.
-def run_ai_local_game_routine(ais, wonders, starting_hands, verbose=True, pause_each_move=False):
-    game = KnownGame(wonders, verbose)
+# With fast=True, the game runs on the headless FastGame engine instead of KnownGame (for bulk self-play, final result is the same).
+# If a moves dict is given, it is filled with the moves of each age in the format of run_known_game_routine (e.g. to record the game).
+def run_ai_local_game_routine(ais, wonders, starting_hands, verbose=True, pause_each_move=False, fast=False, moves=None):
+    game = FastGame(wonders) if fast else KnownGame(wonders, verbose)
     ai_games = [AiGame(i) for i in range(len(ais))]
 
     for age in [1, 2, 3]:
         game.initialize_age(age, starting_hands[age])
+        if moves is not None:
+            moves[age] = []
         for i in range(len(ais)):
             ai_games[i].initialize(age, game.wonders, game.hands[i])
 
@@ -27,6 +32,8 @@ def run_ai_local_game_routine(ais, wonders, starting_hands, verbose=True, pause_
             if verbose: print_pause(game, pause_each_move)
             move = [ais[i].get_selection(ai_games[i], ai_games[i].get_ai_hand()) for i in range(len(ais))]
             game.execute_turn(move)
+            if moves is not None:
+                moves[age].append(move)
             
             if game.wait_for_last_card_play:
                 if verbose: print_pause(game, pause_each_move)
@@ -37,6 +44,8 @@ def run_ai_local_game_routine(ais, wonders, starting_hands, verbose=True, pause_
                         continue
                     selection = ais[i].get_selection(ai_games[i], ai_games[i].get_ai_hand())
                     game.execute_last_card_turn(selection)
+                    if moves is not None:
+                        moves[age].append(selection)
                     break
             
             if game.wait_for_discard_play:
@@ -46,14 +55,17 @@ def run_ai_local_game_routine(ais, wonders, starting_hands, verbose=True, pause_
                         continue
                     card = ais[i].get_build_card_from_discard(ai_games[i], game.discard_pile)
                     game.execute_discard_turn(card)
+                    if moves is not None:
+                        moves[age].append(card)
                     break
             
             for i in range(len(ais)):
                 ai_games[i].post_move(game.wonders, move, game.hands[i])
 
-    print()
-    print('Final situation:')
-    print()
-    print(game)
-    print()
+    if verbose:
+        print()
+        print('Final situation:')
+        print()
+        print(game)
+        print()
     return game
\ No newline at end of file
@@ -0,0 +1,80 @@
+import random
+
+from collections import namedtuple
+from functools import partial
+from multiprocessing import Pool
+
+from routines.ai_local_game_routine import run_ai_local_game_routine
+from ai.instrumentation import start_instrumentation, stop_instrumentation
+from game.game_record import encode_game_record
+from game.deck import *
+from game.wonders import *
+
+# The result of one game played by run_batch_local_games_routine.
+# - seed: the seed of the game. run_seeded_local_game_routine with the same AIs and seed replays the game exactly
+# - wonders: list of (name, side) of the wonders in the game, in turn order
+# - points: list of each wonder's points string (see Wonder.get_points_str)
+# - scores: list of each wonder's total points
+# - game: the final game (FastGame or KnownGame)
+# - instrumentation: the instrumentation dict of the game if it was instrumented (see ai/instrumentation.py), else None
+# - record: the game record dict of the game if it was recorded (see game/game_record.py), else None
+LocalGameResult = namedtuple('LocalGameResult', ['seed', 'wonders', 'points', 'scores', 'game', 'instrumentation', 'record'])
+
+# Runs a full local game where everything random (wonders, sides, hands and the AIs' random choices) comes from the given seed.
+# AIs use the global random module, so the seed is applied to it for the duration of the game.
+# fast: run on the headless FastGame engine (ignored when verbose, which needs KnownGame's output)
+# instrument: record the AIs' instrumentation during the game
+# record: return the game record of the game (to write with a GameRecordWriter)
+def run_seeded_local_game_routine(ais, seed, verbose=False, pause_each_move=False, fast=True, instrument=False, record=False):
+    random.seed(seed)
+    wonders = get_random_wonders(len(ais))
+    starting_hands = get_random_starting_hands(len(ais))
+    # Hands are consumed by the game, keep the starting ones for the record.
+    recorded_hands = {age: [hand[:] for hand in hands] for age, hands in starting_hands.items()} if record else None
+    moves = {} if record else None
+
+    if instrument:
+        start_instrumentation()
+    try:
+        game = run_ai_local_game_routine(ais, wonders, starting_hands, verbose=verbose, pause_each_move=pause_each_move, fast=fast and not verbose, moves=moves)
+    finally:
+        recorder = stop_instrumentation() if instrument else None
+
+    scores = [wonder.compute_points_total(game.wonders) for wonder in game.wonders]
+    return LocalGameResult(
+        seed,
+        [(wonder.name, wonder.side) for wonder in game.wonders],
+        [wonder.get_points_str(game.wonders) for wonder in game.wonders],
+        scores,
+        game,
+        recorder.to_dict() if recorder else None,
+        encode_game_record(game.wonders, recorded_hands, moves, scores, {'seed': seed}) if record else None,
+    )
+
+# Returns the per-game seeds of a batch. The same base_seed always gives the same seeds.
+def get_batch_seeds(num_games, base_seed=0):
+    rng = random.Random(base_seed)
+    return [rng.getrandbits(63) for _ in range(num_games)]
+
+# Plays num_games seeded local games over a process pool and yields a LocalGameResult for each game as it finishes
+# (so results are not in seed order). Each worker gets its own copy of the AIs.
+# - processes: number of worker processes (defaults to the number of cores). 1 runs the games in this process
+# - chunksize: number of games sent to a worker at a time
+# - keep_games: if False, the final game is dropped from the results to save pickling
+# - instrument: record the AIs' instrumentation for each game (combine them with aggregate_instrumentation)
+# - record: return the game record of each game (to write with a GameRecordWriter as results come in)
+def run_batch_local_games_routine(ais, num_games, base_seed=0, processes=None, chunksize=1, keep_games=True, instrument=False, record=False):
+    seeds = get_batch_seeds(num_games, base_seed)
+    play = partial(_play_seeded_game, ais, keep_games, instrument, record)
+    if processes == 1:
+        yield from map(play, seeds)
+        return
+    with Pool(processes) as pool:
+        yield from pool.imap_unordered(play, seeds, chunksize)
+
+# Helper for run_batch_local_games_routine (must be module-level to be picklable).
+def _play_seeded_game(ais, keep_games, instrument, record, seed):
+    result = run_seeded_local_game_routine(ais, seed, instrument=instrument, record=record)
+    if not keep_games:
+        result = result._replace(game=None)
+    return result
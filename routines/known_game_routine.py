@@ -3,6 +3,7 @@ from game.known_game import *
 from game.ai_game import *
 from game.deck import *
 from game.wonders import *
+from game.game_record import *
 
 # Runs a full predetermined game locally using the input starting hands and moves. Optional parameter to pause on each move.
 # The input AI will provide its opinion on which move to make on each move, but this has no effect on the actual move performed.
@@ -39,8 +40,8 @@ def run_known_game_routine(ai, ai_i, wonders, starting_hands, moves, verbose=Tru
             elif type(move) is Selection:
                 game.execute_last_card_turn(move)
                 if not game.wait_for_discard_play:
-                    ai_game.post_move(game.wonders, move, game.hands[ai_i])
-            elif type(move) is Card:
+                    ai_game.post_move(game.wonders, last_real_move, game.hands[ai_i])
+            elif move is None or type(move) is Card:
                 game.execute_discard_turn(move)
                 ai_game.post_move(game.wonders, last_real_move, game.hands[ai_i])
 
@@ -49,4 +50,10 @@ def run_known_game_routine(ai, ai_i, wonders, starting_hands, moves, verbose=Tru
     print()
     print(ai_game)
     print()
-    return game
\ No newline at end of file
+    return game
+
+# Replays a GameRecord (see game/game_record.py) with run_known_game_routine.
+def run_game_record_routine(ai, ai_i, record, verbose=True, pause_each_move=False):
+    if not record.is_complete():
+        raise Exception("Cannot replay a game record with unknown starting hands")
+    return run_known_game_routine(ai, ai_i, record.get_wonders(), record.get_starting_hands(), record.get_moves(), verbose, pause_each_move)
@@ -1,22 +1,37 @@
 from selenium import webdriver
 from webdriver.common import *
 from game.ai_game import *
+from game.game_record import *
 
 # Control plane for an AI session on BGA.
 # - driver: the Selenium driver to use
 # - name: the name of the session (set to the BGA username by default)
-# - game_info: struct containing high-level game info. more details in webdriver/common.py
+# - game_info: struct containing high-level game info, read once in start_ai. more details in webdriver/common.py
 # - game_state: the current state of the 7 Wonders game. more details in webdriver/common.py
 # - ai: the AI running for this session
 # - ai_game: the AiGame for this session
+# - turn_title, turn_hand_ids: the page title and the BGA ids of the cards in hand of the turn being played
+# - played_keys: the keys of the last turn played (see get_played_turn_keys), so that waiting for the next turn doesn't
+#   return the same turn
+# - record_writer: optional GameRecordWriter to write the game record to when the game is done. Only the session's own
+#   starting hands are known, and moves are the last moves read from the game logs at the start of each turn (opponents'
+#   wonder and throw moves have no card, and a last card or discard play replaces the player's move of that turn)
+# - record_hands, record_moves: the starting hands and moves recorded so far (see game/game_record.py)
 class AiSession:
-    def __init__(self, driver, user, pw, ai):
+    def __init__(self, driver, user, pw, ai, record_writer=None):
         self.driver = driver
         self.name = user
         self.game_info = None
         self.game_state = WAITING
         self.ai = ai
         self.ai_game = AiGame(0)
+        self.turn_title = None
+        self.turn_hand_ids = []
+        self.played_keys = []
+        self.record_writer = record_writer
+        self.record_hands = {}
+        self.record_moves = {}
+        self.record_written = False
 
         log_in(self.driver, user, pw)
         attempt_rejoin(self.driver)
@@ -41,51 +56,100 @@ class AiSession:
     # Get the current game state and set it on this session object.
     def set_state(self):
         self.game_state = get_game_state(self.driver)
+
+    # Waits until it's this session's turn (or the game ends) and sets the game state, for at most timeout seconds.
+    def wait_for_turn(self, timeout):
+        self.game_state = wait_for_game_state(self.driver, timeout, self.played_keys, [PLAY_NORMAL, PLAY_LAST_CARD, PLAY_DISCARD])
+        if self.game_state == WAITING:
+            # Nothing happened, don't skip the current turn forever in case the last turn didn't go through.
+            self.played_keys = []
+        if self.game_state == DONE and self.record_writer and not self.record_written:
+            self.write_record(read_table_snapshot(self.driver, self.game_info, ['boards', 'logs']))
+        return self.game_state
     
     # Returns a Selection for the next move for this AI.
     def select(self):
-        self.game_info = get_game_info(self.driver)
-        self.set_state()
+        turn = self.read_turn()
+        if not turn:
+            return None
+        return decide(self.ai, self.ai_game, *turn)
 
-        self.driver.implicitly_wait(0)
-        wonders = get_wonders(self.driver, self.game_info)
-        self.driver.implicitly_wait(2)
+    # Reads the table, updates the AiGame and returns what the AI has to decide as (decision, cards), or None if there is
+    # nothing to do. Same decisions as decide: ('selection', hand) or ('discard', discard pile Cards).
+    def read_turn(self):
+        if self.game_info is None:
+            self.game_info = get_game_info(self.driver)
+        snapshot = read_table_snapshot(self.driver, self.game_info)
+        self.game_state = snapshot.game_state
 
+        # Only the parts of the snapshot used in the current game state are parsed.
+        if self.game_state == DONE and self.record_writer and not self.record_written:
+            self.write_record(snapshot)
         if self.game_state == WAITING or self.game_state == DONE:
             return None
 
+        self.turn_title = snapshot.title
+        self.turn_hand_ids = snapshot.hand_ids
+        wonders = snapshot.wonders
+
         if self.game_state == PLAY_NORMAL or self.game_state == PLAY_LAST_CARD:
-            hand = read_hand(self.driver, self.game_info)
+            hand = snapshot.hand
             old_age = self.game_info.age
-            set_age(self.driver, self.game_info, wonders)
+            self.game_info.age = snapshot.age
             if not self.ai_game.initialized or self.game_info.age != old_age:
+                if self.ai_game.initialized:
+                    self.record_move(old_age, snapshot.last_move)
                 self.ai_game.initialize(self.game_info.age, wonders, hand)
+                self.record_age(self.game_info.age, wonders, hand)
             else:
-                move = read_last_move(self.driver, self.game_info)
-                self.ai_game.post_move(wonders, move, hand)
+                self.record_move(self.game_info.age, snapshot.last_move)
+                self.ai_game.post_move(wonders, snapshot.last_move, hand)
 
-            return self.ai.get_selection(self.ai_game, hand)
+            return ('selection', hand)
 
         if self.game_state == PLAY_DISCARD:
-            hand = read_hand(self.driver, self.game_info)
+            hand = snapshot.hand
             old_age = self.game_info.age
-            set_age(self.driver, self.game_info, wonders)
+            self.game_info.age = snapshot.age
             if not self.ai_game.initialized or self.game_info.age != old_age:
                 self.ai_game.initialize(self.game_info.age, wonders, hand)
-            discard = read_discard(self.driver, self.game_info)
+                self.record_age(self.game_info.age, wonders, hand)
 
-            card = self.ai.get_build_card_from_discard(self.ai_game, [info.card for info in discard])
-            return Selection(card, 'play', None)
+            return ('discard', [info.card for info in snapshot.discard])
 
     # Performs the given Selection on BGA.
     def act(self, selection):
         if self.game_state == PLAY_NORMAL or self.game_state == PLAY_LAST_CARD:
             play_selection(self.driver, self.game_info, self.ai_game.wonders, selection)
             self.game_state = WAITING
+            card_id = self.game_info.get_card_id(selection.card, self.game_info.age)
+            self.played_keys = get_played_turn_keys(self.turn_title, self.turn_hand_ids, card_id)
         elif self.game_state == PLAY_DISCARD:
             play_from_discard(self.driver, self.game_info, selection.card)
             self.game_state = WAITING
-        
+            self.played_keys = get_played_turn_keys(self.turn_title, self.turn_hand_ids, None)
+
+    # Records the session's starting hand of an age (other hands are unknown).
+    def record_age(self, age, wonders, hand):
+        self.record_hands[age] = [hand[:] if i == self.ai_game.i else None for i in range(len(wonders))]
+        self.record_moves[age] = []
+
+    # Records the last move of each player (see read_last_move) as a turn of the given age.
+    def record_move(self, age, last_move):
+        if age in self.record_moves:
+            self.record_moves[age].append(last_move)
+
+    # Writes the game record to the record writer, with the final scores from the snapshot of the finished game.
+    def write_record(self, snapshot):
+        self.record_move(max(self.record_moves, default=None), snapshot.last_move)
+        scores = [wonder.compute_points_total(snapshot.wonders) for wonder in snapshot.wonders]
+        self.record_writer.write_game(snapshot.wonders, self.record_hands, self.record_moves, scores, {'source': 'bga', 'player': self.name})
+        self.record_written = True
 
-        
-        
\ No newline at end of file
+# Returns the AI's Selection for a decision read by AiSession.read_turn:
+# - 'selection': a regular or last card play from the hand in cards
+# - 'discard': a play from the discard pile in cards (the Selection's card is None to skip)
+def decide(ai, ai_game, decision, cards):
+    if decision == 'selection':
+        return ai.get_selection(ai_game, cards)
+    return Selection(ai.get_build_card_from_discard(ai_game, cards), 'play', None)
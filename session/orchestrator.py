@@ -0,0 +1,64 @@
+import os
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from time import sleep
+
+from session.ai_session import *
+import ai.instrumentation as instrumentation
+
+# Runs several AiSessions concurrently until their games are done. Each session runs in its own thread and advances
+# independently: it waits for its turn in the browser, reads the table, decides and acts without waiting for the other
+# sessions. AI decisions run on a process pool so that they don't hold the GIL against the other sessions' Selenium I/O.
+# - sessions: the AiSessions to run (started, with their wonder side chosen)
+# - ai_processes: number of processes for AI decisions (defaults to the number of sessions, at most the number of cores).
+#   0 decides in the session threads. AIs that search on their own pool (MonteCarloAi) search in-process in these workers
+# - wait_timeout: seconds each wait for a turn can last before checking again
+# - manual_mode: press enter before each action (one session at a time)
+# - verbose: print each session's AiGame and decision
+def run_sessions(sessions, ai_processes=None, wait_timeout=30, manual_mode=False, verbose=True):
+    if ai_processes == 0 and len(sessions) > 1 and instrumentation.recorder:
+        raise Exception("Instrumentation is single-threaded, it can't record sessions deciding in their threads")
+    console_lock = Lock()
+    ai_pool = ProcessPoolExecutor(ai_processes or min(len(sessions), os.cpu_count())) if ai_processes != 0 else None
+    try:
+        with ThreadPoolExecutor(len(sessions)) as executor:
+            futures = [executor.submit(run_session, session, ai_pool, wait_timeout, manual_mode, verbose, console_lock) for session in sessions]
+            for future in futures:
+                future.result()
+    finally:
+        if ai_pool:
+            ai_pool.shutdown()
+
+# Runs one session until its game is done (see run_sessions).
+def run_session(session, ai_pool, wait_timeout, manual_mode, verbose, console_lock):
+    while session.game_state != DONE:
+        try:
+            if session.wait_for_turn(wait_timeout) in [WAITING, DONE]:
+                continue
+            turn = session.read_turn()
+            if not turn:
+                continue
+            if ai_pool:
+                # The AI comes back from the worker with the state it kept during the decision.
+                selection, session.ai = ai_pool.submit(decide_in_process, session.ai, session.ai_game, *turn).result()
+            else:
+                selection = decide(session.ai, session.ai_game, *turn)
+
+            with console_lock:
+                if verbose:
+                    print()
+                    print(session.ai_game)
+                    print()
+                    print(session.name, 'will:', selection)
+                if manual_mode:
+                    input('Enter to continue')
+            session.act(selection)
+        except Exception:
+            traceback.print_exc()
+            sleep(1)
+
+# Helper for run_session. Decides in a worker process and returns (Selection, AI).
+def decide_in_process(ai, ai_game, decision, cards):
+    return decide(ai, ai_game, decision, cards), ai
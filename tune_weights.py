@@ -0,0 +1,27 @@
+from ai.weight_tuning import WeightTuner
+from ai.first_ai import DEFAULT_WEIGHTS, load_weights
+
+# Tunes FirstAi's scorer weights with a genetic search over self-play games, spread over all cores (see ai/weight_tuning.py).
+# The best weights are written to output_path after each generation, so the search can be stopped at any time.
+# Steps:
+# - 1. Adjust the search parameters below to your liking. To continue from earlier results, set base_path to their file
+# - 2. Run `python tune_weights.py`
+# - 3. Use the weights with FirstAi(weights=load_weights('first_ai_weights.json'))
+
+base_path = None
+output_path = 'first_ai_weights.json'
+player_count = 4
+generations = 20
+population = 16
+elites = 4
+sigma = 0.3
+games_per_round = 8
+rounds = 3
+processes = None
+seed = 0
+
+if __name__ == '__main__':
+    base_weights = load_weights(base_path) if base_path else DEFAULT_WEIGHTS
+    tuner = WeightTuner(base_weights, player_count, population, elites, sigma, games_per_round, rounds, processes, seed)
+    tuner.run(generations, output_path)
+    print(f"Best weights written to {output_path}")
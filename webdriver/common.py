@@ -5,6 +5,7 @@ from game.deck import *
 from game.wonders import *
 from time import sleep
 from collections import namedtuple
+from functools import cached_property
 from selenium.webdriver.common.by import By
 
 # Represents a player on BGA.
@@ -19,11 +20,13 @@ PlayerInfo = namedtuple('PlayerInfo', ['id', 'name', 'wonder'])
 # - card: the Card this discard card represents
 DiscardCardInfo = namedtuple('DiscardCardInfo', ['discard_id', 'img_index', 'card'])
 
-# Represents high-level info about the game.
+# Represents high-level info about the game. It doesn't change during a game, so it is read once per table and reused on
+# every turn (only the age is updated).
 # - players: the list of in-game players (in turn order). active user is always at index 0.
 # - wonders_by_id: mapping of a wonders' BGA numeric ids to the Wonders they represent
 # - cards_by_id: mapping of cards' BGA numeric ids to the Cards they represent
 # - cards_by_img_index: mapping of cards' BGA image index to the Cards they represent
+# - card_ids: mapping of card names to their lowest BGA numeric id (see get_card_id)
 # - age: the current age of the game (1, 2, 3)
 class GameInfo:
     def __init__(self, players, wonders_by_id, cards_by_id, cards_by_img_index, age):
@@ -31,8 +34,22 @@ class GameInfo:
         self.wonders_by_id = wonders_by_id
         self.cards_by_id = cards_by_id
         self.cards_by_img_index = cards_by_img_index
+        self.card_ids = {}
+        for cid in sorted(cards_by_id, key=int):
+            if cards_by_id[cid]:
+                self.card_ids.setdefault(cards_by_id[cid].name, cid)
         self.age = age
 
+    # Returns the BGA numeric id of a card in the given age, or None if the card is not in the game.
+    def get_card_id(self, card, age):
+        card_id = self.card_ids.get(card.name)
+        if age == 2:
+            card_id = AGE_2_CARD_IDS.get(card_id, card_id)
+        return card_id
+
+# The grey cards are in both the age 1 and age 2 decks, with different BGA ids in age 2.
+AGE_2_CARD_IDS = {'11': '32', '12': '33', '13': '34'}
+
 # Log in to BGA using the given username and password.
 def log_in(driver, user, pw):
     driver.get('https://boardgamearena.com/')
@@ -89,12 +106,13 @@ def start_game(driver):
 def toggle_sound(driver):
     driver.find_element(By.ID, 'toggleSound').click()
 
-# Fetches all info in a GameInfo object from the BGA game.
+# Fetches all info in a GameInfo object from the BGA game, in a single script call.
 def get_game_info(driver):
-    player_data = driver.execute_script('return gameui.gamedatas.players')
-    player_order_data = driver.execute_script('return gameui.gamedatas.playerorder')
-    wonder_data = driver.execute_script('return gameui.gamedatas.wonders')
-    card_data = driver.execute_script('return gameui.gamedatas.card_types')
+    data = json.loads(driver.execute_script(READ_GAME_INFO_SCRIPT))
+    player_data = data['players']
+    player_order_data = data['playerorder']
+    wonder_data = data['wonders']
+    card_data = data['card_types']
 
     players = [PlayerInfo(str(pid), player_data[str(pid)]['name'], str(player_data[str(pid)]['wonder'])) for pid in player_order_data]
     wonders_by_id = {wid: get_wonder_by_bga_name_side(wonder_data[wid]['name'], 'Day' if int(wid) <= 7 else 'Night') for wid in wonder_data}
@@ -103,6 +121,12 @@ def get_game_info(driver):
 
     return GameInfo(players, wonders_by_id, cards_by_id, cards_by_img_index, 1)
 
+# Script for get_game_info. Returns the game data it needs as a JSON string.
+READ_GAME_INFO_SCRIPT = """
+let d = gameui.gamedatas;
+return JSON.stringify({players: d.players, playerorder: d.playerorder, wonders: d.wonders, card_types: d.card_types});
+"""
+
 # Gets the current game state.
 DONE = 'done'
 CHOOSE_SIDE = 'choose_side'
@@ -111,40 +135,117 @@ PLAY_NORMAL = 'play_normal'
 PLAY_LAST_CARD = 'play_last_card'
 PLAY_DISCARD = 'play_discard'
 def get_game_state(driver):
-    if driver.execute_script('return gameui.gamedatas.gamestate.name') == 'gameEnd':
+    state_name = driver.execute_script('return gameui.gamedatas.gamestate.name')
+    if state_name == 'gameEnd':
+        return DONE
+    return parse_game_state(state_name, driver.find_element(By.ID, 'pagemaintitletext').text)
+
+# Title texts of the game states where the player has to act, in the order they are checked.
+GAME_STATE_TITLES = [
+    (CHOOSE_SIDE, 'You must choose a side of your Wonder board'),
+    (PLAY_NORMAL, 'You must choose a card to play'),
+    (PLAY_LAST_CARD, 'You may play your last card'),
+    (PLAY_DISCARD, 'You may construct a card from the discard pile for free'),
+]
+
+# Returns the game state from the BGA game state name and the page title text.
+def parse_game_state(state_name, title):
+    if state_name == 'gameEnd':
         return DONE
-    title = driver.find_element(By.ID, 'pagemaintitletext').text
-    if 'You must choose a side of your Wonder board' in title:
-        return CHOOSE_SIDE
-    if 'You must choose a card to play' in title:
-        return PLAY_NORMAL
-    if 'You may play your last card' in title:
-        return PLAY_LAST_CARD
-    if 'You may construct a card from the discard pile for free' in title:
-        return PLAY_DISCARD
+    for game_state, state_title in GAME_STATE_TITLES:
+        if state_title in title:
+            return game_state
     return WAITING
 
+# Returns the key of a turn (see WAIT_FOR_TURN_SCRIPT): the page title and the sorted BGA ids of the cards in hand. The
+# title is the same on every regular turn, the hand changes on every turn.
+# - hand_ids: the BGA numeric ids of the cards in hand (see get_hand_ids)
+def get_turn_key(title, hand_ids):
+    return title + '|' + ','.join(sorted(hand_ids))
+
+# Returns the keys of a turn once it has been played, to skip while waiting for the next one: the turn as it was read,
+# and the same turn without the played card, in case BGA removes it from the hand before it updates the title.
+# - card_id: the BGA id of the card taken from the hand (None for a play from the discard pile)
+def get_played_turn_keys(title, hand_ids, card_id):
+    keys = [get_turn_key(title, hand_ids)]
+    if card_id in hand_ids:
+        rest = list(hand_ids)
+        rest.remove(card_id)
+        keys.append(get_turn_key(title, rest))
+    return keys
+
+# Returns the BGA ids of the cards in hand from the class attributes of their elements ('' for a class without an id).
+def get_hand_ids(hand_classes):
+    return [m.group(1) if m else '' for m in (re.match(r'.*type_([0-9]+)', class_name) for class_name in hand_classes)]
+
+# Waits in the page for the player's turn (or the end of the game), without polling over WebDriver.
+# Observes the page and resolves as soon as it shows one of the given titles or the game ends. If the current turn key
+# (see get_turn_key) is one of skip_keys (e.g. the turn that was just played, before BGA updates the page), the key must
+# change first. A turn that already started before the script runs has a new hand, so it resolves right away.
+# Resolves with {state, title, key, timeout} after timeout_ms at the latest.
+# Arguments: titles, skip_keys, timeout_ms, callback.
+WAIT_FOR_TURN_SCRIPT = """
+let [titles, skipKeys, timeoutMs, done] = arguments;
+let titleElement = () => document.getElementById('pagemaintitletext');
+let handIds = () => Array.from(document.querySelectorAll('#player_hand > div > div'), e => {
+    let m = (e.getAttribute('class') || '').match(/.*type_([0-9]+)/);
+    return m ? m[1] : '';
+});
+let read = () => {
+    let title = titleElement() ? titleElement().innerText : '';
+    return {state: gameui.gamedatas.gamestate.name, title: title, key: title + '|' + handIds().sort().join(',')};
+};
+let changed = !skipKeys.includes(read().key);
+let finished = false;
+let observer = null, fallback = null, timer = null;
+let finish = (timeout) => {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearInterval(fallback);
+    clearTimeout(timer);
+    done(Object.assign(read(), {timeout: timeout}));
+};
+let check = () => {
+    let current = read();
+    if (!skipKeys.includes(current.key)) changed = true;
+    if (current.state === 'gameEnd' || (changed && titles.some(t => current.title.includes(t)))) finish(false);
+};
+observer = new MutationObserver(check);
+observer.observe(document.body, {childList: true, characterData: true, subtree: true});
+// Fallback for a game end that only changes gamedatas and not the DOM (BGA also updates the title, so this is rare).
+fallback = setInterval(check, 3000);
+timer = setTimeout(() => finish(true), timeoutMs);
+check();
+"""
+
+# Waits for the player's turn (see WAIT_FOR_TURN_SCRIPT) and returns the game state, or WAITING after timeout seconds.
+# - skip_keys: the keys of the turn that was just played (see get_played_turn_keys), to avoid reading the same turn again
+# - game_states: the game states to wait for (all states where the player acts by default)
+def wait_for_game_state(driver, timeout, skip_keys=None, game_states=None):
+    titles = [title for game_state, title in GAME_STATE_TITLES if not game_states or game_state in game_states]
+    skip_keys = skip_keys or []
+    driver.set_script_timeout(timeout + 5)
+    result = driver.execute_async_script(WAIT_FOR_TURN_SCRIPT, titles, skip_keys, int(1000 * timeout))
+    game_state = parse_game_state(result['state'], result['title'])
+    if game_state == DONE:
+        return DONE
+    if (result['timeout'] and result['key'] in skip_keys) or (game_states and game_state not in game_states):
+        return WAITING
+    return game_state
+
 # Returns a best-guess of the current age of the game.
 def get_age(driver, game_info, wonders):
-    age_from_game_info = len(driver.execute_script('let args = gameui.gamedatas.gamestate.args; return args ? args.age : ""') or "")
+    age_arg = driver.execute_script('let args = gameui.gamedatas.gamestate.args; return args ? args.age : ""')
+    return parse_age(age_arg, game_info, wonders)
+
+# Returns a best-guess of the current age of the game from the age argument of the BGA game state (e.g. "II").
+def parse_age(age_arg, game_info, wonders):
+    age_from_game_info = len(age_arg or "")
     if age_from_game_info > 0:
         return age_from_game_info
     if wonders:
-        max_age_from_cards = 0
-        age_1_cards = get_cards_for_players_age(len(game_info.players), 1)
-        age_2_cards = get_cards_for_players_age(len(game_info.players), 2)
-        age_3_cards = get_cards_for_players_age(len(game_info.players), 3)
-        for wonder in wonders:
-            for card in wonder.played_cards:
-                card_age = 0
-                if card in age_1_cards:
-                    card_age = 1
-                elif card in age_2_cards:
-                    card_age = 2
-                elif card in age_3_cards:
-                    card_age = 3
-                if card_age > max_age_from_cards:
-                    max_age_from_cards = card_age
+        max_age_from_cards = max((get_card_age(card) for wonder in wonders for card in wonder.played_cards if card), default=0)
         if max_age_from_cards > 0:
             return max_age_from_cards
     return 1
@@ -158,58 +259,140 @@ def choose_side(driver, pid, side):
         side = {'Day': 'a', 'Night': 'b'}[side]
         driver.find_element(By.ID, f'wonder_face_{pid}_{side}').click()
 
+# The parts of the table READ_TABLE_SCRIPT can read: player boards, hand, discard pile and game logs.
+TABLE_PARTS = ['boards', 'hand', 'discard', 'logs']
+
+# A snapshot of the BGA page on a turn, read in a single script call (see read_table_snapshot). The game state and title
+# are parsed on read, everything else is kept raw and parsed on first use, so that a turn only parses what its game
+# state uses (e.g. the discard pile in PLAY_DISCARD).
+# - game_state: the current game state (see get_game_state)
+# - title: the page title text
+# - data: the raw table state (see READ_TABLE_SCRIPT)
+# Parsed on first use:
+# - age: a best-guess of the current age (see get_age)
+# - wonders: the Wonders of all players, in the order of game_info.players (see get_wonders)
+# - hand: the list of Cards in the current hand (see read_hand)
+# - hand_ids: the BGA ids of the cards in the current hand (see get_hand_ids)
+# - discard: the list of DiscardCardInfos in the discard pile (see read_discard)
+# - last_move: the last move of each player (see read_last_move)
+class TableSnapshot:
+    def __init__(self, game_info, data):
+        self.game_info = game_info
+        self.data = data
+        self.game_state = parse_game_state(data['state'], data['title'])
+        self.title = data['title']
+
+    @cached_property
+    def age(self):
+        return parse_age(self.data['age'], self.game_info, self.wonders)
+
+    @cached_property
+    def wonders(self):
+        return parse_wonders(self.game_info, self.get_part('boards'))
+
+    @cached_property
+    def hand(self):
+        return [parse_card_class(self.game_info, class_name) for class_name in self.get_part('hand')]
+
+    @cached_property
+    def hand_ids(self):
+        return get_hand_ids(self.get_part('hand'))
+
+    @cached_property
+    def discard(self):
+        return [parse_discard_card(self.game_info, card['id'], card['position']) for card in self.get_part('discard')]
+
+    @cached_property
+    def last_move(self):
+        return parse_last_move(self.game_info, self.get_part('logs'))
+
+    # Returns the raw data of a part of the table (see TABLE_PARTS), which must have been read.
+    def get_part(self, part):
+        if self.data[part] is None:
+            raise Exception(f"Table part '{part}' was not read")
+        return self.data[part]
+
+# Reads the raw table state from gamedatas and the DOM. arguments[0] is the list of player ids in turn order, arguments[1]
+# the list of parts to read (see TABLE_PARTS), the others are null.
+READ_TABLE_SCRIPT = """
+let [pids, parts] = arguments;
+let text = e => e ? e.innerText : '';
+let classes = selector => Array.from(document.querySelectorAll(selector), e => e.getAttribute('class') || '');
+let read = (part, f) => parts.includes(part) ? f() : null;
+let args = gameui.gamedatas.gamestate.args;
+return JSON.stringify({
+    state: gameui.gamedatas.gamestate.name,
+    title: text(document.getElementById('pagemaintitletext')),
+    age: args ? args.age : '',
+    boards: read('boards', () => pids.map(pid => ({
+        gold: text(document.getElementById('coin_' + pid)),
+        cards: classes('#player_board_wrap_' + pid + ' #player_board_content_' + pid + ' [id^=board_item_wrap_]'),
+        stages: document.querySelectorAll('#player_board_wrap_' + pid + ' #wonder_step_built_' + pid + ' > div').length,
+        military: gameui.victoryStock[pid] ? gameui.victoryStock[pid].items.map(i => parseInt(i.type)) : [],
+    }))),
+    hand: read('hand', () => classes('#player_hand > div > div')),
+    discard: read('discard', () => Array.from(document.querySelectorAll('#discarded > [id^=discarded_item_]'), e => ({
+        id: e.getAttribute('id'),
+        position: window.getComputedStyle(e).getPropertyValue('background-position'),
+    }))),
+    logs: read('logs', () => Array.from(document.querySelectorAll('#logs > div[id^=log_]'), e => e.innerText.split('\\n')[0].trim())),
+});
+"""
+
+# Reads the table state (game state, age, and the given parts of TABLE_PARTS) in one WebDriver round-trip.
+def read_table_snapshot(driver, game_info, parts=TABLE_PARTS):
+    return TableSnapshot(game_info, json.loads(driver.execute_script(READ_TABLE_SCRIPT, [p.id for p in game_info.players], parts)))
+
 # Reads the Wonders from BGA along with everything associated with them (military tokens, played cards, etc.)
 def get_wonders(driver, game_info):
-    board_elements = [driver.find_element(By.ID, f'player_board_wrap_{p.id}') for p in game_info.players]
-    military_tokens_data = driver.execute_script('let res = {}; for (let key in gameui.victoryStock) { res[key] = gameui.victoryStock[key].items.map(i => parseInt(i.type)) }; return res')
-    wonders = [None for player in game_info.players]
-    for i in range(len(game_info.players)):
-        e, player = board_elements[i], game_info.players[i]
+    return read_table_snapshot(driver, game_info, ['boards']).wonders
+
+# Returns the Wonders from the boards of a table snapshot: dicts of gold text, card classes, built stage count and
+# military tokens for each player.
+def parse_wonders(game_info, boards):
+    wonders = []
+    for player, board in zip(game_info.players, boards):
         wonder = game_info.wonders_by_id[player.wonder]()
-        wonder.gold = int(e.find_element(By.ID, f'coin_{player.id}').text)
-        for card_element in e.find_elements(By.CSS_SELECTOR, f'#player_board_content_{player.id} [id^=board_item_wrap_]'):
-            m = re.match(r'.*type_([0-9]+).*', card_element.get_attribute('class'))
-            if not m:
-                raise Exception('Failed to parse card')
-            card = game_info.cards_by_id[m.group(1)]
-            wonder.played_cards.append(card)
-        wonder.stages_built = len(e.find_elements(By.CSS_SELECTOR, f'#wonder_step_built_{player.id} > div'))
-        wonder.military_tokens = military_tokens_data[player.id]
-        wonders[i] = wonder
-    
+        wonder.gold = int(board['gold'])
+        for class_name in board['cards']:
+            wonder.add_played_card(parse_card_class(game_info, class_name))
+        wonder.stages_built = board['stages']
+        wonder.military_tokens = board['military']
+        wonders.append(wonder)
     return wonders
 
+# Returns the Card for the class attribute of a card element (e.g. "... cardtype_12 ...").
+def parse_card_class(game_info, class_name):
+    m = re.match(r'.*type_([0-9]+).*', class_name)
+    if not m:
+        raise Exception('Failed to parse card')
+    return game_info.cards_by_id[m.group(1)]
+
 # Read the current hand.
 def read_hand(driver, game_info):
-    card_elements = driver.find_elements(By.CSS_SELECTOR, '#player_hand > div > div')
-    cards = []
-    for e in card_elements:
-        m = re.match(r'.*type_([0-9]+).*', e.get_attribute('class'))
-        if not m:
-            raise Exception('Failed to parse card')
-        card = game_info.cards_by_id[m.group(1)]
-        cards.append(card)
-    return cards
+    return read_table_snapshot(driver, game_info, ['hand']).hand
 
 # Read the current discard pile.
 def read_discard(driver, game_info):
-    card_elements = driver.find_elements(By.CSS_SELECTOR, '#discarded > [id^=discarded_item_]')
-    cards = []
-    for e in card_elements:
-        discard_id = e.get_attribute('id').split('_')[-1]
-        bg_pos = e.value_of_css_property('background-position')
-        m = re.match(r'^(.+)% (.+)%$', bg_pos)
-        if not m:
-            raise Exception('Failed to parse discard card')
-        img_index = str(-(int(m.group(1)) + 10*int(m.group(2))) // 100)
-        card = game_info.cards_by_img_index[img_index]
-        cards.append(DiscardCardInfo(discard_id, img_index, card))
-    return cards
+    return read_table_snapshot(driver, game_info, ['discard']).discard
+
+# Returns the DiscardCardInfo for a discard card element id and its computed background position.
+def parse_discard_card(game_info, element_id, bg_pos):
+    discard_id = element_id.split('_')[-1]
+    m = re.match(r'^(.+)% (.+)%$', bg_pos)
+    if not m:
+        raise Exception('Failed to parse discard card')
+    img_index = str(-(int(m.group(1)) + 10*int(m.group(2))) // 100)
+    card = game_info.cards_by_img_index[img_index]
+    return DiscardCardInfo(discard_id, img_index, card)
 
 # Read the last move for each player from the game logs (logs must be visible for reading to succeed).
 def read_last_move(driver, game_info):
+    return read_table_snapshot(driver, game_info, ['logs']).last_move
+
+# Returns the last move of each player from the first lines of the game logs, most recent first.
+def parse_last_move(game_info, logs):
     move = [None for player in game_info.players]
-    logs = [e.text.split('\n')[0].strip() for e in driver.find_elements(By.CSS_SELECTOR, '#logs > div[id^=log_]')]
     for i in range(len(game_info.players)):
         player = game_info.players[i]
         for log in logs:
@@ -228,15 +411,11 @@ def read_last_move(driver, game_info):
                 break
     return move
 
-# Play the given Selection on BGA.
+# Play the given Selection on BGA. The card is found for the age in game_info, as read on this turn (see read_table_snapshot).
 def play_selection(driver, game_info, wonders, selection):
     if not selection.card:
         raise Exception('Selection must contain a card')
-    card_id = next((cid for cid in game_info.cards_by_id if game_info.cards_by_id[cid] == selection.card), None)
-    set_age(driver, game_info, wonders)
-    if card_id == "11" and game_info.age == 2: card_id = "32"
-    if card_id == "12" and game_info.age == 2: card_id = "33"
-    if card_id == "13" and game_info.age == 2: card_id = "34"
+    card_id = game_info.get_card_id(selection.card, game_info.age)
     if not card_id:
         raise Exception('Could not find id for selected card')
     card_element = driver.find_element(By.CSS_SELECTOR, f'.cardcontent.cardtype_{card_id}')